@@ -0,0 +1,264 @@
+"""
+Admission control and load shedding by priority class.
+
+Every request is classified by method and path:
+- critical: rent and watch, never queued or limited; their in-flight count is tracked
+- bulk:     data generation, migration/sync, table dumps, collection exports, ...
+            limited per route and per class, and held back while critical traffic
+            is busy (ADMISSION_CRITICAL_BUSY in-flight critical requests)
+- normal:   everything else, passed through
+
+A bulk request that can't start right away waits in a bounded queue. When the
+queue is full it is rejected with 429, when it waited longer than
+ADMISSION_BULK_MAX_WAIT seconds with 503; both carry Retry-After. Limits and queue
+lengths are shared_state counters, so they hold across all worker processes.
+The handlers of bulk and critical routes are plain (non-async) functions, which
+Starlette runs in its threadpool: a running bulk request must not block the event
+loop that serves critical requests and the admission waits and rejections.
+
+Each worker registers its pid in one of ADMISSION_MAX_WORKERS slots and counts the
+bulk slots it holds under that slot, so slots held by a worker that was killed are
+handed back by the next worker that finds its pid gone. The critical path takes no
+lock: a worker counts its critical requests in process and publishes the count to
+its own slot with an unlocked store; bulk admission sums these.
+"""
+
+import asyncio
+import json
+import math
+import os
+import time
+from fnmatch import fnmatchcase
+from typing import Dict, Any
+from . import metrics
+from . import shared_state
+
+ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'true').lower() == 'true'
+ADMISSION_BULK_LIMIT = int(os.getenv('ADMISSION_BULK_LIMIT', '2'))
+ADMISSION_BULK_QUEUE = int(os.getenv('ADMISSION_BULK_QUEUE', '8'))
+ADMISSION_BULK_MAX_WAIT = float(os.getenv('ADMISSION_BULK_MAX_WAIT', '5'))
+ADMISSION_CRITICAL_BUSY = int(os.getenv('ADMISSION_CRITICAL_BUSY', '16'))
+ADMISSION_MAX_WORKERS = int(os.getenv('ADMISSION_MAX_WORKERS', '128'))
+# Seconds between admission attempts of a queued request
+ADMISSION_POLL_INTERVAL = 0.05
+
+CRITICAL, NORMAL, BULK = 'critical', 'normal', 'bulk'
+
+# (method and path pattern, class, concurrency limit of the route); first match wins
+ROUTE_RULES: list[tuple[str, str, int | None]] = [
+    ('POST /api/usecase2/rent', CRITICAL, None),
+    ('POST /api/usecase1/watch', CRITICAL, None),
+    ('POST /api/mongodb/usecase2/rent', CRITICAL, None),
+    ('POST /api/mongodb/usecase1/watch', CRITICAL, None),
+    ('POST /api/store/rent', CRITICAL, None),
+    ('POST /api/store/watch', CRITICAL, None),
+    ('POST /api/generate-data', BULK, 1),
+    ('POST /api/tables/clear', BULK, 1),
+    ('GET /api/tables', BULK, 2),
+    ('POST /api/migrate-to-nosql', BULK, 1),
+    ('POST /api/sync-to-nosql', BULK, 1),
+    ('POST /api/verify-nosql', BULK, 1),
+    ('POST /api/switch-to-sql', BULK, 1),
+    ('POST /api/snapshots/*', BULK, 1),
+    ('POST /api/mongodb/generate-data', BULK, 1),
+    ('GET /api/mongodb/collections', BULK, 2),
+    ('POST /api/mongodb/indexes', BULK, 1),
+    ('POST /api/store/bulk-load', BULK, 1),
+]
+
+
+def classify(method: str, path: str) -> tuple[str, str | None, int | None]:
+    """(class, matching rule, route limit) of a request."""
+    request = f"{method} {path}"
+    for pattern, priority, limit in ROUTE_RULES:
+        if fnmatchcase(request, pattern):
+            return priority, pattern, limit
+    return NORMAL, None, None
+
+
+# Worker slot states besides a pid
+_FREE, _REAPING = 0, -1
+
+_worker: tuple[int, int] | None = None  # (pid, worker slot) of this process
+_critical_inflight = 0
+
+
+def _held_names() -> list[str]:
+    """Shared counters a worker adds to and must hand back if it dies."""
+    return ['admission.bulk.inflight', 'admission.bulk.queued'] + [
+        f"admission.route.{rule}" for rule, priority, limit in ROUTE_RULES if priority == BULK and limit is not None
+    ]
+
+
+def _worker_slot(counters: shared_state.SharedCounters) -> int:
+    global _worker
+    pid = os.getpid()
+    if _worker is None or _worker[0] != pid:
+        reap_dead_workers(counters)
+        for index in range(ADMISSION_MAX_WORKERS):
+            if counters.compare_and_set(f"admission.worker.{index}", _FREE, pid):
+                # Looks up the slot now, so the critical path never takes the lookup lock
+                counters.store(f"admission.critical.inflight.{index}", 0)
+                _worker = (pid, index)
+                break
+        else:
+            raise RuntimeError(f"All {ADMISSION_MAX_WORKERS} admission worker slots are taken (ADMISSION_MAX_WORKERS)")
+    return _worker[1]
+
+
+def reap_dead_workers(counters: shared_state.SharedCounters) -> int:
+    """Hands back the slots held by workers whose process is gone; returns how many were reaped."""
+    reaped = 0
+    for index in range(ADMISSION_MAX_WORKERS):
+        name = f"admission.worker.{index}"
+        pid = counters.get(name)
+        if pid <= 0 or shared_state.pid_alive(pid) or not counters.compare_and_set(name, pid, _REAPING):
+            continue
+        for held_name in _held_names():
+            held = counters.swap(f"{held_name}.held.{index}", 0)
+            if held:
+                counters.release(held_name, held)
+        counters.store(f"admission.critical.inflight.{index}", 0)
+        counters.compare_and_set(name, _REAPING, _FREE)
+        print(f"Admission: released the slots of dead worker {pid}")
+        reaped += 1
+    return reaped
+
+
+def _acquire(counters: shared_state.SharedCounters, name: str, limit: int) -> bool:
+    if not counters.acquire(name, limit):
+        return False
+    counters.add(f"{name}.held.{_worker_slot(counters)}")
+    return True
+
+
+def _release(counters: shared_state.SharedCounters, name: str):
+    counters.release(f"{name}.held.{_worker_slot(counters)}")
+    counters.release(name)
+
+
+def _critical_total(counters: shared_state.SharedCounters) -> int:
+    return sum(counters.get(f"admission.critical.inflight.{index}") for index in range(ADMISSION_MAX_WORKERS))
+
+
+def _critical_busy(counters: shared_state.SharedCounters) -> bool:
+    return _critical_total(counters) >= ADMISSION_CRITICAL_BUSY
+
+
+def _try_start(counters: shared_state.SharedCounters, rule: str, limit: int | None) -> bool:
+    """Takes a route slot and a bulk class slot, or neither."""
+    if _critical_busy(counters):
+        return False
+    if limit is not None and not _acquire(counters, f"admission.route.{rule}", limit):
+        return False
+    if not _acquire(counters, 'admission.bulk.inflight', ADMISSION_BULK_LIMIT):
+        if limit is not None:
+            _release(counters, f"admission.route.{rule}")
+        return False
+    return True
+
+
+def _finish(counters: shared_state.SharedCounters, rule: str, limit: int | None):
+    _release(counters, 'admission.bulk.inflight')
+    if limit is not None:
+        _release(counters, f"admission.route.{rule}")
+
+
+def status() -> Dict[str, Any]:
+    counters = shared_state.counters()
+    return {
+        'enabled': ADMISSION_ENABLED,
+        'critical_inflight': _critical_total(counters),
+        'critical_busy_at': ADMISSION_CRITICAL_BUSY,
+        'bulk_inflight': counters.get('admission.bulk.inflight'),
+        'bulk_limit': ADMISSION_BULK_LIMIT,
+        'bulk_queued': counters.get('admission.bulk.queued'),
+        'bulk_queue_limit': ADMISSION_BULK_QUEUE,
+        'bulk_max_wait': ADMISSION_BULK_MAX_WAIT,
+        'routes': {
+            rule: {'inflight': counters.get(f"admission.route.{rule}"), 'limit': limit}
+            for rule, priority, limit in ROUTE_RULES if priority == BULK
+        },
+    }
+
+
+async def _reject(send, status_code: int, code: str, message: str, retry_after: float):
+    body = json.dumps({"detail": {"code": code, "message": message}}).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status_code,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            (b'retry-after', str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class AdmissionMiddleware:
+    """ASGI middleware; holds a request's slots until its response has been sent."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        priority, rule, limit = classify(scope['method'], scope['path'])
+        if priority == NORMAL:
+            await self.app(scope, receive, send)
+            return
+
+        global _critical_inflight
+        counters = shared_state.counters()
+        slot = _worker_slot(counters)
+        if priority == CRITICAL:
+            # In process, published with an unlocked store: never waits on another worker
+            critical = f"admission.critical.inflight.{slot}"
+            _critical_inflight += 1
+            counters.store(critical, _critical_inflight)
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                _critical_inflight -= 1
+                counters.store(critical, _critical_inflight)
+            return
+
+        if not await self._admit_bulk(counters, rule, limit, send):
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _finish(counters, rule, limit)
+
+    async def _admit_bulk(self, counters: shared_state.SharedCounters, rule: str, limit: int | None, send) -> bool:
+        if _try_start(counters, rule, limit):
+            metrics.observe('admission.bulk.queue_wait', 0.0)
+            return True
+        # A full house may be slots of killed workers
+        if reap_dead_workers(counters) and _try_start(counters, rule, limit):
+            metrics.observe('admission.bulk.queue_wait', 0.0)
+            return True
+        if not _acquire(counters, 'admission.bulk.queued', ADMISSION_BULK_QUEUE):
+            metrics.increment('admission.bulk.rejected_queue_full')
+            await _reject(send, 429, "ADMISSION_QUEUE_FULL",
+                          f"Too many bulk requests waiting, retry later ({rule})", ADMISSION_BULK_MAX_WAIT)
+            return False
+
+        start = time.perf_counter()
+        try:
+            while time.perf_counter() - start < ADMISSION_BULK_MAX_WAIT:
+                await asyncio.sleep(ADMISSION_POLL_INTERVAL)
+                if _try_start(counters, rule, limit):
+                    metrics.observe('admission.bulk.queue_wait', (time.perf_counter() - start) * 1000)
+                    return True
+        finally:
+            _release(counters, 'admission.bulk.queued')
+
+        metrics.increment('admission.bulk.rejected_deadline')
+        await _reject(send, 503, "ADMISSION_DEADLINE_EXCEEDED",
+                      f"Server busy, bulk request not started within {ADMISSION_BULK_MAX_WAIT:g}s ({rule})",
+                      ADMISSION_BULK_MAX_WAIT)
+        return False
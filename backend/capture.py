@@ -0,0 +1,157 @@
+"""
+Sampled request capture for workload replay.
+
+CaptureMiddleware records a sample of API requests: method, route template, path,
+query string, JSON body, status, response size, arrival time and latency. The
+request path only builds a dict and puts it on a bounded queue; a background
+writer thread appends the records to CAPTURE_LOG as JSON lines. When the writer
+falls behind, records are dropped and counted (capture.dropped in /api/metrics)
+instead of slowing requests down.
+
+Enable with CAPTURE_LOG=captures/requests.jsonl, sample with CAPTURE_SAMPLE_RATE=0.1.
+Replay a log with:
+    python -m benchmarks.replay captures/requests.jsonl --url http://localhost:8000
+"""
+
+import json
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any
+from . import metrics
+
+CAPTURE_LOG = os.getenv('CAPTURE_LOG', '')
+CAPTURE_SAMPLE_RATE = float(os.getenv('CAPTURE_SAMPLE_RATE', '1.0'))
+CAPTURE_PATH_PREFIX = os.getenv('CAPTURE_PATH_PREFIX', '/api/')
+CAPTURE_QUEUE_SIZE = int(os.getenv('CAPTURE_QUEUE_SIZE', '10000'))
+# Request bodies above this size are not recorded
+CAPTURE_MAX_BODY = 64 * 1024
+CAPTURE_FLUSH_INTERVAL = 1.0
+
+_queue: queue.Queue = queue.Queue(maxsize=CAPTURE_QUEUE_SIZE)
+_writer: threading.Thread | None = None
+_writer_lock = threading.Lock()
+_STOP = object()
+
+
+def _write_loop(path: str):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        while True:
+            try:
+                record = _queue.get(timeout=CAPTURE_FLUSH_INTERVAL)
+            except queue.Empty:
+                continue
+            # Drain whatever is queued and write it in one go
+            batch = [record]
+            while len(batch) < 1000:
+                try:
+                    batch.append(_queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(r is _STOP for r in batch)
+            lines = [json.dumps(r, separators=(',', ':'), default=str) for r in batch if r is not _STOP]
+            if lines:
+                f.write('\n'.join(lines) + '\n')
+                f.flush()
+                metrics.increment('capture.written', len(lines))
+            if stop:
+                return
+
+
+def start(path: str = CAPTURE_LOG):
+    """Starts the background writer (idempotent)."""
+    global _writer
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_write_loop, args=(path,), name='capture-writer', daemon=True)
+            _writer.start()
+            print(f"Capturing {CAPTURE_SAMPLE_RATE:.0%} of {CAPTURE_PATH_PREFIX}* requests to {path}")
+
+
+def stop(timeout: float = 5.0):
+    """Flushes queued records and stops the writer."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            return
+        _queue.put(_STOP)
+        _writer.join(timeout)
+        _writer = None
+
+
+def submit(record: Dict[str, Any]):
+    try:
+        _queue.put_nowait(record)
+    except queue.Full:
+        metrics.increment('capture.dropped')
+
+
+class CaptureMiddleware:
+    """ASGI middleware; wraps receive/send to see the request body and response size."""
+
+    def __init__(self, app, sample_rate: float = CAPTURE_SAMPLE_RATE, path_prefix: str = CAPTURE_PATH_PREFIX):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.path_prefix = path_prefix
+        self.route_paths: Dict[Any, str] = {}
+
+    def _route(self, scope: Dict) -> str | None:
+        """Route template (/api/usecase2/user/{user_id}/rentals) of the endpoint that handled the request."""
+        endpoint = scope.get('endpoint')
+        if endpoint is None:
+            return None
+        if endpoint not in self.route_paths:
+            for route in getattr(scope.get('app'), 'routes', []):
+                if getattr(route, 'endpoint', None) is endpoint:
+                    self.route_paths[endpoint] = route.path
+                    break
+        return self.route_paths.get(endpoint)
+
+    async def __call__(self, scope, receive, send):
+        if (scope['type'] != 'http' or not scope['path'].startswith(self.path_prefix)
+                or random.random() >= self.sample_rate):
+            await self.app(scope, receive, send)
+            return
+
+        arrived = time.time()
+        start = time.perf_counter()
+        body = bytearray()
+        response = {'status': 500, 'bytes': 0}
+
+        async def capture_receive():
+            message = await receive()
+            if message['type'] == 'http.request' and len(body) <= CAPTURE_MAX_BODY:
+                body.extend(message.get('body', b''))
+            return message
+
+        async def capture_send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+            elif message['type'] == 'http.response.body':
+                response['bytes'] += len(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self.app(scope, capture_receive, capture_send)
+        finally:
+            record = {
+                'time': arrived,
+                'at': datetime.fromtimestamp(arrived).isoformat(),
+                'method': scope['method'],
+                'route': self._route(scope),
+                'path': scope['path'],
+                'query': scope['query_string'].decode('latin-1'),
+                'status': response['status'],
+                'response_bytes': response['bytes'],
+                'latency_ms': round((time.perf_counter() - start) * 1000, 3),
+            }
+            if body and len(body) <= CAPTURE_MAX_BODY:
+                try:
+                    record['body'] = json.loads(body)
+                except ValueError:
+                    pass
+            submit(record)
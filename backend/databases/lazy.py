@@ -0,0 +1,54 @@
+"""
+Lazy, configuration-gated imports of the database stacks.
+
+ENABLED_BACKENDS (default "mariadb,mongodb") lists the stacks this instance
+serves. Modules of a stack are bound through lazy_module: the import happens on
+first attribute access, so an instance that never touches MongoDB never loads
+pymongo, and using a disabled stack fails immediately with BackendDisabled
+instead of waiting for connection retries against a server that isn't there.
+"""
+
+import importlib
+import os
+import threading
+from types import ModuleType
+
+ENABLED_BACKENDS = [b.strip() for b in os.getenv('ENABLED_BACKENDS', 'mariadb,mongodb').split(',') if b.strip()]
+
+
+class BackendDisabled(RuntimeError):
+    pass
+
+
+def is_enabled(backend: str) -> bool:
+    return backend in ENABLED_BACKENDS
+
+
+class LazyModule:
+    def __init__(self, name: str, package: str | None, backend: str | None):
+        self._name = name
+        self._package = package
+        self._backend = backend
+        self._module: ModuleType | None = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> ModuleType:
+        if self._module is None:
+            if self._backend is not None and not is_enabled(self._backend):
+                raise BackendDisabled(f"Backend {self._backend} is not enabled (ENABLED_BACKENDS={','.join(ENABLED_BACKENDS)})")
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name, self._package)
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+
+def lazy_module(name: str, package: str | None = None, backend: str | None = None) -> LazyModule:
+    """Module proxy importing `name` (relative to `package`) on first use; gated on `backend` if given."""
+    return LazyModule(name, package, backend)
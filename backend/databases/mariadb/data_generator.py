@@ -1,5 +1,6 @@
-from collections import defaultdict
 import random
+import numpy as np
+from . import mariadb
 from .mariadb import *
 from datetime import datetime, timedelta, time, date
 import string
@@ -14,42 +15,50 @@ SESSIONS = 20
 FRIENDSHIPS = 50
 WATCHHISTORIES = 100
 
-def generate_random_data() :
+# Skew parameters: media popularity follows a Zipf-like power law over a random
+# ranking of titles, user activity follows a milder power law over users.
+MEDIA_POPULARITY_EXPONENT = 1.1
+USER_ACTIVITY_EXPONENT = 0.8
+
+# Relative rental volume per hour of day (00..23), peaking in the evening.
+HOURLY_RENT_WEIGHTS = np.array([
+    2, 1, 1, 1, 1, 1, 2, 3, 4, 4, 4, 5,
+    6, 5, 5, 5, 6, 8, 11, 14, 15, 13, 9, 5
+], dtype=float)
+
+_rng = np.random.default_rng()
+
+def generate_random_data(db=mariadb) :
     """
     Generates random data. 20 families, 100 users, 100 media, ~50 films, 
     ~50 series, 100 devices, 20 sessions, 50 friendships, 100 watchhistories.
     All foreign keys are created in range 1-n where n is the number of rows in a referenced table.
     It is safe to assume that the ids start with 1, as auto increment keys are reset upon data generation
     for every table.
+    db is the target with the mariadb.py insert API (the mariadb module by default,
+    or e.g. an embedded MemoryStore).
     """
 
     print("Generating random data")
-    generate_families()
+    generate_families(db)
     print("20 Families generated")
-    generate_users()
+    generate_users(db)
     print("100 Users generated")
-    generate_media()
+    generate_media(db)
     print("100 Media generated")
-    generate_series_films()
+    generate_series_films(db)
     print("100 Series and films generated")
-    generate_sessions()
+    generate_sessions(db)
     print("20 Sessions generated")
-    generate_watch_histories()
+    generate_watch_histories(db)
     print("100 Watch Histories generated")
-    generate_devices()
+    generate_devices(db)
     print("100 Devices generated")
-    generate_friendships()
+    generate_friendships(db)
     print("50 Friendships generated")
 
     # Clear empty families
-    deleted = execute_delete("""
-        DELETE FROM Family
-        WHERE family_id NOT IN (
-            SELECT DISTINCT family_id
-            FROM Users
-            WHERE family_id IS NOT NULL
-        )
-    """, ())
+    deleted = db.remove_empty_families()
     print(f"{deleted} empty Families deleted")
 
     print("Data generation successfull")
@@ -68,12 +77,12 @@ def random_time(max_hours: int) -> time:
         second=random.randrange(0, 60)
     )
 
-def generate_families() :
+def generate_families(db) :
     family_types = ["Family", "Couple", "Friends", "Corporate"]
     for i in range(FAMILIES) :
-        insert_family( Family(None, random.choice(family_types), random_date(365)) )
+        db.insert_family( Family(None, random.choice(family_types), random_date(365)) )
 
-def generate_users() :
+def generate_users(db) :
     for i in range(USERS) :
         name = random.choice(names_pool)
         email = name.replace(' ', '')+str(random.randrange(1,1000))+"@gmail.com"
@@ -81,74 +90,139 @@ def generate_users() :
         location = random.choice(cities_pool)
         bio = ''.join(random.choices(string.ascii_letters + string.digits, k=random.randrange(1, 50)))
         family_id = random.randint(1, FAMILIES)
-        insert_user( User(None, name, email, birthday, location, bio, family_id) )
+        db.insert_user( User(None, name, email, birthday, location, bio, family_id) )
 
-def generate_media() :
+def generate_media(db) :
     media_names_sample = random.sample(media_names_pool, len(media_names_pool))
     for i in range(MEDIA) :
-        media_name = media_names_sample[i]
+        # Larger datasets reuse the title pool as sequels: "Interstellar 2", ...
+        media_name = media_names_sample[i % len(media_names_sample)]
+        if i >= len(media_names_sample):
+            media_name += f" {i // len(media_names_sample) + 1}"
         genre = random.choice(genre_pool)
         prod_year = random_date(29200).year
         descr = ''.join(random.choices(string.ascii_letters + string.digits, k=random.randrange(1, 50)))
         location = random.choice(countries_pool)
         cost = random.randint(1, 8)
-        insert_media( Media(None, media_name, genre, prod_year, descr, location, cost) )
+        db.insert_media( Media(None, media_name, genre, prod_year, descr, location, cost) )
 
-def generate_series_films() :
+def generate_series_films(db) :
     media_id_sample = random.sample(range(1, MEDIA+1), MEDIA)
     for i in range(SERIES + FILMS) :
         if bool(random.getrandbits(1)) :
             number_of_episodes = random.randrange(1, 40)
             is_ongoing = bool(random.getrandbits(1))
             media_id = media_id_sample[i]
-            insert_series( Series(None, number_of_episodes, is_ongoing, media_id) )
+            db.insert_series( Series(None, number_of_episodes, is_ongoing, media_id) )
         else :
             duration = random.randint(15, 300)
             number_of_parts = random.randrange(1,11)
             media_id = media_id_sample[i]
-            insert_film( Film(None, duration, number_of_parts, media_id) )
+            db.insert_film( Film(None, duration, number_of_parts, media_id) )
 
-def generate_sessions() :
-    inserted_sessions: dict[int, list[int]] = defaultdict(list)
-    attempts = 0
-    while attempts < SESSIONS :
-        user_id = random.randint(1, USERS)
-        media_id = random.randint(1, MEDIA)
-        if media_id in inserted_sessions[user_id] :
-            continue
-        attempts += 1
-        inserted_sessions[user_id].append(media_id)
-        date_of_rent = datetime.combine(random_date(10), random_time(24))
-        cost = random.randrange(1, 50) # TODO: add calculation
-        duration = random.randrange(1, 21)
-        insert_session( Session(None, user_id, media_id, date_of_rent, cost, duration) )
-
-def generate_watch_histories() :
-    for i in range(WATCHHISTORIES) :
-        user_id = random.randint(1, USERS)
-        media_id = random.randint(1, MEDIA)
-        date_watched = random_date(365)
-        family_watch = bool(random.getrandbits(1))
-        insert_watch_history( WatchHistory(None, user_id, media_id, date_watched, family_watch) )
+def power_law_weights(n: int, exponent: float) -> np.ndarray:
+    """
+    Returns selection probabilities for ids 1..n where the k-th most popular id
+    has weight 1/k^exponent. Ranks are shuffled so popularity is not tied to id order.
+    """
+    ranks = _rng.permutation(n) + 1
+    weights = ranks.astype(float) ** -exponent
+    return weights / weights.sum()
+
+def sample_ids(n: int, size: int, weights: np.ndarray | None = None) -> np.ndarray:
+    # Draws `size` ids in range 1..n according to weights (uniform if None)
+    return _rng.choice(n, size=size, p=weights) + 1
+
+def unique_pairs(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # Removes duplicate (a, b) rows while keeping first-seen order
+    pairs = np.stack([a, b], axis=1)
+    _, first = np.unique(pairs, axis=0, return_index=True)
+    return pairs[np.sort(first)]
+
+def sample_unique_pairs(count: int, draw) -> np.ndarray:
+    """
+    Collects `count` distinct pairs from `draw(size) -> (a, b)`, oversampling and
+    drawing again only when duplicates leave the batch short.
+    """
+    pairs = np.empty((0, 2), dtype=np.int64)
+    size = count
+    while len(pairs) < count :
+        a, b = draw(max(size * 2, 16))
+        pairs = unique_pairs(np.concatenate([pairs[:, 0], a]), np.concatenate([pairs[:, 1], b]))
+        size = count - len(pairs)
+    return pairs[:count]
 
-def generate_devices() :
+def random_datetimes(days_range: int, size: int) -> list[datetime]:
+    # Random timestamps within the last days_range days following HOURLY_RENT_WEIGHTS
+    today = datetime.combine(datetime.now().date(), time())
+    days = _rng.integers(0, days_range + 1, size=size)
+    hours = _rng.choice(24, size=size, p=HOURLY_RENT_WEIGHTS / HOURLY_RENT_WEIGHTS.sum())
+    seconds = _rng.integers(0, 3600, size=size)
+    offsets = hours * 3600 + seconds - days * 86400
+    return [today + timedelta(seconds=o) for o in offsets.tolist()]
+
+def random_dates(days_range: int, size: int) -> list[date]:
+    today = datetime.now().date()
+    return [today - timedelta(days=d) for d in _rng.integers(0, days_range + 1, size=size).tolist()]
+
+def generate_sessions(db) :
+    max_pairs = USERS * MEDIA
+    count = min(SESSIONS, max_pairs)
+    user_weights = power_law_weights(USERS, USER_ACTIVITY_EXPONENT)
+    media_weights = power_law_weights(MEDIA, MEDIA_POPULARITY_EXPONENT)
+
+    pairs = sample_unique_pairs(count, lambda size: (
+        sample_ids(USERS, size, user_weights),
+        sample_ids(MEDIA, size, media_weights),
+    ))
+    dates_of_rent = random_datetimes(10, count)
+    costs = _rng.integers(1, 50, size=count) # TODO: add calculation
+    durations = _rng.integers(1, 21, size=count)
+
+    db.insert_sessions([
+        Session(None, user_id, media_id, date_of_rent, cost, duration)
+        for (user_id, media_id), date_of_rent, cost, duration
+        in zip(pairs.tolist(), dates_of_rent, costs.tolist(), durations.tolist())
+    ])
+
+def generate_watch_histories(db) :
+    user_ids = sample_ids(USERS, WATCHHISTORIES, power_law_weights(USERS, USER_ACTIVITY_EXPONENT))
+    media_ids = sample_ids(MEDIA, WATCHHISTORIES, power_law_weights(MEDIA, MEDIA_POPULARITY_EXPONENT))
+    dates_watched = random_dates(365, WATCHHISTORIES)
+    family_watches = _rng.integers(0, 2, size=WATCHHISTORIES).astype(bool)
+
+    db.insert_watch_histories([
+        WatchHistory(None, user_id, media_id, date_watched, family_watch)
+        for user_id, media_id, date_watched, family_watch
+        in zip(user_ids.tolist(), media_ids.tolist(), dates_watched, family_watches.tolist())
+    ])
+
+def generate_devices(db) :
     for i in range(DEVICES) :
         device_name = random.choice(device_names_pool)
         registration_date = random_date(365)
         user_id = random.randint(1, USERS)
-        insert_device( Device(None, device_name, registration_date, user_id) )
-
-def generate_friendships() :
-    inserted_friendships: set[tuple[int, int]] = set()
-    attempts = 0
-    while attempts < FRIENDSHIPS :
-        user_id_1 = random.randint(1, USERS)
-        user_id_2 = random.randint(1, USERS)
-        if user_id_1 == user_id_2 or (user_id_1, user_id_2) in inserted_friendships or (user_id_2, user_id_1) in inserted_friendships:
-            continue
-        attempts += 1
-        inserted_friendships.add((user_id_1, user_id_2))
-        insert_friendship( Friendship(user_id_1, user_id_2) )
+        db.insert_device( Device(None, device_name, registration_date, user_id) )
+
+def generate_friendships(db) :
+    max_pairs = USERS * (USERS - 1) // 2
+    count = min(FRIENDSHIPS, max_pairs)
+    user_weights = power_law_weights(USERS, USER_ACTIVITY_EXPONENT)
+
+    def draw(size: int) -> tuple[np.ndarray, np.ndarray]:
+        a = sample_ids(USERS, size, user_weights)
+        b = sample_ids(USERS, size, user_weights)
+        keep = a != b
+        a, b = a[keep], b[keep]
+        # Store each friendship in canonical order so (a, b) and (b, a) dedupe together
+        return np.minimum(a, b), np.maximum(a, b)
+
+    pairs = sample_unique_pairs(count, draw)
+    # Restore a random direction for each stored friendship
+    flip = _rng.integers(0, 2, size=len(pairs)).astype(bool)
+    pairs[flip] = pairs[flip][:, ::-1]
+
+    db.insert_friendships([Friendship(user_id, friend_id) for user_id, friend_id in pairs.tolist()])
 
 names_pool = [
     "Juliana Adams",
@@ -1,3 +1,5 @@
+import pymysql
+from typing import Iterator
 from ..models import *
 from .mariadb_connection import get_mariadb
 from datetime import datetime
@@ -14,19 +16,84 @@ TABLE_RESET_ORDER = [
     "Family",
 ]
 
+# Change log for incremental MariaDB -> MongoDB sync. Rows with new auto increment
+# ids are picked up by per-table high-water marks; the write helpers record
+# everything else (updates, deletes, child rows) as (entity, key_column, key_value),
+# naming the Mongo collection whose documents have to be rebuilt.
+CHANGE_LOG_TABLE = "ChangeLog"
+Change = tuple[str, str, int]
+RESET_CHANGE: Change = ("*", "reset", 0)
+# Same definition as sql/init.sql; databases created before the change log existed get it on first use
+CHANGE_LOG_DDL = f"""
+CREATE TABLE IF NOT EXISTS `{CHANGE_LOG_TABLE}` (
+    change_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    entity VARCHAR(50) NOT NULL,
+    key_column VARCHAR(50) NOT NULL,
+    key_value INT NOT NULL,
+    changed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+)
+"""
+_change_log_ready = False
+
 # --------Common functions----------
-def reset_all_tables():
+def reset_all_tables(fast: bool = True):
+    """
+    Empties every table and resets auto increment counters.
+    fast=True truncates with foreign key checks suspended instead of
+    deleting (and logging) every row.
+    """
+    if fast:
+        truncate_tables(TABLE_RESET_ORDER)
+        record_changes([RESET_CHANGE])
+        return
+
     with get_mariadb() as connection:
         try:
             with connection.cursor() as cursor:
                 for table in TABLE_RESET_ORDER:
                     cursor.execute(f"DELETE FROM `{table}`")
                     cursor.execute(f"ALTER TABLE `{table}` AUTO_INCREMENT = 1")
+                _log_changes(cursor, [RESET_CHANGE])
             connection.commit()
         except Exception:
             connection.rollback()
             raise
 
+def truncate_tables(tables: list[str]):
+    # TRUNCATE also resets AUTO_INCREMENT, FK checks are per connection
+    with get_mariadb() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+            try:
+                for table in tables:
+                    cursor.execute(f"TRUNCATE TABLE `{table}`")
+            finally:
+                cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+
+def ensure_change_log():
+    """Creates the ChangeLog table if missing, once per process."""
+    global _change_log_ready
+    if not _change_log_ready:
+        # Own connection: DDL commits implicitly and must not end a caller's transaction
+        with get_mariadb() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(CHANGE_LOG_DDL)
+        _change_log_ready = True
+
+def _log_changes(cursor, changes: list[Change] | None):
+    if changes:
+        ensure_change_log()
+        cursor.executemany(
+            f"INSERT INTO `{CHANGE_LOG_TABLE}` (entity, key_column, key_value) VALUES (%s, %s, %s)",
+            changes,
+        )
+
+def record_changes(changes: list[Change]):
+    with get_mariadb() as connection:
+        with connection.cursor() as cursor:
+            _log_changes(cursor, changes)
+        connection.commit()
+
         
 def test_db() :
     try:
@@ -40,6 +107,20 @@ def execute_select(sql: str, params: tuple = ()) -> list[dict]:
             cursor.execute(sql, params)
             return cursor.fetchall()
         
+def execute_select_stream(sql: str, params: tuple = (), fetch_size: int = 1000) -> Iterator[dict]:
+    """
+    Streams rows of a SELECT through an unbuffered server-side cursor,
+    so only fetch_size rows are held in memory at a time.
+    """
+    with get_mariadb() as connection:
+        with connection.cursor(pymysql.cursors.SSDictCursor) as cursor:
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    return
+                yield from rows
+
 def get_table_rows(table_name: str) :
     rows = execute_select(f"SELECT * FROM `{table_name}`")
     return rows
@@ -70,7 +151,7 @@ def list_all_tables_with_rows() -> dict[str, list[dict]]:
 
 #--------------Inserts--------------
 
-def execute_insert(sql: str, params: tuple) -> int | None:
+def execute_insert(sql: str, params: tuple, changes: list[Change] | None = None) -> int | None:
     """
     Executes an INSERT statement and returns the id of the inserted row.
     """
@@ -79,12 +160,30 @@ def execute_insert(sql: str, params: tuple) -> int | None:
             with connection.cursor() as cursor:
                 cursor.execute(sql, params)
                 last_id = cursor.lastrowid
+                _log_changes(cursor, changes)
             connection.commit()
             return last_id
         except Exception:
             connection.rollback()
             raise
 
+def execute_insert_many(sql: str, rows: list[tuple], changes: list[Change] | None = None) -> int:
+    """
+    Executes a multi-row INSERT in one round trip and returns number of inserted rows.
+    """
+    if not rows:
+        return 0
+    with get_mariadb() as connection:
+        try:
+            with connection.cursor() as cursor:
+                inserted = cursor.executemany(sql, rows)
+                _log_changes(cursor, changes)
+            connection.commit()
+            return inserted
+        except Exception:
+            connection.rollback()
+            raise
+
 def insert_user(user: User) -> User:
     user.user_id = execute_insert(
         """
@@ -119,6 +218,17 @@ def insert_friendship(friendship: Friendship) -> None:
         VALUES (%s, %s)
         """,
         (friendship.user_id, friendship.friend_id),
+        changes=[("users", "user_id", friendship.user_id)],
+    )
+
+def insert_friendships(friendships: list[Friendship]) -> int:
+    return execute_insert_many(
+        """
+        INSERT INTO Friendships (user_id, friend_id)
+        VALUES (%s, %s)
+        """,
+        [(f.user_id, f.friend_id) for f in friendships],
+        changes=[("users", "user_id", user_id) for user_id in {f.user_id for f in friendships}],
     )
 
 def insert_media(media: Media) -> Media:
@@ -151,6 +261,7 @@ def insert_series(series: Series) -> Series:
             series.is_ongoing,
             series.media_id,
         ),
+        changes=[("media", "media_id", series.media_id)],
     )
     return series
 
@@ -165,6 +276,7 @@ def insert_film(film: Film) -> Film:
             film.number_of_parts,
             film.media_id,
         ),
+        changes=[("media", "media_id", film.media_id)],
     )
     return film
 
@@ -186,6 +298,19 @@ def insert_session(session: Session) -> Session:
     print(session.session_id)
     return session
 
+def insert_sessions(sessions: list[Session]) -> int:
+    return execute_insert_many(
+        """
+        INSERT INTO Sessions
+        (user_id, media_id, date_of_rent, cost, duration)
+        VALUES (%s, %s, %s, %s, %s)
+        """,
+        [
+            (s.user_id, s.media_id, s.date_of_rent, s.cost, s.duration)
+            for s in sessions
+        ],
+    )
+
 def insert_watch_history(history: WatchHistory) -> None:
     execute_insert(
         """
@@ -201,6 +326,19 @@ def insert_watch_history(history: WatchHistory) -> None:
         ),
     )
 
+def insert_watch_histories(histories: list[WatchHistory]) -> int:
+    return execute_insert_many(
+        """
+        INSERT INTO WatchHistory
+        (user_id, media_id, date_of_watch, family_watch)
+        VALUES (%s, %s, %s, %s)
+        """,
+        [
+            (h.user_id, h.media_id, h.date_of_watch, h.family_watch)
+            for h in histories
+        ],
+    )
+
 def insert_device(device: Device) -> Device:
     device.device_id = execute_insert(
         """
@@ -212,12 +350,13 @@ def insert_device(device: Device) -> Device:
             device.registration_date,
             device.user_id,
         ),
+        changes=[("users", "user_id", device.user_id)],
     )
     return device
 
 # --------------Removes-----------------
 
-def execute_delete(sql: str, params: tuple) -> int | None:
+def execute_delete(sql: str, params: tuple, changes: list[Change] | None = None) -> int | None:
     """
     Executes a DELETE statement and returns number of affected rows.
     """
@@ -226,16 +365,29 @@ def execute_delete(sql: str, params: tuple) -> int | None:
             with connection.cursor() as cursor:
                 cursor.execute(sql, params)
                 affected_rows = cursor.rowcount
+                _log_changes(cursor, changes)
             connection.commit()
             return affected_rows
         except Exception:
             connection.rollback()
             raise
 
+def remove_empty_families() -> int:
+    """Deletes families without members, returns the number of deleted families."""
+    return execute_delete("""
+        DELETE FROM Family
+        WHERE family_id NOT IN (
+            SELECT DISTINCT family_id
+            FROM Users
+            WHERE family_id IS NOT NULL
+        )
+    """, ())
+
 def remove_family(family_id: int) -> bool:
     rows = execute_delete(
         "DELETE FROM Family WHERE family_id = %s",
         (family_id,),
+        changes=[("families", "family_id", family_id)],
     )
     return rows > 0
 
@@ -246,6 +398,7 @@ def remove_friendship(user_id: int, friend_id: int) -> bool:
         WHERE user_id = %s AND friend_id = %s
         """,
         (user_id, friend_id),
+        changes=[("users", "user_id", user_id)],
     )
     return rows > 0
 
@@ -253,20 +406,25 @@ def remove_media(media_id: int) -> bool:
     rows = execute_delete(
         "DELETE FROM Media WHERE media_id = %s",
         (media_id,),
+        changes=[("media", "media_id", media_id)],
     )
     return rows > 0
 
 def remove_series(series_id: int) -> bool:
+    series = find_series_by_id(series_id)
     rows = execute_delete(
         "DELETE FROM Series WHERE series_id = %s",
         (series_id,),
+        changes=[("media", "media_id", series.media_id)] if series else None,
     )
     return rows > 0
 
 def remove_film(film_id: int) -> bool:
+    film = find_film_by_id(film_id)
     rows = execute_delete(
         "DELETE FROM Film WHERE film_id = %s",
         (film_id,),
+        changes=[("media", "media_id", film.media_id)] if film else None,
     )
     return rows > 0
 
@@ -274,6 +432,7 @@ def remove_session(session_id: int) -> bool:
     rows = execute_delete(
         "DELETE FROM Sessions WHERE session_id = %s",
         (session_id,),
+        changes=[("sessions", "session_id", session_id)],
     )
     return rows > 0
 
@@ -284,6 +443,7 @@ def remove_watch_history(user_id: int, media_id: int) -> bool:
         WHERE user_id = %s AND media_id = %s
         """,
         (user_id, media_id),
+        changes=[("watch_history", "user_id", user_id)],
     )
     return rows > 0
 
@@ -294,12 +454,13 @@ def remove_device(device_id: int, user_id: int) -> bool:
         WHERE device_id = %s AND user_id = %s
         """,
         (device_id, user_id),
+        changes=[("users", "user_id", user_id)],
     )
     return rows > 0
 
 # ---------------Updates-----------
 
-def execute_update(sql: str, params: tuple) -> int:
+def execute_update(sql: str, params: tuple, changes: list[Change] | None = None) -> int:
     """
     Executes an UPDATE statement and returns number of affected rows.
     """
@@ -308,6 +469,7 @@ def execute_update(sql: str, params: tuple) -> int:
             with connection.cursor() as cursor:
                 cursor.execute(sql, params)
                 affected_rows = cursor.rowcount
+                _log_changes(cursor, changes)
             connection.commit()
             return affected_rows
         except Exception:
@@ -330,6 +492,7 @@ def update_family(family: Family) -> bool:
             family.creation_date,
             family.family_id,
         ),
+        changes=[("families", "family_id", family.family_id)],
     )
     return rows > 0
 
@@ -357,6 +520,7 @@ def update_user(user: User) -> bool:
             user.family_id,
             user.user_id,
         ),
+        changes=[("users", "user_id", user.user_id)],
     )
     return rows > 0
 
@@ -386,6 +550,7 @@ def update_media(media: Media) -> bool:
             media.cost_per_day,
             media.media_id,
         ),
+        changes=[("media", "media_id", media.media_id)],
     )
     return rows > 0
 
@@ -393,6 +558,7 @@ def update_series(series: Series) -> bool:
     if series.series_id is None:
         raise ValueError("series_id is required for update")
 
+    previous = find_series_by_id(series.series_id)
     rows = execute_update(
         """
         UPDATE Series
@@ -407,6 +573,8 @@ def update_series(series: Series) -> bool:
             series.media_id,
             series.series_id,
         ),
+        changes=[("media", "media_id", media_id) for media_id in
+                 {series.media_id, previous.media_id if previous else series.media_id}],
     )
     return rows > 0
 
@@ -414,6 +582,7 @@ def update_film(film: Film) -> bool:
     if film.film_id is None:
         raise ValueError("film_id is required for update")
 
+    previous = find_film_by_id(film.film_id)
     rows = execute_update(
         """
         UPDATE Film
@@ -428,6 +597,8 @@ def update_film(film: Film) -> bool:
             film.media_id,
             film.film_id,
         ),
+        changes=[("media", "media_id", media_id) for media_id in
+                 {film.media_id, previous.media_id if previous else film.media_id}],
     )
     return rows > 0
 
@@ -453,6 +624,7 @@ def update_session(session: Session) -> bool:
             session.duration,
             session.session_id,
         ),
+        changes=[("sessions", "session_id", session.session_id)],
     )
     return rows > 0
 
@@ -473,6 +645,7 @@ def update_watch_history(history: WatchHistory) -> bool:
             history.user_id,
             history.media_id,
         ),
+        changes=[("watch_history", "watch_history_id", history.watch_history_id)],
     )
     return rows > 0
 
@@ -490,6 +663,7 @@ def update_device(device: Device) -> bool:
             device.device_id,
             device.user_id,
         ),
+        changes=[("users", "user_id", device.user_id)],
     )
     return rows > 0
 
@@ -0,0 +1,139 @@
+import csv
+import gzip
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pymysql
+from .mariadb_connection import get_mariadb
+from .mariadb import TABLE_RESET_ORDER, RESET_CHANGE, truncate_tables, record_changes
+
+SNAPSHOT_DIR = os.getenv('MARIADB_SNAPSHOT_DIR', 'snapshots')
+SNAPSHOT_WORKERS = int(os.getenv('MARIADB_SNAPSHOT_WORKERS', '4'))
+RESTORE_BATCH_SIZE = 5000
+
+# Marker for SQL NULL in snapshot files (same convention as LOAD DATA / mysqldump --tab).
+# Backslashes in text values are doubled on dump, so a text value "\N" is written as
+# "\\N" and only the marker itself reads back as NULL.
+NULL = r'\N'
+
+_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+def _encode_value(value):
+    if value is None:
+        return NULL
+    if isinstance(value, str):
+        return value.replace('\\', '\\\\')
+    return value
+
+def _decode_value(value: str):
+    return None if value == NULL else value.replace('\\\\', '\\')
+
+
+def _snapshot_path(name: str) -> str:
+    if not _NAME_PATTERN.match(name):
+        raise ValueError(f"Invalid snapshot name: {name}")
+    return os.path.join(SNAPSHOT_DIR, name)
+
+def _table_file(path: str, table: str) -> str:
+    return os.path.join(path, f"{table}.csv.gz")
+
+
+def list_snapshots() -> list[str]:
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return []
+    return sorted(
+        name for name in os.listdir(SNAPSHOT_DIR)
+        if os.path.isdir(os.path.join(SNAPSHOT_DIR, name))
+    )
+
+
+def save_snapshot(name: str) -> dict[str, int]:
+    """
+    Dumps every table into <SNAPSHOT_DIR>/<name>/<table>.csv.gz, one worker per table.
+    Rows are streamed through an unbuffered cursor, so memory does not grow with table size.
+    Returns number of rows written per table.
+    """
+    path = _snapshot_path(name)
+    os.makedirs(path, exist_ok=True)
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=SNAPSHOT_WORKERS) as pool:
+        counts = dict(zip(
+            TABLE_RESET_ORDER,
+            pool.map(lambda table: _dump_table(table, _table_file(path, table)), TABLE_RESET_ORDER)
+        ))
+
+    print(f"Snapshot '{name}' saved in {time.perf_counter() - start:.2f}s: {counts}")
+    return counts
+
+def _dump_table(table: str, file_path: str) -> int:
+    count = 0
+    with get_mariadb() as connection:
+        with connection.cursor(pymysql.cursors.SSCursor) as cursor:
+            cursor.execute(f"SELECT * FROM `{table}`")
+            columns = [column[0] for column in cursor.description]
+            with gzip.open(file_path, 'wt', newline='', compresslevel=1) as f:
+                writer = csv.writer(f)
+                writer.writerow(columns)
+                for row in cursor:
+                    writer.writerow([_encode_value(value) for value in row])
+                    count += 1
+    return count
+
+
+def restore_snapshot(name: str) -> dict[str, int]:
+    """
+    Truncates all tables and reloads them from a snapshot with multi-row inserts.
+    Foreign key and unique checks are disabled on the loading connections, so tables
+    are restored in parallel regardless of their dependencies.
+    Returns number of rows restored per table.
+    """
+    path = _snapshot_path(name)
+    if not os.path.isdir(path):
+        raise FileNotFoundError(f"Snapshot {name} not found")
+    start = time.perf_counter()
+
+    truncate_tables(TABLE_RESET_ORDER)
+    with ThreadPoolExecutor(max_workers=SNAPSHOT_WORKERS) as pool:
+        counts = dict(zip(
+            TABLE_RESET_ORDER,
+            pool.map(lambda table: _load_table(table, _table_file(path, table)), TABLE_RESET_ORDER)
+        ))
+
+    # Restored data is unrelated to whatever was synced to MongoDB before
+    record_changes([RESET_CHANGE])
+    print(f"Snapshot '{name}' restored in {time.perf_counter() - start:.2f}s: {counts}")
+    return counts
+
+def _load_table(table: str, file_path: str) -> int:
+    if not os.path.exists(file_path):
+        return 0
+
+    count = 0
+    with gzip.open(file_path, 'rt', newline='') as f:
+        reader = csv.reader(f)
+        columns = next(reader)
+        sql = (
+            f"INSERT INTO `{table}` ({', '.join(f'`{c}`' for c in columns)}) "
+            f"VALUES ({', '.join(['%s'] * len(columns))})"
+        )
+        with get_mariadb() as connection:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+                    cursor.execute("SET UNIQUE_CHECKS = 0")
+                    batch = []
+                    for row in reader:
+                        batch.append(tuple(_decode_value(value) for value in row))
+                        if len(batch) >= RESTORE_BATCH_SIZE:
+                            count += cursor.executemany(sql, batch)
+                            batch = []
+                    if batch:
+                        count += cursor.executemany(sql, batch)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+    return count
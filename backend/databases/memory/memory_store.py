@@ -0,0 +1,185 @@
+"""
+Embedded in-process store with the insert/find API of mariadb.py.
+
+Rows are kept as dicts (the shape DictCursor returns) in per-table hash indexes on
+the primary key, with secondary hash indexes for the foreign keys the use cases
+follow and sorted indexes for name order and a user's rentals by date. There is no
+server, network or SQL parsing, so benchmarks against it measure only the Python
+layers on top (model building, serialisation, request handling).
+"""
+
+import threading
+from bisect import insort
+from collections import defaultdict
+from typing import Dict, List
+from ..models import *
+
+TABLES = ['Family', 'Users', 'Media', 'Series', 'Film', 'Sessions', 'WatchHistory', 'Device', 'Friendships']
+
+
+class MemoryStore:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.reset_all_tables()
+
+    def reset_all_tables(self, fast: bool = True):
+        with self.lock:
+            # primary key -> row
+            self.rows: Dict[str, Dict] = {table: {} for table in TABLES}
+            self.next_id: Dict[str, int] = {table: 1 for table in TABLES}
+            # foreign key hash indexes: key -> primary keys
+            self.users_by_family: Dict[int, list[int]] = defaultdict(list)
+            self.sessions_by_user: Dict[int, list[tuple]] = defaultdict(list)  # sorted (date_of_rent, session_id)
+            self.type_by_media: Dict[int, str] = {}
+            # sorted indexes: (name, id)
+            self.users_by_name: list[tuple] = []
+            self.media_by_name: list[tuple] = []
+
+    def _insert(self, table: str, id_column: str, row: Dict) -> int:
+        row_id = self.next_id[table]
+        self.next_id[table] += 1
+        row[id_column] = row_id
+        self.rows[table][row_id] = row
+        return row_id
+
+    # --------------Inserts-----------------
+
+    def insert_family(self, family: Family) -> Family:
+        with self.lock:
+            family.family_id = self._insert('Family', 'family_id', {
+                'family_type': family.family_type, 'creation_date': family.creation_date,
+            })
+        return family
+
+    def insert_user(self, user: User) -> User:
+        with self.lock:
+            user.user_id = self._insert('Users', 'user_id', {
+                'user_name': user.user_name, 'email': user.email, 'birthday': user.birthday,
+                'location': user.location, 'bio': user.bio, 'family_id': user.family_id,
+            })
+            if user.family_id is not None:
+                self.users_by_family[user.family_id].append(user.user_id)
+            insort(self.users_by_name, (user.user_name, user.user_id))
+        return user
+
+    def insert_media(self, media: Media) -> Media:
+        with self.lock:
+            media.media_id = self._insert('Media', 'media_id', {
+                'media_name': media.media_name, 'genre': media.genre, 'prod_year': media.prod_year,
+                'descr': media.descr, 'location': media.location, 'cost_per_day': media.cost_per_day,
+            })
+            insort(self.media_by_name, (media.media_name, media.media_id))
+        return media
+
+    def insert_series(self, series: Series) -> Series:
+        with self.lock:
+            series.series_id = self._insert('Series', 'series_id', {
+                'number_of_episodes': series.number_of_episodes, 'is_ongoing': series.is_ongoing,
+                'media_id': series.media_id,
+            })
+            self.type_by_media[series.media_id] = 'series'
+        return series
+
+    def insert_film(self, film: Film) -> Film:
+        with self.lock:
+            film.film_id = self._insert('Film', 'film_id', {
+                'duration': film.duration, 'number_of_parts': film.number_of_parts, 'media_id': film.media_id,
+            })
+            self.type_by_media.setdefault(film.media_id, 'film')
+        return film
+
+    def insert_session(self, session: Session) -> Session:
+        with self.lock:
+            session.session_id = self._insert('Sessions', 'session_id', {
+                'user_id': session.user_id, 'media_id': session.media_id, 'date_of_rent': session.date_of_rent,
+                'cost': session.cost, 'duration': session.duration,
+            })
+            insort(self.sessions_by_user[session.user_id], (session.date_of_rent, session.session_id))
+        return session
+
+    def insert_sessions(self, sessions: list[Session]) -> int:
+        with self.lock:
+            for session in sessions:
+                self.insert_session(session)
+        return len(sessions)
+
+    def insert_watch_history(self, history: WatchHistory) -> None:
+        with self.lock:
+            history.watch_history_id = self._insert('WatchHistory', 'watch_history_id', {
+                'user_id': history.user_id, 'media_id': history.media_id,
+                'date_of_watch': history.date_of_watch, 'family_watch': history.family_watch,
+            })
+
+    def insert_watch_histories(self, histories: list[WatchHistory]) -> int:
+        with self.lock:
+            for history in histories:
+                self.insert_watch_history(history)
+        return len(histories)
+
+    def insert_device(self, device: Device) -> Device:
+        with self.lock:
+            device.device_id = self._insert('Device', 'device_id', {
+                'device_name': device.device_name, 'registration_date': device.registration_date,
+                'user_id': device.user_id,
+            })
+        return device
+
+    def insert_friendship(self, friendship: Friendship) -> None:
+        with self.lock:
+            self.rows['Friendships'][(friendship.user_id, friendship.friend_id)] = {
+                'user_id': friendship.user_id, 'friend_id': friendship.friend_id,
+            }
+
+    def insert_friendships(self, friendships: list[Friendship]) -> int:
+        with self.lock:
+            for friendship in friendships:
+                self.insert_friendship(friendship)
+        return len(friendships)
+
+    # --------------Removes-----------------
+
+    def remove_empty_families(self) -> int:
+        with self.lock:
+            empty = [family_id for family_id in self.rows['Family'] if not self.users_by_family.get(family_id)]
+            for family_id in empty:
+                del self.rows['Family'][family_id]
+        return len(empty)
+
+    # --------------Selects-----------------
+
+    def get_table_rows(self, table_name: str) -> list[dict]:
+        return list(self.rows[table_name].values())
+
+    def count(self, table_name: str) -> int:
+        return len(self.rows[table_name])
+
+    def find_user_by_id(self, user_id: int) -> User | None:
+        row = self.rows['Users'].get(user_id)
+        return User.from_row(row) if row else None
+
+    def find_family_by_id(self, family_id: int) -> Family | None:
+        row = self.rows['Family'].get(family_id)
+        return Family.from_row(row) if row else None
+
+    def find_media_by_id(self, media_id: int) -> Media | None:
+        row = self.rows['Media'].get(media_id)
+        return Media.from_row(row) if row else None
+
+    def find_session_by_id(self, session_id: int) -> Session | None:
+        row = self.rows['Sessions'].get(session_id)
+        return Session.from_row(row) if row else None
+
+    def users_sorted_by_name(self) -> List[Dict]:
+        return [self.rows['Users'][user_id] for _, user_id in self.users_by_name]
+
+    def media_sorted_by_name(self) -> List[Dict]:
+        return [self.rows['Media'][media_id] for _, media_id in self.media_by_name]
+
+    def user_sessions_newest_first(self, user_id: int) -> List[Dict]:
+        return [self.rows['Sessions'][session_id] for _, session_id in reversed(self.sessions_by_user.get(user_id, []))]
+
+    def family_members(self, family_id: int) -> List[Dict]:
+        return [self.rows['Users'][user_id] for user_id in self.users_by_family.get(family_id, [])]
+
+    def media_type(self, media_id: int) -> str:
+        return self.type_by_media.get(media_id, 'unknown')
@@ -0,0 +1,257 @@
+"""
+Declarative MongoDB index management.
+
+INDEX_SPECS is the single source of truth for secondary indexes. apply_indexes
+diffs it against the indexes that exist on the server: missing indexes are
+created, indexes whose definition changed are rebuilt, indexes that are no longer
+specified are dropped. _hot_queries lists the queries the API and the migration
+tools run; verify_query_plans explains each of them and fails when one falls back
+to a collection scan or a blocking in-memory sort.
+
+Run from the repository root to apply the spec and verify the plans:
+    python -m backend.databases.mongodb.mongo_indexes
+"""
+
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from .mongodb_connection import get_collection, get_mongodb_connection
+
+# Index names are left to MongoDB's default (<field>_<direction>_...), so indexes
+# built by earlier versions of create_indexes are recognised by the diff.
+INDEX_SPECS: Dict[str, list[IndexModel]] = {
+    'users': [
+        IndexModel([('user_id', ASCENDING)], unique=True),
+        IndexModel([('user_name', ASCENDING)]),
+    ],
+    'media': [
+        IndexModel([('media_id', ASCENDING)], unique=True),
+        IndexModel([('media_name', ASCENDING)]),
+    ],
+    'sessions': [
+        IndexModel([('session_id', ASCENDING)], unique=True),
+        # rentals of a user newest first, also serves user.user_id equality lookups
+        IndexModel([('user.user_id', ASCENDING), ('date_of_rent', DESCENDING)]),
+        IndexModel([('media.media_id', ASCENDING)]),
+        IndexModel([('date_of_rent', DESCENDING)]),
+    ],
+    # open bucket lookup (user_id, count) and newest buckets first
+    'rental_buckets': [
+        IndexModel([('user_id', ASCENDING), ('last_rent', DESCENDING)]),
+    ],
+    # time-series collection: no unique indexes; indexes on the metaField (user) and
+    # timeField (date_of_watch) are kept per bucket, so they stay small
+    'watch_history': [
+        # created by MongoDB together with the time-series collection
+        IndexModel([('user', ASCENDING), ('date_of_watch', ASCENDING)]),
+        IndexModel([('watch_history_id', ASCENDING)]),
+        IndexModel([('user.user_id', ASCENDING)]),
+        IndexModel([('user.family_id', ASCENDING), ('date_of_watch', DESCENDING)]),
+        IndexModel([('media.media_id', ASCENDING)]),
+        IndexModel([('date_of_watch', DESCENDING)]),
+    ],
+    'families': [
+        IndexModel([('family_id', ASCENDING)], unique=True),
+        IndexModel([('users.user_id', ASCENDING)]),
+    ],
+}
+
+# Index options that are part of an index definition for the diff
+_DEFINING_OPTIONS = ('unique', 'sparse', 'partialFilterExpression', 'expireAfterSeconds')
+
+_build_lock = threading.Lock()
+_build_status: Dict[str, Any] = {'state': 'idle'}
+
+
+def _definition(index: Dict) -> tuple:
+    keys = index['key']
+    keys = tuple((field, int(direction)) for field, direction in (keys.items() if hasattr(keys, 'items') else keys))
+    # the server returns nested documents as SON, compare them as plain dicts
+    options = tuple(
+        (option, repr(dict(index[option]) if hasattr(index[option], 'items') else index[option]))
+        for option in _DEFINING_OPTIONS if index.get(option)
+    )
+    return keys, options
+
+
+def plan_indexes(collections: list[str] | None = None) -> Dict[str, Dict[str, list[str]]]:
+    """Per collection: indexes to create, to rebuild (definition changed), to drop, unchanged."""
+    plan = {}
+    for collection, models in INDEX_SPECS.items():
+        if collections is not None and collection not in collections:
+            continue
+        existing = {
+            name: _definition(info)
+            for name, info in get_collection(collection).index_information().items()
+            if name != '_id_'
+        }
+        wanted = {model.document['name']: _definition(model.document) for model in models}
+        plan[collection] = {
+            'create': sorted(name for name in wanted if name not in existing),
+            'rebuild': sorted(name for name in wanted if name in existing and existing[name] != wanted[name]),
+            'drop': sorted(name for name in existing if name not in wanted),
+            'unchanged': sorted(name for name in wanted if existing.get(name) == wanted[name]),
+        }
+    return plan
+
+
+def apply_indexes(collections: list[str] | None = None) -> Dict[str, Dict[str, list[str]]]:
+    """Brings the server's indexes in line with INDEX_SPECS and returns the applied plan."""
+    start = time.perf_counter()
+    plan = plan_indexes(collections)
+    for collection, changes in plan.items():
+        coll = get_collection(collection)
+        for name in changes['drop'] + changes['rebuild']:
+            coll.drop_index(name)
+        build = set(changes['create'] + changes['rebuild'])
+        models = [model for model in INDEX_SPECS[collection] if model.document['name'] in build]
+        if models:
+            # One createIndexes command builds all of them in a single collection scan
+            coll.create_indexes(models)
+
+    changed = {c: p for c, p in plan.items() if p['create'] or p['rebuild'] or p['drop']}
+    print(f"Indexes applied in {time.perf_counter() - start:.2f}s: {changed or 'no changes'}")
+    return plan
+
+
+def apply_indexes_in_background(collections: list[str] | None = None) -> bool:
+    """
+    Starts apply_indexes on a daemon thread so callers (e.g. startup) don't wait
+    for builds on large collections. Returns False when a build is already running.
+    """
+    with _build_lock:
+        if _build_status['state'] == 'running':
+            return False
+        _build_status.clear()
+        _build_status.update({'state': 'running', 'started_at': datetime.now()})
+
+    def build():
+        try:
+            plan = apply_indexes(collections)
+            _build_status.update({'state': 'done', 'plan': plan})
+        except Exception as e:
+            print(f"Background index build failed: {e}")
+            _build_status.update({'state': 'failed', 'error': str(e)})
+        _build_status['finished_at'] = datetime.now()
+
+    threading.Thread(target=build, name='index-build', daemon=True).start()
+    return True
+
+
+def get_index_build_status() -> Dict[str, Any]:
+    return dict(_build_status)
+
+
+def _hot_queries() -> list[Dict[str, Any]]:
+    """
+    Queries on the API and migration paths with representative parameters.
+    `allow` lists plan problems that are inherent to the query, e.g. a report
+    that reads every document of its driving collection.
+    """
+    from .use_case1_mongo import family_media_pipeline, FAMILY_WATCH_RECENT_DAYS
+
+    recent = datetime.now() - timedelta(days=FAMILY_WATCH_RECENT_DAYS)
+    return [
+        {'name': 'users by id', 'collection': 'users', 'filter': {'user_id': 1}},
+        {'name': 'users by name', 'collection': 'users', 'filter': {}, 'sort': [('user_name', 1)]},
+        {'name': 'media by id', 'collection': 'media', 'filter': {'media_id': 1}},
+        {'name': 'media by name', 'collection': 'media', 'filter': {}, 'sort': [('media_name', 1)]},
+        {'name': 'user rentals', 'collection': 'sessions',
+         'filter': {'user.user_id': 1}, 'sort': [('date_of_rent', -1)]},
+        {'name': 'sessions newest first', 'collection': 'sessions', 'filter': {}, 'sort': [('date_of_rent', -1)]},
+        {'name': 'sessions by media', 'collection': 'sessions', 'filter': {'media.media_id': {'$in': [1, 2]}}},
+        {'name': 'sessions id range', 'collection': 'sessions',
+         'filter': {'session_id': {'$gte': 1, '$lte': 1000}}},
+        {'name': 'user rental buckets', 'collection': 'rental_buckets',
+         'filter': {'user_id': 1}, 'sort': [('last_rent', -1)]},
+        {'name': 'open rental bucket', 'collection': 'rental_buckets',
+         'filter': {'user_id': 1, 'count': {'$lt': 100}}},
+        {'name': 'recent family watches', 'collection': 'watch_history',
+         'filter': {'family_watch': True, 'date_of_watch': {'$gte': recent}}, 'sort': [('date_of_watch', -1)]},
+        {'name': 'recent watches of a family', 'collection': 'watch_history',
+         'filter': {'user.family_id': 1, 'family_watch': True, 'date_of_watch': {'$gte': recent}},
+         'sort': [('date_of_watch', -1)]},
+        {'name': 'watch history id range', 'collection': 'watch_history',
+         'filter': {'watch_history_id': {'$gte': 1, '$lte': 1000}}},
+        {'name': 'watch history by user', 'collection': 'watch_history', 'filter': {'user.user_id': {'$in': [1, 2]}}},
+        {'name': 'watch history by media', 'collection': 'watch_history',
+         'filter': {'media.media_id': {'$in': [1, 2]}}},
+        {'name': 'family by id', 'collection': 'families', 'filter': {'family_id': 1}},
+        {'name': 'families by member', 'collection': 'families', 'filter': {'users.user_id': {'$in': [1, 2]}}},
+        {'name': 'uc1 family media', 'collection': 'families',
+         'pipeline': family_media_pipeline(datetime.now()), 'allow': {'COLLSCAN'}},
+    ]
+
+
+def _winning_stages(explain: Any) -> list[str]:
+    """Stage names of every winning plan in an explain output (find or aggregate)."""
+    stages = []
+
+    def walk(node, in_plan):
+        if isinstance(node, dict):
+            if in_plan and isinstance(node.get('stage'), str):
+                stages.append(node['stage'])
+            for key, value in node.items():
+                if key != 'rejectedPlans':
+                    walk(value, in_plan or key == 'winningPlan')
+        elif isinstance(node, list):
+            for item in node:
+                walk(item, in_plan)
+
+    walk(explain, False)
+    return stages
+
+
+def _unindexed_lookups(pipeline: list[Dict]) -> list[str]:
+    """$lookup stages whose foreignField is not the leading key of an index."""
+    problems = []
+    for stage in pipeline:
+        lookup = stage.get('$lookup')
+        if not lookup or 'foreignField' not in lookup:
+            continue
+        leading = {next(iter(info['key']))[0] for info in get_collection(lookup['from']).index_information().values()}
+        if lookup['foreignField'] not in leading:
+            problems.append(f"LOOKUP {lookup['from']}.{lookup['foreignField']}")
+    return problems
+
+
+def verify_query_plans() -> Dict[str, Any]:
+    """Explains every hot query; ok is False when any uses COLLSCAN or a blocking SORT."""
+    db = get_mongodb_connection()
+    results = []
+    for query in _hot_queries():
+        collection = get_collection(query['collection'])
+        if 'pipeline' in query:
+            explain = db.command('aggregate', query['collection'], pipeline=query['pipeline'], explain=True)
+            extra = _unindexed_lookups(query['pipeline'])
+        else:
+            cursor = collection.find(query['filter'])
+            if query.get('sort'):
+                cursor = cursor.sort(query['sort'])
+            explain = cursor.explain()
+            extra = []
+
+        stages = _winning_stages(explain)
+        problems = sorted({s for s in stages if s in ('COLLSCAN', 'SORT')} - query.get('allow', set())) + extra
+        results.append({
+            'name': query['name'],
+            'collection': query['collection'],
+            'stages': stages,
+            'problems': problems,
+            'ok': not problems,
+        })
+
+    ok = all(r['ok'] for r in results)
+    for r in results:
+        if not r['ok']:
+            print(f"  Query plan problem in '{r['name']}': {r['problems']} (stages {r['stages']})")
+    print(f"Query plan verification {'passed' if ok else 'FAILED'} for {len(results)} queries")
+    return {'ok': ok, 'queries': results}
+
+
+if __name__ == '__main__':
+    apply_indexes()
+    sys.exit(0 if verify_query_plans()['ok'] else 1)
@@ -0,0 +1,194 @@
+"""
+Incremental MariaDB -> MongoDB sync.
+
+Instead of rebuilding every collection, only documents affected since the last
+migration or sync are rebuilt:
+1. new rows: auto increment ids above the per-table high-water marks
+2. changed/deleted rows: ChangeLog entries written by the mariadb.py helpers
+3. denormalised copies: a changed user also rebuilds its sessions, watch history
+   and families, a changed media its sessions and watch history
+4. rental buckets of every user whose sessions were touched
+
+Affected documents are re-read from SQL and written with upserts, documents whose
+source rows are gone are deleted, so every run costs O(delta).
+"""
+
+import time
+from collections import defaultdict
+from typing import Dict, Any, Callable, Iterator
+from pymongo import ReplaceOne, DeleteMany, InsertOne
+from .mongodb_connection import get_collection
+from .mongodb import is_time_series, rebuild_rental_buckets
+from ..mariadb import mariadb
+from . import mongo_migration as migration
+
+SYNC_CHUNK_SIZE = 1000
+
+# collection -> (document id field, document stream builder)
+SYNC_COLLECTIONS: Dict[str, tuple[str, Callable[[str, tuple], Iterator[Dict]]]] = {
+    'users': ('user_id', migration.user_documents),
+    'media': ('media_id', migration.media_documents),
+    'sessions': ('session_id', migration.session_documents),
+    'watch_history': ('watch_history_id', migration.watch_history_documents),
+    'families': ('family_id', migration.family_documents),
+}
+
+# (collection, key column) -> (SQL column in the collection's source query, Mongo field)
+SYNC_KEYS = {
+    ('users', 'user_id'): ('user_id', 'user_id'),
+    ('media', 'media_id'): ('m.media_id', 'media_id'),
+    ('sessions', 'session_id'): ('s.session_id', 'session_id'),
+    ('sessions', 'user_id'): ('s.user_id', 'user.user_id'),
+    ('sessions', 'media_id'): ('s.media_id', 'media.media_id'),
+    ('watch_history', 'watch_history_id'): ('w.watch_history_id', 'watch_history_id'),
+    ('watch_history', 'user_id'): ('w.user_id', 'user.user_id'),
+    ('watch_history', 'media_id'): ('w.media_id', 'media.media_id'),
+    ('families', 'family_id'): ('family_id', 'family_id'),
+}
+
+# High-water table -> collection whose id column it feeds
+HIGH_WATER_COLLECTIONS = {
+    'Users': 'users',
+    'Media': 'media',
+    'Sessions': 'sessions',
+    'WatchHistory': 'watch_history',
+    'Family': 'families',
+}
+
+
+def _full_migration() -> Dict[str, Any]:
+    """Full re-migration; refused when MariaDB holds no users or media, as it would empty MongoDB."""
+    for table in ('Users', 'Media'):
+        if mariadb.execute_select_one(f"SELECT COUNT(*) AS total FROM `{table}`", ())['total'] == 0:
+            raise ValueError(f"MariaDB table {table} is empty, refusing a full migration that would clear MongoDB")
+    return {'mode': 'full', 'migrated': migration.migrate_from_sql()}
+
+
+def sync_from_sql() -> Dict[str, Any]:
+    """
+    Applies everything that changed in MariaDB since the last migration/sync.
+    Falls back to a full migrate_from_sql when there is no previous state
+    or the SQL tables were reset in between.
+    """
+    start = time.perf_counter()
+    previous = migration.load_sync_marks()
+    if previous is None:
+        print("No sync state found, running full migration")
+        return _full_migration()
+
+    marks = migration.read_sync_marks()
+    entries = mariadb.execute_select(
+        f"SELECT entity, key_column, key_value FROM `{mariadb.CHANGE_LOG_TABLE}` "
+        "WHERE change_id > %s AND change_id <= %s",
+        (previous['change_id'], marks['change_id']),
+    )
+    if any(e['entity'] == mariadb.RESET_CHANGE[0] for e in entries):
+        print("MariaDB was reset since last sync, running full migration")
+        return _full_migration()
+
+    changed: Dict[tuple[str, str], set[int]] = defaultdict(set)
+    for e in entries:
+        changed[(e['entity'], e['key_column'])].add(e['key_value'])
+
+    for table, id_column in migration.HIGH_WATER_TABLES.items():
+        low, high = previous['high_water'].get(table, 0), marks['high_water'][table]
+        if high > low:
+            changed[(HIGH_WATER_COLLECTIONS[table], id_column)].update(range(low + 1, high + 1))
+
+    _add_cascades(changed)
+
+    written: Dict[str, int] = defaultdict(int)
+    deleted: Dict[str, int] = defaultdict(int)
+    # Order matters only for readability of the log; every step is an idempotent upsert
+    rental_owners: set[int] = set()
+    for (collection, key_column), ids in sorted(changed.items()):
+        w, d = _sync_keys(collection, key_column, sorted(ids), rental_owners if collection == 'sessions' else None)
+        written[collection] += w
+        deleted[collection] += d
+    for chunk in _chunks(sorted(rental_owners)):
+        written['rental_buckets'] += rebuild_rental_buckets(chunk)
+
+    _raise_counters(marks['high_water'])
+    migration.save_sync_marks(marks)
+    # Entries up to the saved position are applied, keep the log small
+    mariadb.execute_delete(f"DELETE FROM `{mariadb.CHANGE_LOG_TABLE}` WHERE change_id <= %s", (marks['change_id'],))
+
+    elapsed = time.perf_counter() - start
+    print(f"Incremental sync: {len(entries)} change log entries, "
+          f"upserted {dict(written)}, deleted {dict(deleted)} in {elapsed:.2f}s")
+    return {'mode': 'incremental', 'upserted': dict(written), 'deleted': dict(deleted)}
+
+
+def _add_cascades(changed: Dict[tuple[str, str], set[int]]):
+    """Adds documents that embed copies of changed users and media."""
+    user_ids = changed.get(('users', 'user_id'), set())
+    if user_ids:
+        changed[('sessions', 'user_id')] |= user_ids
+        changed[('watch_history', 'user_id')] |= user_ids
+        family_ids = changed[('families', 'family_id')]
+        for chunk in _chunks(sorted(user_ids)):
+            # Current family from SQL, previous family from the embedded member lists
+            where, params = _in_clause('user_id', chunk)
+            for row in mariadb.execute_select(f"SELECT family_id FROM Users WHERE family_id IS NOT NULL AND {where}", params):
+                family_ids.add(row['family_id'])
+            for doc in get_collection('families').find({'users.user_id': {'$in': chunk}}, {'_id': 0, 'family_id': 1}):
+                family_ids.add(doc['family_id'])
+
+    media_ids = changed.get(('media', 'media_id'), set())
+    if media_ids:
+        changed[('sessions', 'media_id')] |= media_ids
+        changed[('watch_history', 'media_id')] |= media_ids
+
+
+def _sync_keys(collection: str, key_column: str, ids: list[int], owners: set[int] | None = None) -> tuple[int, int]:
+    """
+    Rebuilds every document of `collection` whose key column is in ids: upserts what
+    the source query returns, deletes Mongo documents it no longer returns.
+    owners, if given, collects user.user_id of the affected documents before and after.
+    """
+    id_field, documents = SYNC_COLLECTIONS[collection]
+    sql_column, mongo_field = SYNC_KEYS[(collection, key_column)]
+    coll = get_collection(collection).with_options(write_concern=migration.get_bulk_write_concern())
+    written = deleted = 0
+
+    for chunk in _chunks(ids):
+        docs = list(documents(*_in_clause(sql_column, chunk)))
+        seen = [doc[id_field] for doc in docs]
+        # Stale documents are found client side; a $nin over every seen id could exceed the 16MB command limit
+        projection = {'_id': 0, id_field: 1, 'user.user_id': 1} if owners is not None else {'_id': 0, id_field: 1}
+        existing = list(coll.find({mongo_field: {'$in': chunk}}, projection))
+        if owners is not None:
+            owners.update(doc['user']['user_id'] for doc in docs)
+            owners.update(doc['user']['user_id'] for doc in existing)
+        seen_ids = set(seen)
+        gone_ids = sorted({doc[id_field] for doc in existing} - seen_ids)
+        gone = [DeleteMany({id_field: {'$in': gone_chunk}}) for gone_chunk in _chunks(gone_ids)]
+        if is_time_series(collection):
+            # Time-series collections take no upserts: remove stale copies, then insert in order
+            ops = gone + [DeleteMany({id_field: {'$in': seen_chunk}}) for seen_chunk in _chunks(seen)]
+            ops += [InsertOne(doc) for doc in docs]
+            if ops:
+                coll.bulk_write(ops, ordered=True)
+            deleted += len(gone_ids)
+        else:
+            ops = [ReplaceOne({id_field: doc[id_field]}, doc, upsert=True) for doc in docs] + gone
+            if ops:
+                result = coll.bulk_write(ops, ordered=False)
+                deleted += result.deleted_count if result.acknowledged else 0
+        written += len(seen)
+    return written, deleted
+
+
+def _raise_counters(high_water: Dict[str, int]):
+    counters = get_collection('counters')
+    for table, id_column in migration.HIGH_WATER_TABLES.items():
+        counters.update_one({'_id': id_column}, {'$max': {'seq': high_water[table]}}, upsert=True)
+
+
+def _in_clause(column: str, ids: list[int]) -> tuple[str, tuple]:
+    return f"{column} IN ({', '.join(['%s'] * len(ids))})", tuple(ids)
+
+
+def _chunks(ids: list[int]) -> Iterator[list[int]]:
+    for i in range(0, len(ids), SYNC_CHUNK_SIZE):
+        yield ids[i:i + SYNC_CHUNK_SIZE]
@@ -0,0 +1,210 @@
+"""
+Reverse migration MongoDB -> MariaDB.
+
+Streams every collection with large cursor batches and un-denormalises the
+documents back into the relational tables:
+- users: Users rows, embedded devices -> Device, friends -> Friendships
+- media: Media rows, type_details -> Film or Series
+- sessions, watch_history, families: one row each, embedded copies are dropped
+Nothing is reset unless MongoDB is reachable and holds users and media. Rows are
+bulk-loaded with multi-row inserts on connections with foreign key and unique
+checks disabled (as snapshot restores do), then the auto increment counters
+continue from the Mongo `counters`.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date
+from typing import Dict, Any
+from .mongodb_connection import get_collection
+from ..mariadb import mariadb
+from ..mariadb.mariadb_connection import get_mariadb
+
+REVERSE_BATCH_SIZE = int(os.getenv('REVERSE_MIGRATION_BATCH_SIZE', '10000'))
+REVERSE_WORKERS = int(os.getenv('REVERSE_MIGRATION_WORKERS', '5'))
+
+# table -> (id column, Mongo counter name); auto increment continues after max(counter, max id)
+AUTO_INCREMENT_COUNTERS = {
+    'Users': ('user_id', 'user_id'),
+    'Media': ('media_id', 'media_id'),
+    'Sessions': ('session_id', 'session_id'),
+    'WatchHistory': ('watch_history_id', 'watch_history_id'),
+    'Family': ('family_id', 'family_id'),
+}
+
+
+class _TableLoader:
+    """Buffers rows of one table and writes them as multi-row INSERTs on a shared connection."""
+
+    def __init__(self, cursor, table: str, columns: list[str], ignore: bool = False):
+        self.cursor = cursor
+        self.table = table
+        self.sql = (
+            f"INSERT {'IGNORE ' if ignore else ''}INTO `{table}` "
+            f"({', '.join(f'`{c}`' for c in columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+        )
+        self.rows = []
+        self.count = 0
+
+    def add(self, row: tuple):
+        self.rows.append(row)
+        if len(self.rows) >= REVERSE_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            # pymysql rewrites executemany INSERT ... VALUES into multi-row statements
+            self.cursor.executemany(self.sql, self.rows)
+            self.count += len(self.rows)
+            self.rows = []
+
+
+def _as_date(value: Any) -> date | None:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _load_collection(collection: str, tables: Dict[str, tuple[list[str], bool]], to_rows) -> Dict[str, int]:
+    """
+    Streams one collection into its tables on a dedicated connection.
+    to_rows(doc, loaders) adds the rows of one document to the table loaders.
+    """
+    start = time.perf_counter()
+    with get_mariadb() as connection:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+                cursor.execute("SET UNIQUE_CHECKS = 0")
+                loaders = {
+                    table: _TableLoader(cursor, table, columns, ignore)
+                    for table, (columns, ignore) in tables.items()
+                }
+                documents = get_collection(collection).find({}, {'_id': 0}).batch_size(REVERSE_BATCH_SIZE)
+                for doc in documents:
+                    to_rows(doc, loaders)
+                for loader in loaders.values():
+                    loader.flush()
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+
+    counts = {table: loader.count for table, loader in loaders.items()}
+    print(f"  [{collection}] {counts} in {time.perf_counter() - start:.2f}s")
+    return counts
+
+
+def _user_rows(u: Dict, loaders: Dict[str, _TableLoader]):
+    loaders['Users'].add((
+        u['user_id'], u.get('user_name'), u.get('email'), _as_date(u.get('birthday')),
+        u.get('location'), u.get('bio'), u.get('family_id'),
+    ))
+    for d in u.get('devices') or []:
+        loaders['Device'].add((
+            d.get('device_id'), d.get('device_name'), _as_date(d.get('registration_date')), u['user_id'],
+        ))
+    for friend_id in u.get('friends') or []:
+        if friend_id != u['user_id']:
+            loaders['Friendships'].add((u['user_id'], friend_id))
+
+
+def _media_rows(m: Dict, loaders: Dict[str, _TableLoader]):
+    loaders['Media'].add((
+        m['media_id'], m.get('media_name'), m.get('genre'), m.get('prod_year'),
+        m.get('description'), m.get('location'), m.get('cost_per_day'),
+    ))
+    details = m.get('type_details') or {}
+    if m.get('type') == 'film':
+        loaders['Film'].add((details.get('duration'), details.get('number_of_parts'), m['media_id']))
+    elif m.get('type') == 'series':
+        loaders['Series'].add((details.get('number_of_episodes'), details.get('is_ongoing'), m['media_id']))
+
+
+def _session_rows(s: Dict, loaders: Dict[str, _TableLoader]):
+    loaders['Sessions'].add((
+        s['session_id'], s['user']['user_id'], s['media']['media_id'],
+        s.get('date_of_rent'), s.get('cost'), s.get('duration'),
+    ))
+
+
+def _watch_history_rows(w: Dict, loaders: Dict[str, _TableLoader]):
+    loaders['WatchHistory'].add((
+        w['watch_history_id'], w['user']['user_id'], w['media']['media_id'],
+        _as_date(w.get('date_of_watch')), bool(w.get('family_watch')),
+    ))
+
+
+def _family_rows(f: Dict, loaders: Dict[str, _TableLoader]):
+    loaders['Family'].add((f['family_id'], f.get('family_type'), _as_date(f.get('creation_date'))))
+
+
+# collection -> ({table: (columns, insert ignore)}, document -> rows)
+REVERSE_STEPS = {
+    'users': ({
+        'Users': (['user_id', 'user_name', 'email', 'birthday', 'location', 'bio', 'family_id'], False),
+        'Device': (['device_id', 'device_name', 'registration_date', 'user_id'], True),
+        'Friendships': (['user_id', 'friend_id'], True),
+    }, _user_rows),
+    'media': ({
+        'Media': (['media_id', 'media_name', 'genre', 'prod_year', 'descr', 'location', 'cost_per_day'], False),
+        'Film': (['duration', 'number_of_parts', 'media_id'], False),
+        'Series': (['number_of_episodes', 'is_ongoing', 'media_id'], False),
+    }, _media_rows),
+    'sessions': ({
+        'Sessions': (['session_id', 'user_id', 'media_id', 'date_of_rent', 'cost', 'duration'], False),
+    }, _session_rows),
+    'watch_history': ({
+        'WatchHistory': (['watch_history_id', 'user_id', 'media_id', 'date_of_watch', 'family_watch'], False),
+    }, _watch_history_rows),
+    'families': ({
+        'Family': (['family_id', 'family_type', 'creation_date'], False),
+    }, _family_rows),
+}
+
+
+def _check_source():
+    """Reads MongoDB before anything is reset; raises ValueError when there is nothing to switch back to."""
+    for collection in ('users', 'media'):
+        if get_collection(collection).estimated_document_count() == 0:
+            raise ValueError(f"MongoDB collection {collection} is empty, MariaDB was left unchanged")
+
+
+def _restore_auto_increments():
+    counters = {c['_id']: c.get('seq', 0) for c in get_collection('counters').find()}
+    with get_mariadb() as connection:
+        with connection.cursor() as cursor:
+            for table, (id_column, counter) in AUTO_INCREMENT_COUNTERS.items():
+                cursor.execute(f"SELECT COALESCE(MAX(`{id_column}`), 0) AS max_id FROM `{table}`")
+                max_id = cursor.fetchone()['max_id']
+                next_id = max(counters.get(counter, 0), max_id) + 1
+                cursor.execute(f"ALTER TABLE `{table}` AUTO_INCREMENT = {int(next_id)}")
+
+
+def migrate_to_sql() -> Dict[str, Any]:
+    """Replace the MariaDB contents with the data currently stored in MongoDB."""
+    try:
+        print("\n" + "="*60)
+        print("MIGRATING DATA FROM MONGODB TO SQL")
+        print("="*60)
+        start = time.perf_counter()
+
+        _check_source()
+        mariadb.reset_all_tables()
+        with ThreadPoolExecutor(max_workers=REVERSE_WORKERS) as pool:
+            futures = {
+                collection: pool.submit(_load_collection, collection, tables, to_rows)
+                for collection, (tables, to_rows) in REVERSE_STEPS.items()
+            }
+            counts = {}
+            for future in futures.values():
+                counts.update(future.result())
+        _restore_auto_increments()
+
+        print(f" Rows loaded: {counts}, total time {time.perf_counter() - start:.2f}s")
+        print("="*60 + "\n")
+        return counts
+    except Exception as e:
+        print(f"\n REVERSE MIGRATION ERROR: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        raise
@@ -0,0 +1,177 @@
+"""
+SQL <-> MongoDB consistency verifier.
+
+Each collection is partitioned by id range. For every partition both sides compute
+a document count and an order-independent checksum (sum of per-document hashes)
+over the documents the migration would produce from SQL and the documents stored
+in MongoDB. Only partitions whose checksums differ are split further, down to
+small ranges where individual ids are compared, so the cost of a verification is
+one pass over the data plus a small amount of drill-down.
+"""
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Dict, Any
+from bson.decimal128 import Decimal128
+from pymongo import ReadPreference
+from .mongodb_connection import get_collection
+from ..mariadb import mariadb
+from . import mongo_migration as migration
+
+VERIFY_WORKERS = int(os.getenv('VERIFY_WORKERS', '8'))
+VERIFY_PARTITIONS = int(os.getenv('VERIFY_PARTITIONS', '64'))
+# Mismatched ranges are split into this many sub-ranges until at most VERIFY_LEAF_SIZE ids wide
+VERIFY_DRILL_FANOUT = 16
+VERIFY_LEAF_SIZE = 256
+# Cap on reported ids per category and collection
+VERIFY_MAX_IDS = 100
+
+# Fields added by the API insert helpers that have no SQL source column
+IGNORED_FIELDS = {'_id': 0, 'created_at': 0}
+
+_HASH_MOD = 2 ** 64
+
+
+def _canonical_value(value: Any) -> str:
+    # SQL side yields date/Decimal, Mongo side the BSON-encoded datetime/Decimal128
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day).isoformat()
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    return str(value)
+
+
+def _fingerprint(doc: Dict) -> int:
+    canonical = json.dumps(doc, sort_keys=True, default=_canonical_value, separators=(',', ':'))
+    return int.from_bytes(hashlib.blake2b(canonical.encode(), digest_size=8).digest(), 'big')
+
+
+def _primary(collection: str):
+    # Whatever MONGODB_READ_PREFERENCE says: a lagging secondary would report writes
+    # it hasn't applied yet as mismatches
+    return get_collection(collection).with_options(read_preference=ReadPreference.PRIMARY)
+
+
+def _sql_documents(step: tuple, lo: int, hi: int):
+    _, _, _, sql_column, documents, _ = step
+    return documents(*migration._range_clause(sql_column, (lo, hi)))
+
+
+def _mongo_documents(step: tuple, lo: int, hi: int):
+    collection, _, id_field, *_ = step
+    return _primary(collection).find(
+        {id_field: {'$gte': lo, '$lte': hi}}, IGNORED_FIELDS
+    ).batch_size(migration.MIGRATION_BATCH_SIZE)
+
+
+def _range_digest(step: tuple, lo: int, hi: int) -> tuple[tuple[int, int], tuple[int, int]]:
+    """((sql_count, sql_checksum), (mongo_count, mongo_checksum)) for ids in [lo, hi]."""
+    digests = []
+    for docs in (_sql_documents(step, lo, hi), _mongo_documents(step, lo, hi)):
+        count = checksum = 0
+        for doc in docs:
+            count += 1
+            checksum = (checksum + _fingerprint(doc)) % _HASH_MOD
+        digests.append((count, checksum))
+    return digests[0], digests[1]
+
+
+def _range_fingerprints(step: tuple, lo: int, hi: int) -> tuple[Dict[int, int], Dict[int, int]]:
+    id_field = step[2]
+    sql = {doc[id_field]: _fingerprint(doc) for doc in _sql_documents(step, lo, hi)}
+    mongo = {doc[id_field]: _fingerprint(doc) for doc in _mongo_documents(step, lo, hi)}
+    return sql, mongo
+
+
+def _key_bounds(step: tuple) -> tuple[int, int] | None:
+    """Smallest and largest id present on either side."""
+    collection, table, id_field, *_ = step
+    row = mariadb.execute_select_one(f"SELECT MIN(`{id_field}`) AS lo, MAX(`{id_field}`) AS hi FROM `{table}`", ())
+    bounds = [(row['lo'], row['hi'])] if row and row['lo'] is not None else []
+    coll = _primary(collection)
+    first = coll.find_one({}, {id_field: 1}, sort=[(id_field, 1)])
+    last = coll.find_one({}, {id_field: 1}, sort=[(id_field, -1)])
+    if first and last:
+        bounds.append((first[id_field], last[id_field]))
+    if not bounds:
+        return None
+    return min(b[0] for b in bounds), max(b[1] for b in bounds)
+
+
+def _split(lo: int, hi: int, parts: int) -> list[tuple[int, int]]:
+    step = max(1, -(-(hi - lo + 1) // parts))
+    return [(start, min(start + step - 1, hi)) for start in range(lo, hi + 1, step)]
+
+
+def _verify_range(step: tuple, lo: int, hi: int) -> Dict[str, Any]:
+    """Compares one range; drills down into sub-ranges only when the checksums differ."""
+    report = {'sql_count': 0, 'mongo_count': 0, 'mismatched_ranges': 0,
+              'missing_in_mongo': [], 'missing_in_sql': [], 'different': []}
+
+    (sql_count, sql_sum), (mongo_count, mongo_sum) = _range_digest(step, lo, hi)
+    report['sql_count'], report['mongo_count'] = sql_count, mongo_count
+    if (sql_count, sql_sum) == (mongo_count, mongo_sum):
+        return report
+    report['mismatched_ranges'] = 1
+
+    if hi - lo + 1 <= VERIFY_LEAF_SIZE:
+        sql, mongo = _range_fingerprints(step, lo, hi)
+        report['missing_in_mongo'] = sorted(sql.keys() - mongo.keys())
+        report['missing_in_sql'] = sorted(mongo.keys() - sql.keys())
+        report['different'] = sorted(k for k in sql.keys() & mongo.keys() if sql[k] != mongo[k])
+        return report
+
+    for sub in _split(lo, hi, VERIFY_DRILL_FANOUT):
+        sub_report = _verify_range(step, *sub)
+        report['mismatched_ranges'] += sub_report['mismatched_ranges']
+        for key in ('missing_in_mongo', 'missing_in_sql', 'different'):
+            report[key].extend(sub_report[key])
+    return report
+
+
+def verify_consistency(collections: list[str] | None = None) -> Dict[str, Any]:
+    """
+    Verifies that MongoDB documents match what the migration builds from MariaDB.
+    Returns per collection counts, number of mismatched ranges and the differing ids.
+    """
+    start = time.perf_counter()
+    steps = [step for step in migration.MIGRATION_STEPS if collections is None or step[0] in collections]
+
+    tasks = []
+    for step in steps:
+        bounds = _key_bounds(step)
+        if bounds is None:
+            continue
+        for lo, hi in _split(*bounds, VERIFY_PARTITIONS):
+            tasks.append((step, lo, hi))
+
+    with ThreadPoolExecutor(max_workers=VERIFY_WORKERS) as pool:
+        partial = list(pool.map(lambda task: (task[0][0], _verify_range(*task)), tasks))
+
+    result: Dict[str, Any] = {}
+    for step in steps:
+        result[step[0]] = {'sql_count': 0, 'mongo_count': 0, 'partitions': 0, 'mismatched_ranges': 0,
+                           'missing_in_mongo': [], 'missing_in_sql': [], 'different': []}
+    for collection, report in partial:
+        r = result[collection]
+        r['partitions'] += 1
+        for key in ('sql_count', 'mongo_count', 'mismatched_ranges'):
+            r[key] += report[key]
+        for key in ('missing_in_mongo', 'missing_in_sql', 'different'):
+            r[key].extend(report[key])
+
+    for r in result.values():
+        r['ok'] = r['mismatched_ranges'] == 0
+        for key in ('missing_in_mongo', 'missing_in_sql', 'different'):
+            r[key] = sorted(r[key])[:VERIFY_MAX_IDS]
+
+    elapsed = time.perf_counter() - start
+    ok = all(r['ok'] for r in result.values())
+    print(f"Consistency check {'passed' if ok else 'FAILED'} in {elapsed:.2f}s")
+    return {'ok': ok, 'elapsed': round(elapsed, 2), 'collections': result}
@@ -10,59 +10,173 @@ NOSQL DESIGN DECISIONS:
 5. NO FOREIGN KEYS: Use embedded documents instead
 """
 
+import os
+import threading
 from datetime import datetime, date
 from typing import List, Dict, Any, Optional
-from .mongodb_connection import get_collection, list_all_collections
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from .mongodb_connection import get_collection, get_mongodb_connection, export_collections, MONGODB_EXPORT_BATCH_SIZE
+from .mongo_indexes import apply_indexes
 from bson.objectid import ObjectId
 from ..mariadb import mariadb
+from ... import shared_state
 
 
-COLLECTIONS = ['users', 'media', 'sessions', 'watch_history', 'families', 'counters']
+COLLECTIONS = ['users', 'media', 'sessions', 'rental_buckets', 'watch_history', 'families', 'counters', 'sync_state', 'migration_checkpoints']
 
-def convert_dates_to_datetime(obj: Any) -> Any:
+# watch_history is a time-series collection: MongoDB groups the events of one user
+# (the metaField) into compressed bucket documents per time window, so range reads
+# touch a few buckets and TTL expiry drops whole buckets at once.
+WATCH_HISTORY_GRANULARITY = os.getenv('WATCH_HISTORY_GRANULARITY', 'hours')
+# 0 keeps watch history forever
+WATCH_HISTORY_TTL_DAYS = int(os.getenv('WATCH_HISTORY_TTL_DAYS', '0'))
+
+# Collections that must be created with options; a first insert would create a plain one
+COLLECTION_OPTIONS = {
+    'watch_history': {
+        'timeseries': {'timeField': 'date_of_watch', 'metaField': 'user', 'granularity': WATCH_HISTORY_GRANULARITY},
+        **({'expireAfterSeconds': WATCH_HISTORY_TTL_DAYS * 86400} if WATCH_HISTORY_TTL_DAYS else {}),
+    },
+}
+
+
+def is_time_series(collection_name: str) -> bool:
+    """Time-series collections have no unique indexes and are written with delete + insert instead of upserts."""
+    return 'timeseries' in COLLECTION_OPTIONS.get(collection_name, {})
+
+
+def create_collections():
+    """Creates the collections of COLLECTION_OPTIONS that don't exist yet and applies TTL changes."""
+    db = get_mongodb_connection()
+    existing = {c['name']: c.get('options', {}) for c in db.list_collections()}
+    for name, options in COLLECTION_OPTIONS.items():
+        if name not in existing:
+            db.create_collection(name, **options)
+        elif 'timeseries' in options and 'timeseries' not in existing[name]:
+            print(f"Warning: {name} is not a time-series collection, reset or migrate to convert it")
+        elif existing[name].get('expireAfterSeconds') != options.get('expireAfterSeconds'):
+            db.command('collMod', name, expireAfterSeconds=options.get('expireAfterSeconds', 'off'))
+
+# Ids reserved per round trip to `counters`; every process hands out its block locally
+ID_BLOCK_SIZE = int(os.getenv('MONGODB_ID_BLOCK_SIZE', '100'))
+
+
+class IdAllocator:
     """
-    Recursively convert all datetime.date objects to datetime.datetime objects.
-    PyMongo cannot serialize date objects - only datetime objects.
+    Hi/lo id allocator simulating SQL AUTO_INCREMENT in MongoDB.
+    One $inc of ID_BLOCK_SIZE on the sequence's counter reserves a range of ids
+    for this process. The increment is atomic, so ranges never overlap between
+    threads or uvicorn workers; ids are unique and increasing, but not gap free.
+    When one worker resets the counters it bumps a shared generation counter, and
+    every worker drops its reserved ranges before handing out the next id.
     """
-    if isinstance(obj, date) and not isinstance(obj, datetime):
-        return datetime.combine(obj, datetime.min.time())
-    elif isinstance(obj, dict):
-        return {key: convert_dates_to_datetime(value) for key, value in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_dates_to_datetime(item) for item in obj]
-    return obj
+
+    GENERATION = 'mongodb.id_generation'
+
+    def __init__(self, block_size: int):
+        self.block_size = block_size
+        self.blocks: Dict[str, list[int]] = {}  # sequence -> [next id, last reserved id]
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def next_id(self, sequence_name: str) -> int:
+        generation = shared_state.counters().get(self.GENERATION)
+        with self.lock:
+            if generation != self.generation:
+                self.blocks.clear()
+                self.generation = generation
+            block = self.blocks.get(sequence_name)
+            if block is None or block[0] > block[1]:
+                block = self.blocks[sequence_name] = self._reserve(sequence_name)
+            block[0] += 1
+            return block[0] - 1
+
+    def _reserve(self, sequence_name: str) -> list[int]:
+        result = get_collection('counters').find_one_and_update(
+            {'_id': sequence_name},
+            {'$inc': {'seq': self.block_size}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return [result['seq'] - self.block_size + 1, result['seq']]
+
+    def discard(self, sequence_name: str = None):
+        """
+        Forgets reserved ids, e.g. after the counters were reset or rewritten;
+        without a sequence name all workers forget theirs.
+        """
+        with self.lock:
+            if sequence_name is None:
+                self.blocks.clear()
+                shared_state.counters().add(self.GENERATION)
+            else:
+                self.blocks.pop(sequence_name, None)
+
+    def _after_fork(self):
+        # A forked child must not hand out the ids reserved by its parent
+        self.blocks = {}
+        self.lock = threading.Lock()
+
+
+_id_allocator = IdAllocator(ID_BLOCK_SIZE)
+os.register_at_fork(after_in_child=_id_allocator._after_fork)
+
 
 def get_next_sequence(sequence_name: str) -> int:
+    """Next id of a sequence, served from this process's reserved block."""
+    return _id_allocator.next_id(sequence_name)
+
+
+def discard_id_blocks():
+    _id_allocator.discard()
+
+
+def _insert_with_id(collection, id_field: str, doc: Dict) -> int:
     """
-    Get next sequential ID for a collection.
-    Simulates SQL AUTO_INCREMENT in MongoDB.
+    Assigns doc[id_field] from its sequence and inserts the document.
+    Another worker may still hand out ids from a block reserved before the
+    counters were reset; the unique id index rejects those, and the insert is
+    retried with a freshly reserved block. Time-series collections (watch_history)
+    have no unique indexes, so uniqueness of their ids rests on the allocator alone:
+    drop_all_collections, the only counter reset, calls discard_id_blocks, whose
+    generation bump makes all workers drop their reserved blocks before the next id.
     """
-    counters = get_collection('counters')
-    result = counters.find_one_and_update(
-        {'_id': sequence_name},
-        {'$inc': {'seq': 1}},
-        upsert=True,
-        return_document=True
-    )
-    return result['seq']
+    for attempt in range(3):
+        doc[id_field] = get_next_sequence(id_field)
+        try:
+            collection.insert_one(doc)
+            return doc[id_field]
+        except DuplicateKeyError:
+            if attempt == 2:
+                raise
+            doc.pop('_id', None)
+            _id_allocator.discard(id_field)
 
 
 def reset_all_collections():
+    drop_all_collections()
+    create_indexes()
+    print("All MongoDB collections reset")
+
+def drop_all_collections():
     for coll_name in COLLECTIONS:
         collection = get_collection(coll_name)
         collection.drop()
-  
-    get_collection('users').create_index('user_id', unique=True)
-    get_collection('media').create_index('media_id', unique=True)
-    get_collection('sessions').create_index('session_id', unique=True)
-    get_collection('sessions').create_index('user.user_id')
-    get_collection('watch_history').create_index('user.user_id')
-    get_collection('families').create_index('families.family_id')
-    
-    print("All MongoDB collections reset")
+    discard_id_blocks()
+
+def create_indexes():
+    """
+    Applies the declarative index spec (mongo_indexes.INDEX_SPECS). Bulk loads call
+    this after inserting, so documents are not indexed one by one during the load.
+    """
+    create_collections()
+    apply_indexes()
 
-def get_all_collections() :
-    return list_all_collections()
+def get_all_collections(collections: List[str] = None, fields: List[str] = None, limit: int = None,
+                        after: str = None, batch_size: int = MONGODB_EXPORT_BATCH_SIZE):
+    """NDJSON byte chunks of the requested collections, see export_collections."""
+    return export_collections(collections, fields, limit, after, batch_size)
 
 def insert_user(user_name: str, email: str, birthday: datetime, location: str, 
                 bio: str, family_id: int,
@@ -74,10 +188,9 @@ def insert_user(user_name: str, email: str, birthday: datetime, location: str,
     Returns: user_id
     """
     users = get_collection('users')
-    user_id = get_next_sequence('user_id')
     
     user_doc = {
-        'user_id': user_id,
+        'user_id': None,
         'user_name': user_name,
         'email': email,
         'birthday': birthday,
@@ -89,8 +202,7 @@ def insert_user(user_name: str, email: str, birthday: datetime, location: str,
         'created_at': datetime.now()
     }
     
-    users.insert_one(user_doc)
-    return user_id
+    return _insert_with_id(users, 'user_id', user_doc)
 
 
 def get_user_by_id(user_id: int) -> Optional[Dict]:
@@ -111,10 +223,9 @@ def insert_media(media_name: str, genre: str, prod_year: int, descr: str,
     Returns: media_id
     """
     media = get_collection('media')
-    media_id = get_next_sequence('media_id')
     
     media_doc = {
-        'media_id': media_id,
+        'media_id': None,
         'media_name': media_name,
         'genre': genre,
         'prod_year': prod_year,
@@ -126,8 +237,7 @@ def insert_media(media_name: str, genre: str, prod_year: int, descr: str,
         'created_at': datetime.now()
     }
     
-    media.insert_one(media_doc)
-    return media_id
+    return _insert_with_id(media, 'media_id', media_doc)
 
 
 def get_media_by_id(media_id: int) -> Optional[Dict]:
@@ -148,7 +258,7 @@ def insert_rental_session(user_id: int, media_id: int, duration: int) -> Dict:
     Create rental session with DENORMALIZED user and media data.
     Returns: Complete session document
     """
-    sessions = get_collection('sessions')
+    sessions = get_collection('sessions', 'critical')
     
     user = get_user_by_id(user_id)
     if not user:
@@ -160,10 +270,8 @@ def insert_rental_session(user_id: int, media_id: int, duration: int) -> Dict:
     
     cost = media['cost_per_day'] * duration
     
-    session_id = get_next_sequence('session_id')
-    
     session_doc = {
-        'session_id': session_id,
+        'session_id': None,
         'user': {  
             'user_id': user['user_id'],
             'user_name': user['user_name'],
@@ -182,26 +290,130 @@ def insert_rental_session(user_id: int, media_id: int, duration: int) -> Dict:
         'created_at': datetime.now()
     }
     
-    sessions.insert_one(session_doc)
+    _insert_with_id(sessions, 'session_id', session_doc)
     
     session_doc.pop('_id', None)
+    add_to_rental_bucket(session_doc)
     return session_doc
 
 
-def get_user_rentals(user_id: int) -> List[Dict]:
+# RENTAL BUCKETS: a user's sessions grouped into bounded documents, newest bucket last.
+# {user_id, user, count, spend, first_rent, last_rent, rentals: [session without user, newest first]}
+# Derived from `sessions`, which stays the source of truth for migration and sync.
 
-    sessions = get_collection('sessions')
-    
-    # Single query - all data already embedded
-    rentals = list(sessions.find(
-        {'user.user_id': user_id},
-        {'_id': 0}
-    ).sort('date_of_rent', -1))
+RENTAL_BUCKET_SIZE = int(os.getenv('RENTAL_BUCKET_SIZE', '100'))
+
+
+def _rental_entry(session: Dict) -> Dict:
+    return {key: value for key, value in session.items() if key not in ('_id', 'user')}
+
+
+def _rental_bucket(user: Dict, rentals: List[Dict]) -> Dict:
+    return {
+        'user_id': user['user_id'],
+        'user': user,
+        'count': len(rentals),
+        'spend': sum(r['cost'] or 0 for r in rentals),
+        'first_rent': rentals[-1]['date_of_rent'],
+        'last_rent': rentals[0]['date_of_rent'],
+        'rentals': rentals,
+    }
+
+
+def add_to_rental_bucket(session: Dict):
+    """Appends a new session to its user's open bucket, or starts a new bucket when it is full."""
+    get_collection('rental_buckets', 'critical').update_one(
+        {'user_id': session['user']['user_id'], 'count': {'$lt': RENTAL_BUCKET_SIZE}},
+        {
+            '$push': {'rentals': {'$each': [_rental_entry(session)], '$position': 0}},
+            '$inc': {'count': 1, 'spend': session['cost']},
+            '$min': {'first_rent': session['date_of_rent']},
+            '$max': {'last_rent': session['date_of_rent']},
+            '$setOnInsert': {'user': session['user']},
+        },
+        upsert=True
+    )
 
+
+def rebuild_rental_buckets(user_ids: List[int] = None) -> int:
+    """
+    Rebuilds the rental buckets of the given users (all users when None) from `sessions`.
+    Sessions are read in (user, newest first) order from the user rentals index; the
+    newest bucket of a user is the partial one, so add_to_rental_bucket keeps filling it.
+    Returns the number of buckets written.
+    """
+    buckets = get_collection('rental_buckets')
+    query = {} if user_ids is None else {'user.user_id': {'$in': user_ids}}
+    buckets.delete_many({} if user_ids is None else {'user_id': {'$in': user_ids}})
+
+    sessions = get_collection('sessions').find(query, {'_id': 0}).sort(
+        [('user.user_id', 1), ('date_of_rent', -1)]
+    ).batch_size(5000)
+
+    written = 0
+    batch = []
+
+    def add_user(user: Dict, rentals: List[Dict]):
+        nonlocal written, batch
+        first = len(rentals) % RENTAL_BUCKET_SIZE or RENTAL_BUCKET_SIZE
+        for start in [0] + list(range(first, len(rentals), RENTAL_BUCKET_SIZE)):
+            end = first if start == 0 else start + RENTAL_BUCKET_SIZE
+            batch.append(_rental_bucket(user, rentals[start:end]))
+        if len(batch) >= 1000:
+            buckets.insert_many(batch, ordered=False)
+            written += len(batch)
+            batch = []
+
+    user, rentals = None, []
+    for session in sessions:
+        if user is not None and session['user']['user_id'] != user['user_id']:
+            add_user(user, rentals)
+            rentals = []
+        user = session['user']
+        rentals.append(_rental_entry(session))
+    if rentals:
+        add_user(user, rentals)
+    if batch:
+        buckets.insert_many(batch, ordered=False)
+        written += len(batch)
+    return written
+
+
+def get_user_rentals(user_id: int, limit: int = None) -> List[Dict]:
+    """
+    Rentals of a user newest first, read from the user's rental buckets:
+    one document per RENTAL_BUCKET_SIZE rentals instead of one per session.
+    With limit, only the newest buckets needed to fill it are read.
+    """
+    buckets = get_collection('rental_buckets').find(
+        {'user_id': user_id}, {'_id': 0}
+    ).sort('last_rent', -1)
+
+    rentals = []
+    for bucket in buckets:
+        for rental in bucket['rentals']:
+            rentals.append({**rental, 'user': bucket['user']})
+        if limit is not None and len(rentals) >= limit:
+            break
+
+    rentals.sort(key=lambda r: r['date_of_rent'], reverse=True)
     for rental in rentals:
         rental['media_name'] = rental['media']['media_name']  # helper for the frontend
-    
-    return rentals
+
+    return rentals[:limit] if limit is not None else rentals
+
+
+def get_user_rental_summary(user_id: int) -> Dict:
+    """Rental count and total spend of a user from the precomputed bucket totals."""
+    totals = list(get_collection('rental_buckets').aggregate([
+        {'$match': {'user_id': user_id}},
+        {'$group': {'_id': None, 'count': {'$sum': '$count'}, 'spend': {'$sum': '$spend'},
+                    'first_rent': {'$min': '$first_rent'}, 'last_rent': {'$max': '$last_rent'}}},
+    ]))
+    summary = {'user_id': user_id, 'count': 0, 'spend': 0, 'first_rent': None, 'last_rent': None}
+    if totals:
+        summary.update({key: totals[0][key] for key in ('count', 'spend', 'first_rent', 'last_rent')})
+    return summary
 
 
 def get_all_sessions() -> List[Dict]:
@@ -225,10 +437,9 @@ def insert_watch_history(user_id: int, media_id: int, family_watch: bool) -> int
     if not media:
         raise ValueError(f"Media {media_id} not found")
     
-    watch_id = get_next_sequence('watch_history_id')
   
     watch_doc = {
-        'watch_history_id': watch_id,
+        'watch_history_id': None,
         'user': {  
             'user_id': user['user_id'],
             'user_name': user['user_name'],
@@ -244,8 +455,7 @@ def insert_watch_history(user_id: int, media_id: int, family_watch: bool) -> int
         'created_at': datetime.now()
     }
     
-    watch_history.insert_one(watch_doc)
-    return watch_id
+    return _insert_with_id(watch_history, 'watch_history_id', watch_doc)
 
 def insert_family(family_type: str, creation_date: datetime, users: List[Dict] = None, ) -> int:
     """
@@ -253,18 +463,16 @@ def insert_family(family_type: str, creation_date: datetime, users: List[Dict] =
     """
     families = get_collection('families')
     
-    family_id = get_next_sequence('watch_history_id')
   
     family_doc = {
-        'family_id': family_id,
+        'family_id': None,
         'family_type': family_type,
         'users': users or [],
         'creation_date': creation_date,
         'created_at': datetime.now()
     }
     
-    families.insert_one(family_doc)
-    return family_id
+    return _insert_with_id(families, 'family_id', family_doc)
 
 # DATA GENERATION FOR TESTING
 
@@ -364,11 +572,11 @@ def generate_sample_data():
 
 def get_database_stats() -> Dict:
     """Get statistics about MongoDB collections"""
-    collections = ['users', 'media', 'sessions', 'watch_history', 'families']
+    collections = ['users', 'media', 'sessions', 'rental_buckets', 'watch_history', 'families']
     stats = {}
     
     for coll_name in collections:
-        collection = get_collection(coll_name)
+        collection = get_collection(coll_name, 'analytics')
         stats[coll_name] = collection.count_documents({})
     
     return stats
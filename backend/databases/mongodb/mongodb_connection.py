@@ -1,8 +1,18 @@
+import json
 import os
-from pymongo import MongoClient
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from bson.codec_options import TypeEncoder, TypeRegistry
+from bson.decimal128 import Decimal128
+from bson.objectid import ObjectId
+from pymongo import MongoClient, ReadPreference, monitoring
+from pymongo.write_concern import WriteConcern
 from pymongo.collection import Collection
-from pymongo.errors import ConnectionFailure
-from typing import Dict, List
+from pymongo.errors import ConnectionFailure, PyMongoError
+from typing import Dict, List, Iterator
+from ... import metrics
 
 MONGODB_HOST = os.getenv('MONGODB_HOST', 'localhost')
 MONGODB_PORT = int(os.getenv('MONGODB_PORT', '27017'))
@@ -13,28 +23,161 @@ MONGODB_DATABASE = os.getenv('MONGODB_DATABASE', 'media_rental_db')
 _client = None
 _db = None
 
+
+class DateEncoder(TypeEncoder):
+    """Stores datetime.date (MariaDB DATE columns) as a BSON datetime at midnight."""
+    python_type = date
+
+    def transform_python(self, value: date) -> datetime:
+        return datetime(value.year, value.month, value.day)
+
+
+class DecimalEncoder(TypeEncoder):
+    """Stores decimal.Decimal (MariaDB DECIMAL columns) as BSON Decimal128."""
+    python_type = Decimal
+
+    def transform_python(self, value: Decimal) -> Decimal128:
+        return Decimal128(value)
+
+
+# Applied by the BSON encoder while serialising, so rows coming from MariaDB
+# can be inserted as they are without a conversion pass in Python.
+TYPE_REGISTRY = TypeRegistry([DateEncoder(), DecimalEncoder()])
+
+# Client tuning
+MONGODB_MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', '100'))
+MONGODB_MIN_POOL_SIZE = int(os.getenv('MONGODB_MIN_POOL_SIZE', '0'))
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS', '5000'))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGODB_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+# zlib is always available, snappy/zstd need python-snappy/zstandard installed
+MONGODB_COMPRESSORS = os.getenv('MONGODB_COMPRESSORS', 'zlib')
+MONGODB_READ_PREFERENCE = os.getenv('MONGODB_READ_PREFERENCE', 'primary')
+MONGODB_CONNECT_RETRIES = int(os.getenv('MONGODB_CONNECT_RETRIES', '10'))
+MONGODB_MONITORING = os.getenv('MONGODB_MONITORING', 'true').lower() == 'true'
+
+CONNECTION_STRING = (
+    f"mongodb://{MONGODB_USER}:{MONGODB_PASSWORD}"
+    f"@{MONGODB_HOST}:{MONGODB_PORT}/"
+    f"?authSource=admin"
+)
+
+MONGODB_CRITICAL_WRITE_CONCERN = os.getenv('MONGODB_CRITICAL_WRITE_CONCERN', 'majority')
+
+_READ_PREFERENCES = {
+    'primary': ReadPreference.PRIMARY,
+    'primaryPreferred': ReadPreference.PRIMARY_PREFERRED,
+    'secondary': ReadPreference.SECONDARY,
+    'secondaryPreferred': ReadPreference.SECONDARY_PREFERRED,
+    'nearest': ReadPreference.NEAREST,
+}
+
+# Read preference and write concern per operation type, applied by get_collection(name, profile)
+#   default:   regular API reads and writes
+#   critical:  writes that must survive a failover (rentals)
+#   analytics: heavy reads that may be served by secondaries (stats, exports)
+OPERATION_PROFILES = {
+    'default': (_READ_PREFERENCES[MONGODB_READ_PREFERENCE], WriteConcern(w=1)),
+    # w is a node count ("2") or a tag/mode name ("majority")
+    'critical': (ReadPreference.PRIMARY, WriteConcern(
+        w=int(MONGODB_CRITICAL_WRITE_CONCERN) if MONGODB_CRITICAL_WRITE_CONCERN.isdigit() else MONGODB_CRITICAL_WRITE_CONCERN,
+        j=True)),
+    'analytics': (_READ_PREFERENCES[os.getenv('MONGODB_ANALYTICS_READ_PREFERENCE', 'secondaryPreferred')], WriteConcern(w=1)),
+}
+
+_client_lock = threading.Lock()
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Records per-command latency histograms (mongodb.command.<name>) and failures."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        metrics.observe(f"mongodb.command.{event.command_name}", event.duration_micros / 1000)
+
+    def failed(self, event):
+        metrics.observe(f"mongodb.command.{event.command_name}", event.duration_micros / 1000)
+        metrics.increment(f"mongodb.command.{event.command_name}.failed")
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Records how long threads wait to check a connection out of the pool (mongodb.pool.wait)."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        started = getattr(self._local, 'started', None)
+        if started is not None:
+            metrics.observe("mongodb.pool.wait", (time.perf_counter() - started) * 1000)
+            self._local.started = None
+
+    def connection_check_out_failed(self, event):
+        metrics.increment(f"mongodb.pool.checkout_failed.{event.reason}")
+        self._local.started = None
+
+    def connection_created(self, event):
+        metrics.increment("mongodb.pool.connections_created")
+
+    def connection_closed(self, event):
+        metrics.increment("mongodb.pool.connections_closed")
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_checked_in(self, event): pass
+
+
+def create_mongodb_client(**overrides) -> MongoClient:
+    """MongoClient configured from the MONGODB_* settings; keyword arguments override them."""
+    options = {
+        'maxPoolSize': MONGODB_MAX_POOL_SIZE,
+        'minPoolSize': MONGODB_MIN_POOL_SIZE,
+        'waitQueueTimeoutMS': MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+        'serverSelectionTimeoutMS': MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        'compressors': MONGODB_COMPRESSORS,
+        'read_preference': OPERATION_PROFILES['default'][0],
+        'type_registry': TYPE_REGISTRY,
+        'event_listeners': [CommandMetricsListener(), PoolMetricsListener()] if MONGODB_MONITORING else [],
+    }
+    options.update(overrides)
+    return MongoClient(CONNECTION_STRING, **options)
+
+
 def get_mongodb_connection():
+    return _connect(MONGODB_CONNECT_RETRIES)
+
+def _connect(retries: int):
 
     global _client, _db
 
-    connection_string = (
-        f"mongodb://{MONGODB_USER}:{MONGODB_PASSWORD}"
-        f"@{MONGODB_HOST}:{MONGODB_PORT}/"
-        f"?authSource=admin"
-    )
-    
-    if _client is None:
-        for attempt in range(10):
+    if _client is not None:
+        return _db
+
+    with _client_lock:
+        if _client is not None:
+            return _db
+        for attempt in range(1, retries + 1):
+            client = create_mongodb_client()
             try:
-                _client = MongoClient(connection_string, serverSelectionTimeoutMS=5000)
-                _client.admin.command('ping')
-                _db = _client[MONGODB_DATABASE]
-                print(f"Connected to MongoDB: {MONGODB_DATABASE}")
-                return _db
+                client.admin.command('ping')
             except ConnectionFailure as e:
-                print(f"Failed to connect to MongoDB: {e}")
-                raise
-    return _db
+                client.close()
+                print(f"Failed to connect to MongoDB (attempt {attempt}/{retries}): {e}")
+                if attempt == retries:
+                    raise
+                time.sleep(min(2 ** (attempt - 1), 10))
+                continue
+            _db = client[MONGODB_DATABASE]
+            _client = client
+            print(f"Connected to MongoDB: {MONGODB_DATABASE}")
+            return _db
 
 def close_mongodb_connection():
     global _client, _db
@@ -44,19 +187,87 @@ def close_mongodb_connection():
         _db = None
         print("MongoDB connection closed")
 
-def get_collection(collection_name: str):
+def _forget_client_after_fork():
+    # MongoClient is not fork-safe: a forked worker opens its own client and pool
+    global _client, _db, _client_lock
+    _client = None
+    _db = None
+    _client_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_forget_client_after_fork)
+
+def ping_mongodb() -> bool:
+    """True when the server answers; connects (a single attempt, no retry wait) if there is no client yet."""
+    try:
+        db = _connect(1)
+        db.client.admin.command('ping')
+        return True
+    except PyMongoError:
+        return False
+
+def get_collection(collection_name: str, profile: str | None = None):
     db = get_mongodb_connection()
-    return db[collection_name]
+    if profile is None:
+        return db[collection_name]
+    read_preference, write_concern = OPERATION_PROFILES[profile]
+    return db.get_collection(collection_name, read_preference=read_preference, write_concern=write_concern)
+
+# Documents per cursor round trip and per NDJSON chunk of the collection export
+MONGODB_EXPORT_BATCH_SIZE = int(os.getenv('MONGODB_EXPORT_BATCH_SIZE', '1000'))
+
+
+def _export_value(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    # Other BSON types (Binary, Timestamp, Regex, UUID, ...) as their string form
+    return str(value)
+
+
+def _export_id(value: str):
+    return ObjectId(value) if ObjectId.is_valid(value) else value
+
 
-def list_all_collections() -> Dict[str, List[dict]]:
+def export_collections(collections: List[str] | None = None, fields: List[str] | None = None,
+                       limit: int | None = None, after: str | None = None,
+                       batch_size: int = MONGODB_EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """
+    Streams collections as NDJSON, one {"collection": ..., "document": ...} line per document.
+    fields projects every document to those fields (plus _id), limit caps the documents
+    per collection, after continues a single collection behind that _id (ascending _id order).
+    Collections are resolved up front so errors surface before the first byte; documents
+    are then read with cursors of batch_size and sent in chunks of the same size, so
+    memory stays constant regardless of the database size.
+    """
     db = get_mongodb_connection()
-    result: Dict[str, List[dict]] = {}
+    # system.buckets.* hold the raw buckets of time-series collections
+    names = [name for name in db.list_collection_names() if not name.startswith('system.')]
+    if collections is not None:
+        missing = sorted(set(collections) - set(names))
+        if missing:
+            raise ValueError(f"Unknown collections: {', '.join(missing)}")
+        names = collections
+    if after is not None and len(names) != 1:
+        raise ValueError("after requires exactly one collection")
+    projection = {field: 1 for field in fields} if fields else None
 
-    for name in db.list_collection_names():
-        collection = db[name]
-        result[name] = [
-            {**doc, "_id": str(doc["_id"])}
-            for doc in collection.find()
-        ]
+    def generate() -> Iterator[bytes]:
+        for name in names:
+            cursor = db[name].find({'_id': {'$gt': _export_id(after)}} if after is not None else {}, projection)
+            if after is not None:
+                cursor = cursor.sort('_id', 1)
+            if limit is not None:
+                cursor = cursor.limit(limit)
+            lines = []
+            for doc in cursor.batch_size(batch_size):
+                lines.append(json.dumps({'collection': name, 'document': doc}, default=_export_value))
+                if len(lines) >= batch_size:
+                    yield ('\n'.join(lines) + '\n').encode()
+                    lines = []
+            if lines:
+                yield ('\n'.join(lines) + '\n').encode()
 
-    return result
+    return generate()
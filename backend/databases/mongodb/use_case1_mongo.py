@@ -1,79 +1,83 @@
 
-from collections import defaultdict
+import os
 from datetime import datetime, timedelta
-from typing import List, Dict
 from .mongodb_connection import get_collection
-from .mongodb import insert_watch_history, get_all_users
+from .mongodb import insert_watch_history
+
+FAMILY_WATCH_RECENT_DAYS = int(os.getenv('FAMILY_WATCH_RECENT_DAYS', '30'))
 
 def load_data():
     """
     Gets all users that are in a family and a family member has an active session
     {"user_id": {"user_name" : ..., "available_media" : [ { "family_member": ..., "media_id": ..., "media_name": ...}, ... ], ... }}
-    """
-
-    result = defaultdict(lambda: {
-        "user_name": None,
-        "available_media": []
-    })
-
-    for u in get_all_users() :
-        user_id = u['user_id']
-        media = get_family_shared_media(user_id, u['family_id'])
-        if not media:
-            continue
-        result[user_id]['user_name'] = u['user_name']
-        result[user_id]["available_media"] = media
-
-    return dict(result)
 
-def get_family_shared_media(user_id: int, family_id: int | None) -> List[Dict]:
-    sessions = get_collection("sessions")
+    One aggregation over families: active sessions of all members are joined via the
+    user.user_id index, then regrouped per family member excluding their own rentals.
+    """
     families = get_collection("families")
-
-    if not family_id:
-        return []
-
-    family = families.find_one(
-        {"family_id": family_id},
-        {"_id": 0, "users": 1}
-    )
-    family_members = [member for member in family["users"] if member["user_id"] != user_id]
-    
-    if not family_members:
-        return []
-
-    member_ids = [m["user_id"] for m in family_members]
-    member_names = {m["user_id"]: m["user_name"] for m in family_members}
-    current_time = datetime.now()
-
-    active_sessions = sessions.find(
-        {"user.user_id": {"$in": member_ids}},
-        {"_id": 0}
-    )
-
-    result: List[Dict] = []
-
-    for session in active_sessions:
-        rental_end = session["date_of_rent"] + timedelta(
-            hours=session["duration"]
-        )
-
-        if rental_end > current_time:
-            result.append({
-                "family_member": member_names.get(session["user"]["user_id"]),
-                "media_id": session["media"]["media_id"],
-                "media_name": session["media"]["media_name"],
-                "type": session["media"]["type"]
-            })
-
-    return result
+    # Rental times are stored as naive local datetimes, so compare against local now
+    pipeline = family_media_pipeline(datetime.now())
+
+    return {
+        row["_id"]: {"user_name": row["user_name"], "available_media": row["available_media"]}
+        for row in families.aggregate(pipeline)
+    }
+
+def family_media_pipeline(current_time: datetime) -> list[dict]:
+    """Aggregation over families behind load_data, rows keyed by the requesting user."""
+    return [
+        # Sharing needs at least two members
+        {"$match": {"users.1": {"$exists": True}}},
+        {"$lookup": {
+            "from": "sessions",
+            "localField": "users.user_id",
+            "foreignField": "user.user_id",
+            "pipeline": [
+                {"$match": {"$expr": {"$gt": [
+                    {"$dateAdd": {"startDate": "$date_of_rent", "unit": "hour", "amount": "$duration"}},
+                    current_time,
+                ]}}},
+                {"$project": {
+                    "_id": 0,
+                    "user_id": "$user.user_id",
+                    "family_member": "$user.user_name",
+                    "media_id": "$media.media_id",
+                    "media_name": "$media.media_name",
+                    "type": "$media.type",
+                }},
+            ],
+            "as": "active",
+        }},
+        {"$match": {"active.0": {"$exists": True}}},
+        {"$unwind": "$users"},
+        {"$unwind": "$active"},
+        {"$match": {"$expr": {"$ne": ["$active.user_id", "$users.user_id"]}}},
+        {"$group": {
+            "_id": "$users.user_id",
+            "user_name": {"$first": "$users.user_name"},
+            "available_media": {"$push": {
+                "family_member": "$active.family_member",
+                "media_id": "$active.media_id",
+                "media_name": "$active.media_name",
+                "type": "$active.type",
+            }},
+        }},
+        {"$sort": {"user_name": 1, "_id": 1}},
+    ]
 
 def watch_media(user_id: int, media_id: int) -> list[dict]:
-    insert_watch_history(user_id, media_id, 1)
+    insert_watch_history(user_id, media_id, True)
     result = get_family_watches()
     return result
 
-def get_family_watches() -> list[dict]:
+def get_family_watches(family_id: int | None = None, days: int = FAMILY_WATCH_RECENT_DAYS) -> list[dict]:
+    """
+    Family watches of the last `days` days, newest first, optionally of one family.
+    The time range prunes whole watch_history buckets, so only recent ones are read.
+    """
     coll = get_collection("watch_history")
-    watches = list(coll.find({"family_watch" : 1}, {"_id": 0}))
-    return watches
\ No newline at end of file
+    query = {"family_watch": True, "date_of_watch": {"$gte": datetime.now() - timedelta(days=days)}}
+    if family_id is not None:
+        query["user.family_id"] = family_id
+    watches = list(coll.find(query, {"_id": 0}).sort("date_of_watch", -1))
+    return watches
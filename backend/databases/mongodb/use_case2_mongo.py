@@ -4,6 +4,7 @@ from .mongodb import (
     get_all_users as mongo_get_all_users,
     get_all_media as mongo_get_all_media,
     get_user_rentals as mongo_get_user_rentals,
+    get_user_rental_summary as mongo_get_user_rental_summary,
     insert_rental_session,
 )
 
@@ -27,5 +28,9 @@ def list_media() -> List[Dict]:
     return mongo_get_all_media()
 
 
-def list_user_rentals(user_id: int) -> List[Dict]:
-    return mongo_get_user_rentals(user_id)
+def list_user_rentals(user_id: int, limit: int | None = None) -> List[Dict]:
+    return mongo_get_user_rentals(user_id, limit)
+
+
+def user_rental_summary(user_id: int) -> Dict:
+    return mongo_get_user_rental_summary(user_id)
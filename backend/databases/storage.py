@@ -0,0 +1,326 @@
+"""
+Storage backends: one interface for the use cases over interchangeable engines.
+
+Every backend implements StorageBackend with the same signatures and result
+shapes, so the same workload can run against either store:
+- rent_media      -> {success, session_id, user_id, media_id, media_name, cost, duration, date_of_rent}
+- list_media      -> [{media_id, media_name, genre, prod_year, cost_per_day}] by name
+- list_users      -> [{user_id, user_name, email}] by name
+- list_user_rentals -> [{session_id, media_id, media_name, cost, duration, date_of_rent}] newest first
+- load_family_media -> {user_id: {user_name, available_media: [...]}} (use case 1)
+- watch_media     -> recent family watches [{user_id, user_name, media_id, media_name, date_of_watch}]
+- bulk_load       -> replaces the data with generated sample data, returns stats()
+- stats           -> {users, media, sessions, watch_history, families} document/row counts
+
+Besides mariadb and mongodb there is an embedded 'memory' backend (MemoryStore),
+which needs no server and isolates the application-side cost of an operation.
+
+The backend for a call is the one requested explicitly, else the one routed for
+that operation (STORAGE_ROUTES, e.g. "list_media=mongodb,rent_media=mariadb"),
+else STORAGE_BACKEND. Every call is timed into the metrics histogram
+storage.<backend>.<operation>, so engines can be compared per operation.
+"""
+
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import Protocol, Dict, List, Any
+from .. import metrics
+from .lazy import lazy_module
+from .models import Session, WatchHistory
+from .memory.memory_store import MemoryStore
+
+# Database stacks are imported on first use and only when enabled (ENABLED_BACKENDS)
+mariadb = lazy_module('.mariadb.mariadb', __package__, 'mariadb')
+uc1_mariadb = lazy_module('.mariadb.usecase1.use_case1', __package__, 'mariadb')
+uc2_mariadb = lazy_module('.mariadb.usecase2.use_case2', __package__, 'mariadb')
+mongo = lazy_module('.mongodb.mongodb', __package__, 'mongodb')
+uc1_mongo = lazy_module('.mongodb.use_case1_mongo', __package__, 'mongodb')
+uc2_mongo = lazy_module('.mongodb.use_case2_mongo', __package__, 'mongodb')
+# Generator and rental rules are shared with the memory backend, so they are not gated
+data_generator = lazy_module('.mariadb.data_generator', __package__)
+rental_rules = lazy_module('.mariadb.usecase2.use_case2', __package__)
+
+MAX_DURATION_DAYS = 365
+FAMILY_WATCH_RECENT_DAYS = int(os.getenv('FAMILY_WATCH_RECENT_DAYS', '30'))
+
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'mariadb')
+STORAGE_ROUTES: Dict[str, str] = {}
+for _item in filter(None, os.getenv('STORAGE_ROUTES', '').split(',')):
+    _operation, _backend = _item.split('=')
+    STORAGE_ROUTES[_operation.strip()] = _backend.strip()
+
+OPERATIONS = [
+    'rent_media', 'list_media', 'list_users', 'list_user_rentals',
+    'load_family_media', 'watch_media', 'bulk_load', 'stats',
+]
+
+
+class StorageBackend(Protocol):
+    name: str
+
+    def rent_media(self, user_id: int, media_id: int, duration_days: int) -> Dict: ...
+
+    def list_media(self) -> List[Dict]: ...
+
+    def list_users(self) -> List[Dict]: ...
+
+    def list_user_rentals(self, user_id: int) -> List[Dict]: ...
+
+    def load_family_media(self) -> Dict[int, Dict]: ...
+
+    def watch_media(self, user_id: int, media_id: int) -> List[Dict]: ...
+
+    def bulk_load(self) -> Dict[str, int]: ...
+
+    def stats(self) -> Dict[str, int]: ...
+
+
+def validate_rental(duration_days: int):
+    """Rental rules shared by all backends; raises ValueError like the use-case modules."""
+    if duration_days < 1:
+        raise ValueError("Duration must be at least 1 day")
+    if duration_days > MAX_DURATION_DAYS:
+        raise ValueError(f"Duration must not exceed {MAX_DURATION_DAYS} days")
+
+
+class SqlBackend:
+    name = 'mariadb'
+
+    def rent_media(self, user_id: int, media_id: int, duration_days: int) -> Dict:
+        validate_rental(duration_days)
+        return uc2_mariadb.rent_media(user_id, media_id, duration_days)
+
+    def list_media(self) -> List[Dict]:
+        return uc2_mariadb.get_all_media()
+
+    def list_users(self) -> List[Dict]:
+        return uc2_mariadb.get_all_users()
+
+    def list_user_rentals(self, user_id: int) -> List[Dict]:
+        return uc2_mariadb.get_user_rentals(user_id)
+
+    def load_family_media(self) -> Dict[int, Dict]:
+        return uc1_mariadb.load_data()
+
+    def watch_media(self, user_id: int, media_id: int) -> List[Dict]:
+        mariadb.insert_watch_history(WatchHistory(None, user_id, media_id, datetime.now(), True))
+        since = (datetime.now() - timedelta(days=FAMILY_WATCH_RECENT_DAYS)).date()
+        return mariadb.execute_select(
+            """
+            SELECT wh.user_id, u.user_name, wh.media_id, m.media_name, wh.date_of_watch
+            FROM WatchHistory wh
+            JOIN Users u ON u.user_id = wh.user_id
+            JOIN Media m ON m.media_id = wh.media_id
+            WHERE wh.family_watch = TRUE AND wh.date_of_watch >= %s
+            ORDER BY wh.date_of_watch DESC
+            """,
+            (since,)
+        )
+
+    def bulk_load(self) -> Dict[str, int]:
+        mariadb.reset_all_tables()
+        data_generator.generate_random_data()
+        return self.stats()
+
+    def stats(self) -> Dict[str, int]:
+        tables = {'users': 'Users', 'media': 'Media', 'sessions': 'Sessions',
+                  'watch_history': 'WatchHistory', 'families': 'Family'}
+        return {
+            key: mariadb.execute_select_one(f"SELECT COUNT(*) AS total FROM `{table}`", ())['total']
+            for key, table in tables.items()
+        }
+
+
+class MongoBackend:
+    name = 'mongodb'
+
+    def rent_media(self, user_id: int, media_id: int, duration_days: int) -> Dict:
+        validate_rental(duration_days)
+        session = uc2_mongo.rent_media(user_id, media_id, duration_days)
+        return {
+            'success': True,
+            'session_id': session['session_id'],
+            'user_id': user_id,
+            'media_id': media_id,
+            'media_name': session['media']['media_name'],
+            'cost': session['cost'],
+            'duration': session['duration'],
+            'date_of_rent': str(session['date_of_rent']),
+        }
+
+    def list_media(self) -> List[Dict]:
+        fields = ('media_id', 'media_name', 'genre', 'prod_year', 'cost_per_day')
+        return [{field: m.get(field) for field in fields} for m in uc2_mongo.list_media()]
+
+    def list_users(self) -> List[Dict]:
+        return [
+            {'user_id': u['user_id'], 'user_name': u['user_name'], 'email': u['email']}
+            for u in uc2_mongo.list_users()
+        ]
+
+    def list_user_rentals(self, user_id: int) -> List[Dict]:
+        return [{
+            'session_id': r['session_id'],
+            'media_id': r['media']['media_id'],
+            'media_name': r['media']['media_name'],
+            'cost': r['cost'],
+            'duration': r['duration'],
+            'date_of_rent': r['date_of_rent'],
+        } for r in uc2_mongo.list_user_rentals(user_id)]
+
+    def load_family_media(self) -> Dict[int, Dict]:
+        return uc1_mongo.load_data()
+
+    def watch_media(self, user_id: int, media_id: int) -> List[Dict]:
+        return [{
+            'user_id': w['user']['user_id'],
+            'user_name': w['user']['user_name'],
+            'media_id': w['media']['media_id'],
+            'media_name': w['media']['media_name'],
+            'date_of_watch': w['date_of_watch'],
+        } for w in uc1_mongo.watch_media(user_id, media_id)]
+
+    def bulk_load(self) -> Dict[str, int]:
+        mongo.generate_sample_data()
+        return self.stats()
+
+    def stats(self) -> Dict[str, int]:
+        counts = mongo.get_database_stats()
+        return {key: counts[key] for key in ('users', 'media', 'sessions', 'watch_history', 'families')}
+
+
+class MemoryBackend:
+    """Use cases on the embedded MemoryStore, for benchmarks and local runs without servers."""
+    name = 'memory'
+
+    def __init__(self, store: MemoryStore | None = None):
+        self.store = store or MemoryStore()
+
+    def rent_media(self, user_id: int, media_id: int, duration_days: int) -> Dict:
+        validate_rental(duration_days)
+        if self.store.find_user_by_id(user_id) is None:
+            raise ValueError(f"User {user_id} not found")
+        media = self.store.find_media_by_id(media_id)
+        if media is None:
+            raise ValueError(f"Media {media_id} not found")
+
+        cost = rental_rules.calculate_rental_cost(media.cost_per_day, duration_days)
+        session = self.store.insert_session(
+            Session(None, user_id, media_id, datetime.now(), cost, duration_days)
+        )
+        return {
+            'success': True,
+            'session_id': session.session_id,
+            'user_id': user_id,
+            'media_id': media_id,
+            'media_name': media.media_name,
+            'cost': cost,
+            'duration': duration_days,
+            'date_of_rent': str(session.date_of_rent),
+        }
+
+    def list_media(self) -> List[Dict]:
+        fields = ('media_id', 'media_name', 'genre', 'prod_year', 'cost_per_day')
+        return [{field: m[field] for field in fields} for m in self.store.media_sorted_by_name()]
+
+    def list_users(self) -> List[Dict]:
+        return [
+            {'user_id': u['user_id'], 'user_name': u['user_name'], 'email': u['email']}
+            for u in self.store.users_sorted_by_name()
+        ]
+
+    def list_user_rentals(self, user_id: int) -> List[Dict]:
+        media = self.store.rows['Media']
+        return [{
+            'session_id': s['session_id'],
+            'media_id': s['media_id'],
+            'media_name': media[s['media_id']]['media_name'] if s['media_id'] in media else None,
+            'cost': s['cost'],
+            'duration': s['duration'],
+            'date_of_rent': s['date_of_rent'],
+        } for s in self.store.user_sessions_newest_first(user_id)]
+
+    def load_family_media(self) -> Dict[int, Dict]:
+        now = datetime.now()
+        media = self.store.rows['Media']
+        result = {}
+        for family_id in list(self.store.users_by_family):
+            members = self.store.family_members(family_id)
+            # active sessions of every member, computed once per family
+            active = [
+                (member, s) for member in members
+                for s in self.store.user_sessions_newest_first(member['user_id'])
+                if s['date_of_rent'] + timedelta(hours=s['duration']) > now
+            ]
+            for user in members:
+                available = [{
+                    'family_member': member['user_name'],
+                    'media_id': s['media_id'],
+                    'media_name': media[s['media_id']]['media_name'],
+                    'type': self.store.media_type(s['media_id']),
+                } for member, s in active if member['user_id'] != user['user_id']]
+                if available:
+                    result[user['user_id']] = {'user_name': user['user_name'], 'available_media': available}
+        return result
+
+    def watch_media(self, user_id: int, media_id: int) -> List[Dict]:
+        self.store.insert_watch_history(WatchHistory(None, user_id, media_id, datetime.now().date(), True))
+        since = (datetime.now() - timedelta(days=FAMILY_WATCH_RECENT_DAYS)).date()
+        users, media = self.store.rows['Users'], self.store.rows['Media']
+        watches = [
+            w for w in self.store.get_table_rows('WatchHistory')
+            if w['family_watch'] and _as_date(w['date_of_watch']) >= since
+        ]
+        watches.sort(key=lambda w: _as_date(w['date_of_watch']), reverse=True)
+        return [{
+            'user_id': w['user_id'],
+            'user_name': users[w['user_id']]['user_name'],
+            'media_id': w['media_id'],
+            'media_name': media[w['media_id']]['media_name'],
+            'date_of_watch': w['date_of_watch'],
+        } for w in watches]
+
+    def bulk_load(self) -> Dict[str, int]:
+        self.store.reset_all_tables()
+        data_generator.generate_random_data(self.store)
+        return self.stats()
+
+    def stats(self) -> Dict[str, int]:
+        tables = {'users': 'Users', 'media': 'Media', 'sessions': 'Sessions',
+                  'watch_history': 'WatchHistory', 'families': 'Family'}
+        return {key: self.store.count(table) for key, table in tables.items()}
+
+
+def _as_date(value: date | datetime) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+BACKENDS: Dict[str, StorageBackend] = {
+    SqlBackend.name: SqlBackend(),
+    MongoBackend.name: MongoBackend(),
+    MemoryBackend.name: MemoryBackend(),
+}
+
+
+def register_backend(backend: StorageBackend):
+    BACKENDS[backend.name] = backend
+
+
+def get_backend(operation: str, requested: str | None = None) -> StorageBackend:
+    name = requested or STORAGE_ROUTES.get(operation) or STORAGE_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown storage backend '{name}', available: {', '.join(sorted(BACKENDS))}")
+    return BACKENDS[name]
+
+
+def call(operation: str, *args, backend: str | None = None) -> Any:
+    """Runs one operation on the selected backend and records its latency per backend."""
+    if operation not in OPERATIONS:
+        raise ValueError(f"Unknown storage operation '{operation}'")
+    selected = get_backend(operation, backend)
+    start = time.perf_counter()
+    try:
+        return getattr(selected, operation)(*args)
+    finally:
+        metrics.observe(f"storage.{selected.name}.{operation}", (time.perf_counter() - start) * 1000)
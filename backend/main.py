@@ -1,40 +1,80 @@
-from fastapi import FastAPI, HTTPException
+from . import startup
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse
 import os
 from pydantic import BaseModel
 
-from .databases.mariadb import mariadb
-from .databases.mariadb.data_generator import generate_random_data
-from .databases.mariadb.usecase1 import use_case1 as uc1_mariadb
-from .databases.mariadb.usecase2 import use_case2 as uc2_logic
-from .databases.mongodb import mongodb as mongo
-from .databases.mongodb import mongo_migration as mongo_migration
-from .databases.mongodb import use_case1_mongo as uc1_mongodb 
-from .databases.mongodb import use_case2_mongo as uc2_mongo
+from . import metrics
+from . import capture
+from . import admission
+
+from .databases import storage
+from .databases.lazy import lazy_module
+
+# Database stacks are imported on first use and only when enabled (ENABLED_BACKENDS)
+mariadb = lazy_module('.databases.mariadb.mariadb', __package__, 'mariadb')
+data_generator = lazy_module('.databases.mariadb.data_generator', __package__, 'mariadb')
+snapshots = lazy_module('.databases.mariadb.snapshots', __package__, 'mariadb')
+uc1_mariadb = lazy_module('.databases.mariadb.usecase1.use_case1', __package__, 'mariadb')
+uc2_logic = lazy_module('.databases.mariadb.usecase2.use_case2', __package__, 'mariadb')
+mongo = lazy_module('.databases.mongodb.mongodb', __package__, 'mongodb')
+mongo_migration = lazy_module('.databases.mongodb.mongo_migration', __package__, 'mongodb')
+mongo_sync = lazy_module('.databases.mongodb.mongo_sync', __package__, 'mongodb')
+mongo_verify = lazy_module('.databases.mongodb.mongo_verify', __package__, 'mongodb')
+mongo_to_sql = lazy_module('.databases.mongodb.mongo_to_sql', __package__, 'mongodb')
+mongo_indexes = lazy_module('.databases.mongodb.mongo_indexes', __package__, 'mongodb')
+uc1_mongodb = lazy_module('.databases.mongodb.use_case1_mongo', __package__, 'mongodb')
+uc2_mongo = lazy_module('.databases.mongodb.use_case2_mongo', __package__, 'mongodb')
 
 
 app = FastAPI(title="Media Rental Service", version="1.0.0") 
 
 app.mount("/static", StaticFiles(directory="frontend"), name="static")
 
+# Added last runs first: capture also records requests shed by admission control
+if admission.ADMISSION_ENABLED:
+    app.add_middleware(admission.AdmissionMiddleware)
+if capture.CAPTURE_LOG:
+    app.add_middleware(capture.CaptureMiddleware)
+
 @app.on_event("startup")
 async def startup_event():
-    """Clear MongoDB collections to ensure clean state."""
-    try:
-        mongo.reset_all_collections()
-        print("MongoDB collections cleared on startup")
-    except Exception as e:
-        print(f"Warning: Could not clear MongoDB on startup: {e}")
+    """Prepares and warms up the enabled backends in the background, data is left as it is."""
+    startup.start()
+    if capture.CAPTURE_LOG:
+        capture.start()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    capture.stop()
 
 @app.get("/")
 async def read_root():
     return FileResponse("frontend/index.html")
 
 @app.get("/health")
+@app.get("/health/live")
 async def health_check():
+    """Liveness: the process is up and serving requests."""
     return {"status": "healthy", "service": "media-rental-api"}
 
+@app.get("/health/ready")
+def readiness_check():
+    """Readiness: warm-up finished and every enabled database answers."""
+    state = startup.readiness()
+    return JSONResponse(jsonable_encoder(state), status_code=200 if state['ready'] else 503)
+
+@app.get("/api/metrics")
+async def get_metrics():
+    return metrics.snapshot()
+
+@app.get("/api/admission")
+async def get_admission_status():
+    """In-flight and queued requests per priority class and limited route, over all workers."""
+    return admission.status()
+
 @app.get("/api/test")
 async def test_endpoint():
     return {"message": "Media Rental API is working!"}
@@ -70,7 +110,7 @@ async def test_error():
         )
 
 @app.post("/api/tables/clear")
-async def clear_tables():
+def clear_tables():
     try:
         mariadb.reset_all_tables()
         
@@ -88,7 +128,7 @@ async def clear_tables():
         )
 
 @app.get("/api/tables")
-async def list_tables():
+def list_tables():
     try:
         tables = mariadb.list_all_tables_with_rows()
         
@@ -104,10 +144,10 @@ async def list_tables():
         )
 
 @app.post("/api/generate-data")
-async def generate_data():
+def generate_data():
     try:
         mariadb.reset_all_tables()
-        generate_random_data()
+        data_generator.generate_random_data()
         return {"message": "Sample data added successfully"}
     except Exception as e:
         print(f"Error in generate_data: {e}")
@@ -156,6 +196,76 @@ async def check_data():
         )
 
 
+@app.get("/api/snapshots")
+async def list_snapshots():
+    try:
+        names = snapshots.list_snapshots()
+        return {"snapshots": names, "count": len(names)}
+    except Exception as e:
+        print(f"Error in list_snapshots: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "code": "LIST_SNAPSHOTS_FAILED",
+                "message": "Failed to list snapshots"
+            }
+        )
+
+@app.post("/api/snapshots/{name}")
+def save_snapshot(name: str):
+    try:
+        rows = snapshots.save_snapshot(name)
+        return {"message": f"Snapshot {name} saved", "rows": rows}
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "code": "INVALID_SNAPSHOT_NAME",
+                "message": str(e)
+            }
+        )
+    except Exception as e:
+        print(f"Error in save_snapshot: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "code": "SAVE_SNAPSHOT_FAILED",
+                "message": "Failed to save snapshot"
+            }
+        )
+
+@app.post("/api/snapshots/{name}/restore")
+def restore_snapshot(name: str):
+    try:
+        rows = snapshots.restore_snapshot(name)
+        return {"message": f"Snapshot {name} restored", "rows": rows}
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "code": "INVALID_SNAPSHOT_NAME",
+                "message": str(e)
+            }
+        )
+    except FileNotFoundError as e:
+        raise HTTPException(
+            status_code=404,
+            detail={
+                "code": "SNAPSHOT_NOT_FOUND",
+                "message": str(e)
+            }
+        )
+    except Exception as e:
+        print(f"Error in restore_snapshot: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "code": "RESTORE_SNAPSHOT_FAILED",
+                "message": "Failed to restore snapshot"
+            }
+        )
+
+
  # Use Case 1
 @app.get("/api/usecase1/load-data")
 async def uc1_load_data() :
@@ -177,7 +287,7 @@ class WatchRequest(BaseModel):
     media_id: int
 
 @app.post("/api/usecase1/watch")
-async def uc1_watch_media(request: WatchRequest):
+def uc1_watch_media(request: WatchRequest):
     try:
         output = uc1_mariadb.watch_media(request.user_id, request.media_id)
         return {"family_watches": output}
@@ -190,7 +300,7 @@ async def uc1_watch_media(request: WatchRequest):
 # Use Case 2: Rent Media
 
 @app.post("/api/usecase2/rent")
-async def uc2_rent_media(user_id: int, media_id: int, duration_days: int):
+def uc2_rent_media(user_id: int, media_id: int, duration_days: int):
     try:
         return uc2_logic.rent_media(user_id, media_id, duration_days)
     except ValueError as e:
@@ -253,12 +363,79 @@ async def uc2_get_users():
             }
         )
 
+# Storage backend endpoints: same operations on any engine, ?backend= overrides the configured routing
+
+def _store_call(operation: str, *args, backend: str | None = None):
+    try:
+        return storage.call(operation, *args, backend=backend)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "code": "STORE_INVALID_REQUEST",
+                "message": str(e)
+            }
+        )
+    except Exception as e:
+        print(f"Error in store {operation}: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "code": "STORE_OPERATION_FAILED",
+                "message": f"Storage operation {operation} failed"
+            }
+        )
+
+
+@app.post("/api/store/rent")
+def store_rent_media(user_id: int, media_id: int, duration_days: int, backend: str | None = None):
+    return _store_call("rent_media", user_id, media_id, duration_days, backend=backend)
+
+
+@app.get("/api/store/media")
+def store_list_media(backend: str | None = None):
+    media = _store_call("list_media", backend=backend)
+    return {"media": media, "count": len(media)}
+
+
+@app.get("/api/store/users")
+def store_list_users(backend: str | None = None):
+    users = _store_call("list_users", backend=backend)
+    return {"users": users, "count": len(users)}
+
+
+@app.get("/api/store/user/{user_id}/rentals")
+def store_list_user_rentals(user_id: int, backend: str | None = None):
+    rentals = _store_call("list_user_rentals", user_id, backend=backend)
+    return {"rentals": rentals, "count": len(rentals)}
+
+
+@app.get("/api/store/family-media")
+def store_load_family_media(backend: str | None = None):
+    return _store_call("load_family_media", backend=backend)
+
+
+@app.post("/api/store/watch")
+def store_watch_media(request: WatchRequest, backend: str | None = None):
+    return {"family_watches": _store_call("watch_media", request.user_id, request.media_id, backend=backend)}
+
+
+@app.post("/api/store/bulk-load")
+def store_bulk_load(backend: str | None = None):
+    return {"stats": _store_call("bulk_load", backend=backend)}
+
+
+@app.get("/api/store/stats")
+def store_stats(backend: str | None = None):
+    return {"stats": _store_call("stats", backend=backend)}
+
+
 # Migration Endpoints
+# Plain def: FastAPI runs it in its threadpool, so the progress endpoint stays responsive
 @app.post("/api/migrate-to-nosql")
-async def migrate_to_nosql():
+def migrate_to_nosql(resume: bool = False):
     try:
-        mongo_migration.migrate_from_sql()
-        mariadb.reset_all_tables()
+        mongo_migration.migrate_from_sql(resume=resume)
         return {"message": "Migration to NoSQL completed successfully"}
     except Exception as e:
         print(f"Error in migrate_to_nosql: {e}")
@@ -270,11 +447,74 @@ async def migrate_to_nosql():
             }
         )
     
+@app.get("/api/migration/progress")
+async def migration_progress():
+    try:
+        return mongo_migration.get_migration_progress()
+    except Exception as e:
+        print(f"Error in migration_progress: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "code": "MIGRATION_PROGRESS_FAILED",
+                "message": "Failed to read migration progress"
+            }
+        )
+
+@app.post("/api/sync-to-nosql")
+def sync_to_nosql(verify: bool = False):
+    """Incremental sync: applies only rows changed in MariaDB since the last migration/sync."""
+    try:
+        result = mongo_sync.sync_from_sql()
+        if verify:
+            result["verification"] = mongo_verify.verify_consistency()
+        return {"message": "Sync to NoSQL completed successfully", **result}
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "code": "SYNC_REFUSED",
+                "message": str(e)
+            }
+        )
+    except Exception as e:
+        print(f"Error in sync_to_nosql: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "code": "SYNC_FAILED",
+                "message": "Failed to sync data to NoSQL"
+            }
+        )
+    
+@app.post("/api/verify-nosql")
+def verify_nosql():
+    try:
+        return mongo_verify.verify_consistency()
+    except Exception as e:
+        print(f"Error in verify_nosql: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "code": "VERIFY_FAILED",
+                "message": "Failed to verify NoSQL data against SQL"
+            }
+        )
+    
 @app.post("/api/switch-to-sql")
-async def switch_to_sql():
+def switch_to_sql():
     try:
+        rows = mongo_to_sql.migrate_to_sql()
         mongo.reset_all_collections()
-        return {"message": "Switched back to SQL database successfully"}
+        return {"message": "Switched back to SQL database successfully", "rows": rows}
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "code": "SWITCH_SQL_REFUSED",
+                "message": str(e)
+            }
+        )
     except Exception as e:
         print(f"Error in switch_to_sql: {e}")
         raise HTTPException(
@@ -310,7 +550,7 @@ async def test_mongodb():
 
 
 @app.post("/api/mongodb/generate-data")
-async def mongodb_generate_data():
+def mongodb_generate_data():
     try:
         mongo.generate_sample_data()
         stats = mongo.get_database_stats()
@@ -356,7 +596,7 @@ async def mongodb_sample_documents():
                 "user": "Embedded devices array and friends array (N-side referencing)",
                 "media": "Polymorphic type field with embedded type_details",
                 "session": "Denormalized user and media data (eliminates JOINs)",
-                "watch_history": "Denormalized user and media data with family context",
+                "watch_history": "Time-series collection bucketed per user (metaField) with denormalized media data",
                 "family": "Embedded users array showing family members"
             }
         }
@@ -371,10 +611,25 @@ async def mongodb_sample_documents():
         )
     
 @app.get("/api/mongodb/collections")
-async def mongodb_list_collections():
+def mongodb_list_collections(collections: str | None = None, fields: str | None = None,
+                             limit: int | None = Query(None, ge=1), after: str | None = None,
+                             batch_size: int | None = Query(None, ge=1)):
+    """NDJSON stream, one {"collection", "document"} object per line; comma separated collections/fields."""
     try:
-        collections = mongo.get_all_collections()
-        return {"collections": collections, "count": len(collections)}
+        chunks = mongo.get_all_collections(
+            collections.split(',') if collections else None,
+            fields.split(',') if fields else None,
+            limit, after, batch_size or mongo.MONGODB_EXPORT_BATCH_SIZE
+        )
+        return StreamingResponse(chunks, media_type="application/x-ndjson")
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "code": "INVALID_EXPORT_REQUEST",
+                "message": str(e)
+            }
+        )
     except Exception as e:
         print(f"Error in mongodb_list_collections: {e}")
         raise HTTPException(
@@ -386,8 +641,60 @@ async def mongodb_list_collections():
         )
 
 
+@app.get("/api/mongodb/indexes")
+async def mongodb_indexes():
+    try:
+        return {
+            "plan": mongo_indexes.plan_indexes(),
+            "build": mongo_indexes.get_index_build_status()
+        }
+    except Exception as e:
+        print(f"Error in mongodb_indexes: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "code": "MONGODB_INDEXES_FAILED",
+                "message": str(e)
+            }
+        )
+
+
+@app.post("/api/mongodb/indexes")
+def mongodb_apply_indexes():
+    try:
+        started = mongo_indexes.apply_indexes_in_background()
+        return {
+            "message": "Index build started" if started else "Index build already running",
+            "build": mongo_indexes.get_index_build_status()
+        }
+    except Exception as e:
+        print(f"Error in mongodb_apply_indexes: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "code": "MONGODB_INDEXES_FAILED",
+                "message": str(e)
+            }
+        )
+
+
+@app.get("/api/mongodb/indexes/verify")
+def mongodb_verify_indexes():
+    try:
+        return mongo_indexes.verify_query_plans()
+    except Exception as e:
+        print(f"Error in mongodb_verify_indexes: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "code": "MONGODB_INDEXES_VERIFY_FAILED",
+                "message": str(e)
+            }
+        )
+
+
 @app.post("/api/mongodb/clear")
-async def mongodb_clear():
+def mongodb_clear():
     try:
         mongo.reset_all_collections()
         return {"message": "MongoDB collections cleared successfully"}
@@ -404,7 +711,7 @@ async def mongodb_clear():
 
 # MongoDB Use Case 2: Rent Media
 @app.post("/api/mongodb/usecase2/rent")
-async def mongodb_uc2_rent(user_id: int, media_id: int, duration_days: int):
+def mongodb_uc2_rent(user_id: int, media_id: int, duration_days: int):
     try:
         session = uc2_mongo.rent_media(user_id, media_id, duration_days)
         return session
@@ -454,9 +761,9 @@ async def mongodb_uc2_get_users():
 
 
 @app.get("/api/mongodb/usecase2/user/{user_id}/rentals")
-async def mongodb_uc2_get_rentals(user_id: int):
+async def mongodb_uc2_get_rentals(user_id: int, limit: int | None = None):
     try:
-        rentals = uc2_mongo.list_user_rentals(user_id)
+        rentals = uc2_mongo.list_user_rentals(user_id, limit)
         return {"rentals": rentals, "count": len(rentals)}
     except Exception as e:
         print(f"Error in mongodb_uc2_get_rentals: {e}")
@@ -469,9 +776,24 @@ async def mongodb_uc2_get_rentals(user_id: int):
         )
 
 
+@app.get("/api/mongodb/usecase2/user/{user_id}/rental-summary")
+async def mongodb_uc2_rental_summary(user_id: int):
+    try:
+        return uc2_mongo.user_rental_summary(user_id)
+    except Exception as e:
+        print(f"Error in mongodb_uc2_rental_summary: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "code": "MONGODB_RENTALS_FAILED",
+                "message": str(e)
+            }
+        )
+
+
 # MongoDB Use Case 1: Watch Media
 @app.post("/api/mongodb/usecase1/watch")
-async def mongodb_uc1_watch(request: WatchRequest):
+def mongodb_uc1_watch(request: WatchRequest):
     try:
         family_watches = uc1_mongodb.watch_media(request.user_id, request.media_id)
         return {"family_watches": family_watches}
@@ -0,0 +1,92 @@
+"""
+In-process metrics: named latency histograms and counters.
+
+Histograms use fixed exponential buckets (milliseconds), so recording is O(1)
+and thread-safe without keeping individual samples. Percentiles are estimated
+from the bucket boundaries.
+"""
+
+import bisect
+import threading
+from typing import Dict, Any
+
+# Upper bounds in milliseconds; the last bucket is open ended
+BUCKETS_MS = [
+    0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500,
+    1000, 2500, 5000, 10000, 30000, 60000, float('inf'),
+]
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value_ms: float):
+        index = bisect.bisect_left(BUCKETS_MS, value_ms)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value_ms
+            if value_ms > self.max:
+                self.max = value_ms
+
+    def percentile(self, p: float) -> float:
+        """Upper bound of the bucket holding the p-th percentile (capped at the observed max)."""
+        if self.count == 0:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS_MS, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'count': self.count,
+                'mean_ms': round(self.total / self.count, 3) if self.count else 0.0,
+                'p50_ms': self.percentile(50),
+                'p90_ms': self.percentile(90),
+                'p99_ms': self.percentile(99),
+                'max_ms': round(self.max, 3),
+            }
+
+
+_histograms: Dict[str, Histogram] = {}
+_counters: Dict[str, int] = {}
+_lock = threading.Lock()
+
+
+def observe(name: str, value_ms: float):
+    histogram = _histograms.get(name)
+    if histogram is None:
+        with _lock:
+            histogram = _histograms.setdefault(name, Histogram())
+    histogram.observe(value_ms)
+
+
+def increment(name: str, amount: int = 1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def snapshot() -> Dict[str, Any]:
+    with _lock:
+        histograms = dict(_histograms)
+        counters = dict(_counters)
+    return {
+        'histograms': {name: h.snapshot() for name, h in sorted(histograms.items())},
+        'counters': dict(sorted(counters.items())),
+    }
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
@@ -0,0 +1,43 @@
+"""
+Server entry point with a configurable number of worker processes.
+
+    python -m backend.serve
+
+WORKERS uvicorn worker processes (default 1, 0 = one per CPU core) share the
+listening socket. uvicorn starts workers as fresh interpreters, so every worker
+imports the app and opens its own MongoDB client and pools after start-up (pool
+sizes such as MONGODB_MAX_POOL_SIZE are per worker); clients and id blocks are
+also reset in forked children, so a fork-based server cannot share them either.
+
+State that must agree across workers goes through shared_state, whose segment is
+created here before the workers start:
+- MongoDB id blocks are reserved atomically per worker; a counter reset bumps a
+  shared generation so every worker drops its stale blocks
+- only one worker prepares MongoDB collections and indexes on startup
+- admission control limits and queues count requests over all workers
+Per-worker by design: /api/metrics histograms, the index build status (held by the
+worker that built them) and the embedded memory backend, which is a separate
+store in every worker.
+"""
+
+import os
+import uvicorn
+from . import shared_state
+
+WORKERS = int(os.getenv('WORKERS', '1'))
+HOST = os.getenv('HOST', '0.0.0.0')
+PORT = int(os.getenv('PORT', '8000'))
+
+
+def main():
+    workers = WORKERS or os.cpu_count() or 1
+    segment = shared_state.create_segment()
+    print(f"Starting {workers} worker(s) on {HOST}:{PORT}, shared state in {segment}")
+    try:
+        uvicorn.run("backend.main:app", host=HOST, port=PORT, workers=workers)
+    finally:
+        shared_state.remove_segment(segment)
+
+
+if __name__ == '__main__':
+    main()
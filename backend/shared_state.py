@@ -0,0 +1,165 @@
+"""
+Counters shared by the worker processes of one server.
+
+The counters live in a small file on tmpfs (/dev/shm) that every worker maps into
+memory, so reads are plain memory reads. Updates take a POSIX record lock (lockf)
+on the counter's 8 bytes, which makes them atomic across processes without a
+broker. A counter with a single writer can instead be stored without a lock.
+
+backend.serve creates a fresh segment per server run and exports its path as
+SHARED_STATE_PATH, so the workers it starts share state; a process started on
+its own (plain uvicorn, scripts, benchmarks) gets a private segment.
+
+Counters are addressed by name. A slot holds a 64-bit hash of its name and the
+value; a name is looked up by probing from crc32(name), and the first process to
+use a name claims a free slot for it, so all workers agree on its location.
+"""
+
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import zlib
+from typing import Callable, Dict
+
+SHARED_STATE_PATH = os.getenv('SHARED_STATE_PATH', '')
+SHARED_SLOTS = 4096
+_SLOT_SIZE = 16     # name hash, value
+_VALUE_SIZE = 8
+_FORMAT = 'q'
+
+
+class SharedCounters:
+    def __init__(self, path: str, slots: int = SHARED_SLOTS):
+        self.path = path
+        self.slots = slots
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self.fd).st_size < slots * _SLOT_SIZE:
+            os.ftruncate(self.fd, slots * _SLOT_SIZE)
+        self.map = mmap.mmap(self.fd, slots * _SLOT_SIZE)
+        self.offsets: Dict[str, int] = {}  # name -> offset of its value
+        # lockf locks belong to the process, threads of one worker serialise here
+        self.lock = threading.Lock()
+
+    def _locked(self, offset: int, change: Callable[[int], int]) -> tuple[int, int]:
+        with self.lock:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, _VALUE_SIZE, offset)
+            try:
+                old = struct.unpack_from(_FORMAT, self.map, offset)[0]
+                new = change(old)
+                if new != old:
+                    struct.pack_into(_FORMAT, self.map, offset, new)
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, _VALUE_SIZE, offset)
+        return old, new
+
+    def _offset(self, name: str) -> int:
+        offset = self.offsets.get(name)
+        if offset is None:
+            key = int.from_bytes(hashlib.blake2b(name.encode(), digest_size=8).digest(), 'big', signed=True) or 1
+            start = zlib.crc32(name.encode()) % self.slots
+            for probe in range(self.slots):
+                slot = (start + probe) % self.slots * _SLOT_SIZE
+                current, _ = self._locked(slot, lambda k: key if k == 0 else k)
+                if current in (0, key):
+                    offset = self.offsets[name] = slot + _VALUE_SIZE
+                    break
+            else:
+                raise RuntimeError(f"Shared state segment {self.path} is full")
+        return offset
+
+    def _update(self, name: str, change: Callable[[int], int]) -> tuple[int, int]:
+        """Applies change to the counter atomically; returns (old, new)."""
+        return self._locked(self._offset(name), change)
+
+    def get(self, name: str) -> int:
+        return struct.unpack_from(_FORMAT, self.map, self._offset(name))[0]
+
+    def add(self, name: str, delta: int = 1) -> int:
+        return self._update(name, lambda value: value + delta)[1]
+
+    def compare_and_set(self, name: str, expected: int, value: int) -> bool:
+        old, _ = self._update(name, lambda current: value if current == expected else current)
+        return old == expected
+
+    def acquire(self, name: str, limit: int) -> bool:
+        """Increments the counter if it is below limit (a cross-process semaphore)."""
+        old, new = self._update(name, lambda value: value + 1 if value < limit else value)
+        return new > old
+
+    def release(self, name: str, count: int = 1):
+        self._update(name, lambda value: max(value - count, 0))
+
+    def swap(self, name: str, value: int) -> int:
+        """Sets the counter; returns its previous value."""
+        return self._update(name, lambda _: value)[0]
+
+    def store(self, name: str, value: int):
+        """Unlocked write, only for counters that a single process writes."""
+        struct.pack_into(_FORMAT, self.map, self._offset(name), value)
+
+    def _after_fork(self):
+        self.lock = threading.Lock()
+
+
+_counters: SharedCounters | None = None
+_counters_lock = threading.Lock()
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _segment_dir() -> str:
+    return '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+
+def create_segment() -> str:
+    """Creates a zeroed segment for a server run and exports it to the workers started afterwards."""
+    path = os.path.join(_segment_dir(), f"media-rental-{os.getpid()}.state")
+    with open(path, 'wb') as f:
+        f.truncate(SHARED_SLOTS * _SLOT_SIZE)
+    os.environ['SHARED_STATE_PATH'] = path
+    return path
+
+
+def remove_segment(path: str):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def counters() -> SharedCounters:
+    global _counters
+    if _counters is None:
+        with _counters_lock:
+            if _counters is None:
+                path = os.getenv('SHARED_STATE_PATH') or SHARED_STATE_PATH
+                if path:
+                    _counters = SharedCounters(path)
+                else:
+                    # Private segment: unlinked right away, the mapping stays valid
+                    path = os.path.join(_segment_dir(), f"media-rental-{os.getpid()}-private.state")
+                    _counters = SharedCounters(path)
+                    remove_segment(path)
+    return _counters
+
+
+def _after_fork_in_child():
+    global _counters_lock
+    _counters_lock = threading.Lock()
+    if _counters is not None:
+        _counters._after_fork()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
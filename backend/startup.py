@@ -0,0 +1,183 @@
+"""
+Startup: backend preparation, warm-up, readiness and cold-start timing.
+
+Startup no longer touches data. For each enabled backend (ENABLED_BACKENDS) a
+background thread prepares it (MariaDB: the ChangeLog table is created if
+missing; MongoDB: missing collections are created, the index spec is applied in
+the background) and warms it up: connects, fills the MongoDB connection pool, and
+runs the catalog (media list) and use case 1 (family media) queries once before
+real traffic arrives. With several workers (backend.serve) each one warms its
+own pools, but only one prepares MongoDB. Steps that fail, e.g. because a
+database is still booting, are retried with backoff. Dropping every collection
+on boot, as earlier versions did, is opt-in for throwaway instances
+(MONGODB_RESET_ON_STARTUP=true).
+
+Liveness (/health/live) only says the process serves requests. Readiness
+(/health/ready) flips once warm-up has completed and every enabled database
+answers a ping, made over a connection the ping opens itself if the process has
+none yet. Cold-start time runs from the import of this module, the first
+thing backend.main imports, to the end of warm-up.
+"""
+
+import time
+
+IMPORT_STARTED = time.perf_counter()
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, Callable
+from . import metrics
+from . import shared_state
+from .databases import storage
+from .databases.lazy import ENABLED_BACKENDS, lazy_module
+
+MONGODB_RESET_ON_STARTUP = os.getenv('MONGODB_RESET_ON_STARTUP', 'false').lower() == 'true'
+WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', 'true').lower() == 'true'
+# Connections opened per pooled backend during warm-up
+WARMUP_CONNECTIONS = int(os.getenv('WARMUP_CONNECTIONS', '10'))
+WARMUP_MAX_RETRY_DELAY = 30
+
+mariadb = lazy_module('.databases.mariadb.mariadb', __package__, 'mariadb')
+mongo = lazy_module('.databases.mongodb.mongodb', __package__, 'mongodb')
+mongo_connection = lazy_module('.databases.mongodb.mongodb_connection', __package__, 'mongodb')
+mongo_indexes = lazy_module('.databases.mongodb.mongo_indexes', __package__, 'mongodb')
+
+_lock = threading.Lock()
+_state: Dict[str, Any] = {
+    'phase': 'starting',    # starting -> warming -> warm
+    'steps': {},            # step -> duration in ms
+    'errors': {},           # step -> last error
+    'imports_ms': None,
+    'cold_start_ms': None,
+}
+
+
+def _fill_mongodb_pool():
+    db = mongo_connection.get_mongodb_connection()
+    # Concurrent commands make the pool open up to WARMUP_CONNECTIONS connections
+    with ThreadPoolExecutor(max_workers=WARMUP_CONNECTIONS) as pool:
+        list(pool.map(lambda _: db.command('ping'), range(WARMUP_CONNECTIONS)))
+
+
+def _prepare_mongodb():
+    """
+    With several workers only one creates collections and indexes: the first to
+    claim startup.mongodb.prepare with its pid. The others fail the step, and so
+    retry it with backoff, until the owner has set startup.mongodb.prepared; if
+    the owner died before that, the next worker to retry takes over.
+    """
+    counters = shared_state.counters()
+    if counters.get('startup.mongodb.prepared'):
+        return
+    owner = counters.get('startup.mongodb.prepare')
+    if owner != os.getpid():
+        if owner and shared_state.pid_alive(owner):
+            raise RuntimeError(f"MongoDB is being prepared by worker {owner}")
+        if not counters.compare_and_set('startup.mongodb.prepare', owner, os.getpid()):
+            raise RuntimeError("MongoDB preparation was claimed by another worker")
+        if owner:
+            print(f"Worker {owner} died while preparing MongoDB, taking over")
+    if MONGODB_RESET_ON_STARTUP:
+        mongo.drop_all_collections()
+        print("MongoDB collections cleared on startup")
+    mongo.create_collections()
+    mongo_indexes.apply_indexes_in_background()
+    counters.compare_and_set('startup.mongodb.prepared', 0, 1)
+
+
+def warm_up_steps() -> list[tuple[str, Callable[[], Any]]]:
+    """(name, function) per warm-up step of the enabled backends, in order."""
+    steps = []
+    if 'mariadb' in ENABLED_BACKENDS:
+        # MariaDB opens a connection per operation; the first round trip warms DNS and auth
+        steps += [
+            ('mariadb.connect', mariadb.test_db),
+            ('mariadb.change_log', mariadb.ensure_change_log),
+            ('mariadb.catalog', storage.BACKENDS['mariadb'].list_media),
+            ('mariadb.family_media', storage.BACKENDS['mariadb'].load_family_media),
+        ]
+    if 'mongodb' in ENABLED_BACKENDS:
+        steps += [
+            ('mongodb.connect', mongo_connection.get_mongodb_connection),
+            ('mongodb.prepare', _prepare_mongodb),
+            ('mongodb.pool', _fill_mongodb_pool),
+            ('mongodb.catalog', storage.BACKENDS['mongodb'].list_media),
+            ('mongodb.family_media', storage.BACKENDS['mongodb'].load_family_media),
+        ]
+    return steps
+
+
+def _run_step(name: str, fn: Callable[[], Any]) -> bool:
+    start = time.perf_counter()
+    try:
+        fn()
+    except Exception as e:
+        print(f"Warm-up step {name} failed: {e}")
+        with _lock:
+            _state['errors'][name] = str(e)
+        return False
+    elapsed = (time.perf_counter() - start) * 1000
+    metrics.observe(f"startup.{name}", elapsed)
+    with _lock:
+        _state['steps'][name] = round(elapsed, 1)
+        _state['errors'].pop(name, None)
+    return True
+
+
+def warm_up():
+    """Runs every warm-up step until it succeeds; a failing step retries with backoff before the next one."""
+    with _lock:
+        _state['phase'] = 'warming'
+    steps = warm_up_steps() if WARMUP_ENABLED else []
+    for name, fn in steps:
+        delay = 1
+        while not _run_step(name, fn):
+            time.sleep(delay)
+            delay = min(delay * 2, WARMUP_MAX_RETRY_DELAY)
+
+    cold_start = (time.perf_counter() - IMPORT_STARTED) * 1000
+    metrics.observe("startup.cold_start", cold_start)
+    with _lock:
+        _state['phase'] = 'warm'
+        _state['cold_start_ms'] = round(cold_start, 1)
+        _state['warm_at'] = datetime.now()
+    print(f"Warm-up finished, cold start took {cold_start / 1000:.2f}s")
+
+
+def start():
+    """Called from the startup event: records import time and starts warm-up in the background."""
+    with _lock:
+        if _state['imports_ms'] is not None:
+            return
+        _state['imports_ms'] = round((time.perf_counter() - IMPORT_STARTED) * 1000, 1)
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+
+
+def ping_backends() -> Dict[str, bool]:
+    """Whether each enabled database answers right now."""
+    result = {}
+    for backend in ENABLED_BACKENDS:
+        if backend == 'mariadb':
+            try:
+                mariadb.test_db()
+                result[backend] = True
+            except Exception:
+                result[backend] = False
+        elif backend == 'mongodb':
+            result[backend] = mongo_connection.ping_mongodb()
+    return result
+
+
+def readiness() -> Dict[str, Any]:
+    with _lock:
+        state = {key: dict(value) if isinstance(value, dict) else value for key, value in _state.items()}
+    backends = ping_backends() if state['phase'] == 'warm' else {}
+    state['backends'] = backends
+    state['enabled_backends'] = ENABLED_BACKENDS
+    state['worker'] = os.getpid()
+    state['ready'] = state['phase'] == 'warm' and all(backends.values())
+    if mongo_indexes.loaded:
+        state['index_build'] = mongo_indexes.get_index_build_status()
+    return state
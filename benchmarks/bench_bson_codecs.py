@@ -0,0 +1,94 @@
+"""
+Microbenchmark: SQL row -> BSON conversion on migration-sized batches.
+
+before: recursive convert_dates_to_datetime over every row, then BSON encoding
+after:  rows encoded as they are, dates/decimals handled by the client's type registry
+
+Run from the repository root (no database needed):
+    python -m benchmarks.bench_bson_codecs [rows]
+"""
+
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import Any
+import bson
+from bson.codec_options import CodecOptions
+from backend.databases.mongodb.mongodb_connection import TYPE_REGISTRY
+from backend.databases.mongodb import mongo_migration as migration
+
+
+def convert_dates_to_datetime(obj: Any) -> Any:
+    """Previous conversion path, kept here as the baseline."""
+    if isinstance(obj, date) and not isinstance(obj, datetime):
+        return datetime.combine(obj, datetime.min.time())
+    elif isinstance(obj, dict):
+        return {key: convert_dates_to_datetime(value) for key, value in obj.items()}
+    elif isinstance(obj, list):
+        return [convert_dates_to_datetime(item) for item in obj]
+    return obj
+
+
+def user_rows(n: int) -> list[dict]:
+    today = date.today()
+    return [{
+        'user_id': i, 'user_name': f"User {i}", 'email': f"user{i}@gmail.com",
+        'birthday': today - timedelta(days=i % 20000), 'location': "Vienna",
+        'bio': "x" * 40, 'family_id': i % 1000,
+    } for i in range(n)]
+
+
+def session_rows(n: int) -> list[dict]:
+    now = datetime.now().replace(microsecond=0)
+    return [{
+        'session_id': i, 'user_id': i % 1000, 'media_id': i % 100,
+        'date_of_rent': now - timedelta(minutes=i), 'cost': i % 50, 'duration': i % 21,
+        'user_name': f"User {i % 1000}", 'email': f"user{i % 1000}@gmail.com",
+        'media_name': "Interstellar", 'genre': "Sci-fi", 'cost_per_day': 3, 'media_type': 'film',
+    } for i in range(n)]
+
+
+def watch_rows(n: int) -> list[dict]:
+    today = date.today()
+    return [{
+        'watch_history_id': i, 'user_id': i % 1000, 'media_id': i % 100,
+        'date_of_watch': today - timedelta(days=i % 365), 'family_watch': i % 2,
+        'user_name': f"User {i % 1000}", 'family_id': i % 200,
+        'media_name': "Interstellar", 'media_type': 'film',
+    } for i in range(n)]
+
+
+def before(rows: list[dict], build) -> None:
+    for row in rows:
+        bson.encode(build(convert_dates_to_datetime(row)))
+
+
+def after(rows: list[dict], build, options: CodecOptions) -> None:
+    for row in rows:
+        bson.encode(build(row), codec_options=options)
+
+
+def measure(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    options = CodecOptions(type_registry=TYPE_REGISTRY)
+    cases = [
+        ('users', user_rows(n), lambda u: migration._user_document(u, [], [])),
+        ('sessions', session_rows(n), migration._session_document),
+        ('watch_history', watch_rows(n), migration._watch_history_document),
+    ]
+
+    print(f"{'table':<15}{'before rows/s':>16}{'after rows/s':>16}{'speedup':>10}")
+    for name, rows, build in cases:
+        t_before = measure(before, rows, build)
+        t_after = measure(after, rows, build, options)
+        print(f"{name:<15}{n / t_before:>16,.0f}{n / t_after:>16,.0f}{t_before / t_after:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+"""
+Benchmark suite: data-layer hot functions across dataset scale factors.
+
+For every backend and scale factor the dataset is regenerated with the generator's
+row counts multiplied by the scale (seeding itself is timed as generate_random_data,
+and migrate_from_sql for MongoDB), then each hot function runs for a number of
+iterations with random ids:
+    rent_media, load_data (UC1), watch_media, get_user_rentals, get_all_media
+
+Backends go through databases.storage, so the same workload runs on:
+    memory   embedded MemoryStore, no servers needed
+    mariadb  local MariaDB container
+    mongodb  local MongoDB + MariaDB containers (data migrated from SQL)
+
+Results are written as JSON, scaling curves (p50 per scale and the log-log slope:
+~0 flat, ~1 linear) are printed, and with --baseline every (backend, scale,
+operation) p50 is compared against a saved run; regressions beyond --threshold
+make the exit code 1.
+
+Run from the repository root:
+    python -m benchmarks.bench_data_layer --backends memory --scales 1,10,100
+    python -m benchmarks.bench_data_layer --save-baseline benchmarks/results/baseline.json
+    python -m benchmarks.bench_data_layer --baseline benchmarks/results/baseline.json
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Dict, Any, Callable
+import numpy as np
+from backend.databases import storage
+from backend.databases.mariadb import data_generator
+from backend.databases.mongodb import mongo_migration
+
+SCALED_CONSTANTS = ['FAMILIES', 'USERS', 'MEDIA', 'SERIES', 'FILMS', 'DEVICES', 'SESSIONS', 'FRIENDSHIPS', 'WATCHHISTORIES']
+BASE_COUNTS = {name: getattr(data_generator, name) for name in SCALED_CONSTANTS}
+
+RESULTS_DIR = os.path.join('benchmarks', 'results')
+_rng = np.random.default_rng()
+
+
+def set_scale(scale: int):
+    for name, count in BASE_COUNTS.items():
+        setattr(data_generator, name, count * scale)
+
+
+def timed(fn: Callable, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def summarize(latencies_ms: list[float], elapsed_s: float) -> Dict[str, float]:
+    values = np.array(latencies_ms)
+    return {
+        'count': len(values),
+        'mean_ms': round(float(values.mean()), 3),
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p90_ms': round(float(np.percentile(values, 90)), 3),
+        'p99_ms': round(float(np.percentile(values, 99)), 3),
+        'max_ms': round(float(values.max()), 3),
+        'ops_per_sec': round(len(values) / elapsed_s, 1) if elapsed_s else 0.0,
+    }
+
+
+def seed(backend_name: str) -> Dict[str, float]:
+    """Regenerates the dataset for the current scale, returns one-shot timings in ms."""
+    if backend_name == 'mongodb':
+        return {
+            'generate_random_data': timed(storage.BACKENDS['mariadb'].bulk_load),
+            'migrate_from_sql': timed(mongo_migration.migrate_from_sql),
+        }
+    return {'generate_random_data': timed(storage.BACKENDS[backend_name].bulk_load)}
+
+
+def workload(backend) -> Dict[str, Callable[[], Any]]:
+    users, media = data_generator.USERS, data_generator.MEDIA
+
+    def user_id() -> int:
+        return int(_rng.integers(1, users + 1))
+
+    def media_id() -> int:
+        return int(_rng.integers(1, media + 1))
+
+    return {
+        'rent_media': lambda: backend.rent_media(user_id(), media_id(), int(_rng.integers(1, 21))),
+        'load_data': backend.load_family_media,
+        'watch_media': lambda: backend.watch_media(user_id(), media_id()),
+        'get_user_rentals': lambda: backend.list_user_rentals(user_id()),
+        'get_all_media': backend.list_media,
+    }
+
+
+def run_operation(fn: Callable[[], Any], iterations: int, warmup: int) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        latencies.append(timed(fn))
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def run_suite(backends: list[str], scales: list[int], iterations: int, warmup: int) -> list[Dict]:
+    results = []
+    for backend_name in backends:
+        backend = storage.BACKENDS[backend_name]
+        for scale in scales:
+            set_scale(scale)
+            print(f"[{backend_name} x{scale}] seeding")
+            for operation, ms in seed(backend_name).items():
+                results.append({'backend': backend_name, 'scale': scale, 'operation': operation,
+                                **summarize([ms], ms / 1000)})
+            for operation, fn in workload(backend).items():
+                summary = run_operation(fn, iterations, warmup)
+                results.append({'backend': backend_name, 'scale': scale, 'operation': operation, **summary})
+                print(f"[{backend_name} x{scale}] {operation:<22} p50 {summary['p50_ms']:>9.3f} ms"
+                      f"  p99 {summary['p99_ms']:>9.3f} ms  {summary['ops_per_sec']:>9.1f} ops/s")
+    set_scale(1)
+    return results
+
+
+def print_scaling_curves(results: list[Dict]):
+    print(f"\n{'backend':<9}{'operation':<22}{'scale':>7}{'p50 ms':>12}{'ops/s':>11}{'slope':>8}")
+    curves: Dict[tuple, list[Dict]] = {}
+    for r in results:
+        curves.setdefault((r['backend'], r['operation']), []).append(r)
+    for (backend, operation), points in curves.items():
+        points.sort(key=lambda r: r['scale'])
+        previous = None
+        for r in points:
+            slope = ''
+            if previous and previous['p50_ms'] > 0 and r['p50_ms'] > 0 and r['scale'] != previous['scale']:
+                slope = f"{math.log(r['p50_ms'] / previous['p50_ms']) / math.log(r['scale'] / previous['scale']):.2f}"
+            print(f"{backend:<9}{operation:<22}{r['scale']:>7}{r['p50_ms']:>12.3f}{r['ops_per_sec']:>11.1f}{slope:>8}")
+            previous = r
+
+
+def compare_to_baseline(results: list[Dict], baseline: list[Dict], threshold: float) -> list[Dict]:
+    """Returns the entries whose p50 is more than `threshold` (fraction) slower than the baseline."""
+    previous = {(r['backend'], r['scale'], r['operation']): r for r in baseline}
+    regressions = []
+    print(f"\n{'backend':<9}{'operation':<22}{'scale':>7}{'base p50':>12}{'p50':>12}{'change':>9}")
+    for r in results:
+        base = previous.get((r['backend'], r['scale'], r['operation']))
+        if base is None or base['p50_ms'] <= 0:
+            continue
+        change = r['p50_ms'] / base['p50_ms'] - 1
+        flag = '  REGRESSION' if change > threshold else ''
+        print(f"{r['backend']:<9}{r['operation']:<22}{r['scale']:>7}{base['p50_ms']:>12.3f}"
+              f"{r['p50_ms']:>12.3f}{change:>+8.1%}{flag}")
+        if flag:
+            regressions.append({**r, 'baseline_p50_ms': base['p50_ms'], 'change': round(change, 4)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', default='memory', help="comma separated: memory,mariadb,mongodb")
+    parser.add_argument('--scales', default='1,10,100', help="comma separated scale factors")
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--output', default=None, help="result file (default benchmarks/results/<timestamp>.json)")
+    parser.add_argument('--baseline', default=None, help="saved result file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.10, help="allowed p50 slowdown vs baseline")
+    parser.add_argument('--save-baseline', default=None, help="also write the results to this baseline file")
+    args = parser.parse_args()
+
+    backends = args.backends.split(',')
+    unknown = [b for b in backends if b not in storage.BACKENDS]
+    if unknown:
+        parser.error(f"unknown backends: {', '.join(unknown)}")
+    scales = [int(s) for s in args.scales.split(',')]
+
+    results = run_suite(backends, scales, args.iterations, args.warmup)
+    print_scaling_curves(results)
+
+    report = {
+        'created_at': datetime.now().isoformat(),
+        'iterations': args.iterations,
+        'base_counts': BASE_COUNTS,
+        'results': results,
+    }
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(results, json.load(f)['results'], args.threshold)
+        report['baseline'] = args.baseline
+        report['regressions'] = regressions
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    for path in filter(None, [output, args.save_baseline]):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {path}")
+
+    if regressions:
+        print(f"{len(regressions)} regressions beyond {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,330 @@
+"""
+Open-loop HTTP load generator for the rent / watch / load-data endpoints.
+
+Requests are issued on a fixed arrival schedule (constant or Poisson rate),
+independent of how fast the server answers, so a slow server cannot slow the
+generator down. Latency is measured from each request's *intended* start time,
+which includes any time it waited for a free connection: the coordinated-omission
+corrected figure. Service time (from the actual send) is reported next to it.
+
+User and media ids follow a Zipf distribution over the ids reported by
+/api/store/stats, so a few titles and users are hot as in real traffic.
+
+Targets (--backend):
+    mariadb  /api/usecase2/rent, /api/usecase1/watch, /api/usecase1/load-data
+    mongodb  /api/mongodb/usecase2/rent, /api/mongodb/usecase1/watch, /api/mongodb/usecase1/load-data
+    memory   /api/store/* with backend=memory (no databases needed)
+
+Run from the repository root against a running instance:
+    python -m benchmarks.load_generator --rate 200 --duration 30 --mix rent=70,watch=25,load-data=5
+    python -m benchmarks.load_generator --backend mongodb --arrivals poisson --output load.json
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from urllib.parse import urlsplit, urlencode
+from typing import Dict, Any
+import numpy as np
+
+# operation -> backend -> (method, path, query params or None, json body or None)
+TARGETS = {
+    'rent': {
+        'mariadb': ('POST', '/api/usecase2/rent', 'query'),
+        'mongodb': ('POST', '/api/mongodb/usecase2/rent', 'query'),
+        'memory': ('POST', '/api/store/rent', 'query'),
+    },
+    'watch': {
+        'mariadb': ('POST', '/api/usecase1/watch', 'json'),
+        'mongodb': ('POST', '/api/mongodb/usecase1/watch', 'json'),
+        'memory': ('POST', '/api/store/watch', 'json'),
+    },
+    'load-data': {
+        'mariadb': ('GET', '/api/usecase1/load-data', None),
+        'mongodb': ('GET', '/api/mongodb/usecase1/load-data', None),
+        'memory': ('GET', '/api/store/family-media', None),
+    },
+}
+# /api/store/* routes take the backend as a query parameter
+STORE_BACKENDS = {'memory'}
+
+PERCENTILES = [50, 90, 99, 99.9]
+MAX_DURATION_DAYS = 20
+
+
+class ZipfIds:
+    """Ids 1..n with Zipf(s) popularity; hot ids are spread randomly over the range."""
+
+    def __init__(self, n: int, s: float, rng: np.random.Generator):
+        weights = 1 / np.arange(1, n + 1) ** s
+        self.ids = rng.permutation(n) + 1
+        self.cdf = np.cumsum(weights / weights.sum())
+        self.rng = rng
+
+    def sample(self) -> int:
+        rank = int(np.searchsorted(self.cdf, self.rng.random()))
+        return int(self.ids[min(rank, len(self.ids) - 1)])
+
+
+class Connection:
+    """Minimal HTTP/1.1 keep-alive client connection on asyncio streams."""
+
+    def __init__(self, host: str, port: int):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, method: str, target: str, body: bytes | None) -> tuple[int, int]:
+        """Returns (status, response body size)."""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = f"{method} {target} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+        if body is not None:
+            head += f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+        elif method == 'POST':
+            head += "Content-Length: 0\r\n"
+        self.writer.write(head.encode() + b"\r\n" + (body or b""))
+        await self.writer.drain()
+        return await self._read_response()
+
+    async def _read_response(self) -> tuple[int, int]:
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed by server")
+        status = int(status_line.split()[1])
+        length, chunked, close = None, False, False
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            name, value = name.strip().lower(), value.strip().lower()
+            if name == 'content-length':
+                length = int(value)
+            elif name == 'transfer-encoding':
+                chunked = 'chunked' in value
+            elif name == 'connection':
+                close = value == 'close'
+
+        size = 0
+        if chunked:
+            while True:
+                chunk = int((await self.reader.readline()).split(b";")[0], 16)
+                if chunk == 0:
+                    while await self.reader.readline() not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                await self.reader.readexactly(chunk + 2)
+                size += chunk
+        elif length is not None:
+            await self.reader.readexactly(length)
+            size = length
+        else:
+            size = len(await self.reader.read())
+            close = True
+        if close:
+            self.close()
+        return status, size
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+class LoadGenerator:
+    def __init__(self, args: argparse.Namespace):
+        url = urlsplit(args.url)
+        self.host, self.port = url.hostname, url.port or 80
+        self.backend = args.backend
+        self.mix = parse_mix(args.mix)
+        self.rng = np.random.default_rng(args.seed)
+        self.args = args
+        self.connections: asyncio.Queue = asyncio.Queue()
+        for _ in range(args.connections):
+            self.connections.put_nowait(Connection(self.host, self.port))
+        # per operation: corrected latencies, service times (ms), errors, bytes
+        self.samples: Dict[str, Dict[str, list]] = {
+            op: {'latency': [], 'service': [], 'errors': [], 'bytes': []} for op in self.mix
+        }
+        self.max_schedule_lag = 0.0
+
+    async def discover_ids(self):
+        """Id ranges from /api/store/stats unless --users/--media are given."""
+        users, media = self.args.users, self.args.media
+        if not (users and media):
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+            writer.write(f"GET /api/store/stats?backend={self.backend} HTTP/1.1\r\n"
+                         f"Host: {self.host}\r\nConnection: close\r\n\r\n".encode())
+            raw = await reader.read()
+            writer.close()
+            stats = json.loads(raw.split(b"\r\n\r\n", 1)[1])['stats']
+            users, media = users or stats['users'], media or stats['media']
+        if not (users and media):
+            raise RuntimeError("No users or media in the target backend, load data first")
+        self.user_ids = ZipfIds(users, self.args.zipf, self.rng)
+        self.media_ids = ZipfIds(media, self.args.zipf, self.rng)
+        print(f"Ids: {users} users, {media} media, zipf s={self.args.zipf}")
+
+    def build_request(self, operation: str) -> tuple[str, str, bytes | None]:
+        method, path, params = TARGETS[operation][self.backend]
+        query: Dict[str, Any] = {'backend': self.backend} if self.backend in STORE_BACKENDS else {}
+        body = None
+        if params == 'query':
+            query.update(user_id=self.user_ids.sample(), media_id=self.media_ids.sample(),
+                         duration_days=int(self.rng.integers(1, MAX_DURATION_DAYS + 1)))
+        elif params == 'json':
+            body = json.dumps({'user_id': self.user_ids.sample(), 'media_id': self.media_ids.sample()}).encode()
+        return method, f"{path}?{urlencode(query)}" if query else path, body
+
+    def arrival_offsets(self) -> np.ndarray:
+        """Intended start times in seconds from the beginning of the run."""
+        rate, total = self.args.rate, self.args.duration + self.args.warmup
+        count = int(rate * total)
+        if self.args.arrivals == 'poisson':
+            offsets = np.cumsum(self.rng.exponential(1 / rate, count))
+            return offsets[offsets < total]
+        return np.arange(count) / rate
+
+    async def issue(self, operation: str, intended: float, record: bool):
+        loop = asyncio.get_running_loop()
+        method, target, body = self.build_request(operation)
+        connection = await self.connections.get()
+        sent = loop.time()
+        error = None
+        size = 0
+        try:
+            status, size = await asyncio.wait_for(connection.request(method, target, body), self.args.timeout)
+            if status >= 400:
+                error = str(status)
+        except Exception as e:
+            error = type(e).__name__
+            connection.close()
+        finally:
+            self.connections.put_nowait(connection)
+        done = loop.time()
+        if record:
+            samples = self.samples[operation]
+            samples['latency'].append((done - intended) * 1000)
+            samples['service'].append((done - sent) * 1000)
+            samples['bytes'].append(size)
+            if error:
+                samples['errors'].append(error)
+
+    async def run(self) -> Dict[str, Any]:
+        await self.discover_ids()
+        loop = asyncio.get_running_loop()
+        operations = list(self.mix)
+        weights = np.array([self.mix[op] for op in operations], dtype=float)
+        offsets = self.arrival_offsets()
+        picks = self.rng.choice(len(operations), size=len(offsets), p=weights / weights.sum())
+
+        print(f"Sending {len(offsets)} requests at {self.args.rate}/s ({self.args.arrivals}) "
+              f"over {self.args.connections} connections, mix {self.mix}")
+        tasks = []
+        start = loop.time()
+        for offset, pick in zip(offsets, picks):
+            intended = start + offset
+            delay = intended - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                self.max_schedule_lag = max(self.max_schedule_lag, -delay)
+            record = offset >= self.args.warmup
+            tasks.append(asyncio.create_task(self.issue(operations[pick], intended, record)))
+        await asyncio.gather(*tasks)
+        elapsed = loop.time() - start - self.args.warmup
+
+        while not self.connections.empty():
+            self.connections.get_nowait().close()
+        return self.report(elapsed)
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        def summary(samples: Dict[str, list]) -> Dict[str, Any]:
+            latency, service = np.array(samples['latency']), np.array(samples['service'])
+            result: Dict[str, Any] = {
+                'requests': len(latency),
+                'errors': len(samples['errors']),
+                'error_rate': round(len(samples['errors']) / len(latency), 4) if len(latency) else 0.0,
+                'throughput': round((len(latency) - len(samples['errors'])) / elapsed, 1) if elapsed > 0 else 0.0,
+                'mean_bytes': int(np.mean(samples['bytes'])) if samples['bytes'] else 0,
+            }
+            for name, values in (('latency', latency), ('service', service)):
+                for p in PERCENTILES:
+                    result[f"{name}_p{p:g}_ms"] = round(float(np.percentile(values, p)), 3) if len(values) else 0.0
+                result[f"{name}_max_ms"] = round(float(values.max()), 3) if len(values) else 0.0
+            errors: Dict[str, int] = {}
+            for e in samples['errors']:
+                errors[e] = errors.get(e, 0) + 1
+            result['error_kinds'] = errors
+            return result
+
+        merged = {key: sum((s[key] for s in self.samples.values()), []) for key in ('latency', 'service', 'errors', 'bytes')}
+        return {
+            'config': {key: getattr(self.args, key) for key in
+                       ('url', 'backend', 'mix', 'rate', 'arrivals', 'duration', 'warmup', 'connections', 'zipf')},
+            'elapsed': round(elapsed, 2),
+            'max_schedule_lag_ms': round(self.max_schedule_lag * 1000, 3),
+            'total': summary(merged),
+            'operations': {op: summary(s) for op, s in self.samples.items()},
+        }
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        if name not in TARGETS:
+            raise ValueError(f"Unknown operation '{name}', expected one of {', '.join(TARGETS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"\n{'operation':<11}{'requests':>9}{'errors':>8}{'req/s':>9}"
+          f"{'p50 ms':>10}{'p99 ms':>10}{'p99.9 ms':>10}{'max ms':>10}{'svc p99':>10}")
+    for name, r in list(report['operations'].items()) + [('total', report['total'])]:
+        print(f"{name:<11}{r['requests']:>9}{r['error_rate']:>8.1%}{r['throughput']:>9.1f}"
+              f"{r['latency_p50_ms']:>10.2f}{r['latency_p99_ms']:>10.2f}{r['latency_p99.9_ms']:>10.2f}"
+              f"{r['latency_max_ms']:>10.2f}{r['service_p99_ms']:>10.2f}")
+    print("Latencies are measured from the intended send time (coordinated-omission corrected); "
+          "svc = service time from the actual send")
+    if report['max_schedule_lag_ms'] > 10:
+        print(f"Warning: the generator fell {report['max_schedule_lag_ms']:.0f} ms behind its schedule, "
+              "the client is saturated")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--backend', default='mariadb', choices=['mariadb', 'mongodb', 'memory'])
+    parser.add_argument('--mix', default='rent=70,watch=25,load-data=5', help="operation=weight,...")
+    parser.add_argument('--rate', type=float, default=100, help="requests per second")
+    parser.add_argument('--arrivals', default='uniform', choices=['uniform', 'poisson'])
+    parser.add_argument('--duration', type=float, default=30, help="measured seconds")
+    parser.add_argument('--warmup', type=float, default=5, help="seconds sent but not measured")
+    parser.add_argument('--connections', type=int, default=64, help="max concurrent connections")
+    parser.add_argument('--timeout', type=float, default=30, help="per-request timeout in seconds")
+    parser.add_argument('--users', type=int, default=0, help="user id range (default from /api/store/stats)")
+    parser.add_argument('--media', type=int, default=0, help="media id range (default from /api/store/stats)")
+    parser.add_argument('--zipf', type=float, default=1.1, help="Zipf exponent of id popularity (0 = uniform)")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--output', default=None, help="write the report as JSON")
+    args = parser.parse_args()
+
+    try:
+        parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    report = asyncio.run(LoadGenerator(args).run())
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    sys.exit(1 if report['total']['error_rate'] > 0 else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""
+Replays a captured request log (see backend/capture.py) against an instance.
+
+Requests are re-issued with their recorded method, path, query and JSON body:
+    --speed 1     original inter-arrival times
+    --speed 4     scaled, four times as fast
+    --speed max   back to back, as fast as --connections allow
+For paced replays latency is measured from the intended send time, like the load
+generator, so a server that falls behind the recorded traffic shows it.
+
+Per route the replayed latency distribution is compared with the one in the log
+(what production saw) or, with --baseline, with an earlier replay report, which
+is the way to test a performance change against the same traffic.
+
+Run from the repository root:
+    python -m benchmarks.replay captures/requests.jsonl --url http://localhost:8000 --speed 2
+    python -m benchmarks.replay captures/requests.jsonl --speed max --output after.json --baseline before.json
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from urllib.parse import urlsplit
+from typing import Dict, Any
+import numpy as np
+from .load_generator import Connection
+
+PERCENTILES = [50, 90, 99, 99.9]
+
+
+def load_log(path: str, routes: list[str] | None = None, limit: int | None = None) -> list[Dict]:
+    records = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if routes and (record.get('route') or record['path']) not in routes:
+                continue
+            records.append(record)
+    records.sort(key=lambda r: r['time'])
+    return records[:limit] if limit else records
+
+
+def route_of(record: Dict) -> str:
+    return f"{record['method']} {record.get('route') or record['path']}"
+
+
+def distribution(latencies: list[float], errors: int = 0) -> Dict[str, Any]:
+    values = np.array(latencies)
+    result: Dict[str, Any] = {'requests': len(values), 'errors': errors}
+    for p in PERCENTILES:
+        result[f"p{p:g}_ms"] = round(float(np.percentile(values, p)), 3) if len(values) else 0.0
+    result['max_ms'] = round(float(values.max()), 3) if len(values) else 0.0
+    return result
+
+
+def captured_distributions(records: list[Dict]) -> Dict[str, Dict[str, Any]]:
+    by_route: Dict[str, list] = {}
+    errors: Dict[str, int] = {}
+    for r in records:
+        by_route.setdefault(route_of(r), []).append(r['latency_ms'])
+        errors[route_of(r)] = errors.get(route_of(r), 0) + (r['status'] >= 400)
+    return {route: distribution(values, errors[route]) for route, values in sorted(by_route.items())}
+
+
+async def replay(records: list[Dict], url: str, speed: float | None, connections: int,
+                 timeout: float) -> tuple[Dict[str, Dict[str, Any]], float, float]:
+    """Returns per-route distributions, elapsed seconds and the max schedule lag in ms."""
+    parts = urlsplit(url)
+    pool: asyncio.Queue = asyncio.Queue()
+    for _ in range(connections):
+        pool.put_nowait(Connection(parts.hostname, parts.port or 80))
+    latencies: Dict[str, list] = {}
+    errors: Dict[str, int] = {}
+    loop = asyncio.get_running_loop()
+    lag = 0.0
+
+    async def issue(record: Dict, intended: float | None):
+        connection = await pool.get()
+        sent = loop.time()
+        failed = False
+        try:
+            target = record['path'] + (f"?{record['query']}" if record.get('query') else '')
+            body = json.dumps(record['body']).encode() if 'body' in record else None
+            status, _ = await asyncio.wait_for(connection.request(record['method'], target, body), timeout)
+            failed = status >= 400
+        except Exception:
+            failed = True
+            connection.close()
+        finally:
+            pool.put_nowait(connection)
+        done = loop.time()
+        route = route_of(record)
+        latencies.setdefault(route, []).append((done - (intended if intended is not None else sent)) * 1000)
+        errors[route] = errors.get(route, 0) + failed
+
+    start = loop.time()
+    first = records[0]['time'] if records else 0
+    tasks = []
+    for record in records:
+        intended = None
+        if speed:
+            intended = start + (record['time'] - first) / speed
+            delay = intended - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                lag = max(lag, -delay)
+        elif len(tasks) >= connections * 4:
+            # max speed: keep the pool busy without queueing the whole log at once
+            await asyncio.gather(*tasks)
+            tasks = []
+        tasks.append(asyncio.create_task(issue(record, intended)))
+    await asyncio.gather(*tasks)
+    elapsed = loop.time() - start
+
+    while not pool.empty():
+        pool.get_nowait().close()
+    results = {route: distribution(values, errors[route]) for route, values in sorted(latencies.items())}
+    return results, elapsed, lag * 1000
+
+
+def compare(current: Dict[str, Dict], reference: Dict[str, Dict], label: str):
+    print(f"\n{'route':<52}{'requests':>9}{'errors':>7}{label + ' p50':>13}{'p50':>9}"
+          f"{label + ' p99':>13}{'p99':>9}{'p99 x':>7}")
+    for route, r in current.items():
+        ref = reference.get(route)
+        ref_p50 = f"{ref['p50_ms']:.2f}" if ref else '-'
+        ref_p99 = f"{ref['p99_ms']:.2f}" if ref else '-'
+        ratio = f"{r['p99_ms'] / ref['p99_ms']:.2f}" if ref and ref['p99_ms'] else '-'
+        print(f"{route[:51]:<52}{r['requests']:>9}{r['errors']:>7}{ref_p50:>13}{r['p50_ms']:>9.2f}"
+              f"{ref_p99:>13}{r['p99_ms']:>9.2f}{ratio:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('log', help="JSONL log written by the capture middleware")
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--speed', default='1', help="replay speed factor, or 'max'")
+    parser.add_argument('--connections', type=int, default=64)
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--routes', default=None, help="comma separated route templates to replay")
+    parser.add_argument('--limit', type=int, default=None, help="replay only the first N records")
+    parser.add_argument('--baseline', default=None, help="earlier replay report to compare against")
+    parser.add_argument('--output', default=None, help="write the replay report as JSON")
+    args = parser.parse_args()
+
+    if args.speed == 'max':
+        speed = None
+    else:
+        speed = float(args.speed)
+        if speed <= 0:
+            parser.error("--speed must be positive or 'max'")
+
+    records = load_log(args.log, args.routes.split(',') if args.routes else None, args.limit)
+    if not records:
+        parser.error(f"no records to replay in {args.log}")
+    span = records[-1]['time'] - records[0]['time']
+    print(f"Replaying {len(records)} requests spanning {span:.1f}s at speed {args.speed} against {args.url}")
+
+    results, elapsed, lag = asyncio.run(replay(records, args.url, speed, args.connections, args.timeout))
+    report = {
+        'log': args.log,
+        'url': args.url,
+        'speed': args.speed,
+        'elapsed': round(elapsed, 2),
+        'throughput': round(len(records) / elapsed, 1) if elapsed else 0.0,
+        'max_schedule_lag_ms': round(lag, 3),
+        'routes': results,
+    }
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f)['routes'], 'base')
+    else:
+        compare(results, captured_distributions(records), 'log')
+    print(f"\n{report['throughput']} req/s over {report['elapsed']}s")
+    if lag > 10:
+        print(f"Warning: replay fell {lag:.0f} ms behind the recorded schedule")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    sys.exit(1 if any(r['errors'] for r in results.values()) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -84,3 +84,11 @@ CREATE TABLE Device (
     PRIMARY KEY (device_id, user_id),  
     FOREIGN KEY (user_id) REFERENCES Users(user_id)
 );
+
+CREATE TABLE IF NOT EXISTS ChangeLog (
+	change_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+	entity VARCHAR(50) NOT NULL,
+	key_column VARCHAR(50) NOT NULL,
+	key_value INT NOT NULL,
+	changed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
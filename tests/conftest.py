@@ -0,0 +1,101 @@
+"""Shared fixtures: in-process MongoDB collections, a private shared_state segment, a dead pid."""
+
+import subprocess
+import sys
+from types import SimpleNamespace
+import pytest
+from pymongo import DeleteMany, InsertOne, ReplaceOne
+from backend import shared_state
+
+
+def _field(doc, path):
+    for part in path.split('.'):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(part)
+    return doc
+
+
+def _matches(doc, query):
+    for path, condition in query.items():
+        value = _field(doc, path)
+        if isinstance(condition, dict) and '$in' in condition:
+            if value not in condition['$in']:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeCollection:
+    """The parts of a pymongo Collection the modules under test use, over a list of documents."""
+
+    def __init__(self, name):
+        self.name = name
+        self.docs = []
+        self.ops = []
+
+    def with_options(self, **_):
+        return self
+
+    def insert_one(self, doc):
+        self.docs.append(dict(doc))
+
+    def find_one(self, query, projection=None):
+        return next((dict(d) for d in self.docs if _matches(d, query)), None)
+
+    def find(self, query, projection=None):
+        return [dict(d) for d in self.docs if _matches(d, query)]
+
+    def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        doc = self.find_one(query)
+        if doc is None:
+            doc = dict(query)
+            self.docs.append(doc)
+        else:
+            doc = next(d for d in self.docs if _matches(d, query))
+        for field, delta in update.get('$inc', {}).items():
+            doc[field] = doc.get(field, 0) + delta
+        return dict(doc)
+
+    def bulk_write(self, ops, ordered=True):
+        self.ops.extend(ops)
+        deleted = 0
+        for op in ops:
+            if isinstance(op, DeleteMany):
+                kept = [d for d in self.docs if not _matches(d, op._filter)]
+                deleted += len(self.docs) - len(kept)
+                self.docs = kept
+            elif isinstance(op, ReplaceOne):
+                self.docs = [d for d in self.docs if not _matches(d, op._filter)] + [dict(op._doc)]
+            elif isinstance(op, InsertOne):
+                self.docs.append(dict(op._doc))
+        return SimpleNamespace(acknowledged=True, deleted_count=deleted)
+
+
+class FakeDatabase(dict):
+    """Collections by name, created on first use; call it in place of get_collection."""
+
+    def __call__(self, name, *profile):
+        return self.setdefault(name, FakeCollection(name))
+
+
+@pytest.fixture
+def fake_db():
+    return FakeDatabase()
+
+
+@pytest.fixture
+def shared_counters(monkeypatch, tmp_path):
+    """A private shared_state segment returned by shared_state.counters()."""
+    counters = shared_state.SharedCounters(str(tmp_path / 'state'))
+    monkeypatch.setattr(shared_state, 'counters', lambda: counters)
+    return counters
+
+
+@pytest.fixture
+def dead_pid():
+    """Pid of a process that has exited."""
+    child = subprocess.Popen([sys.executable, '-c', 'pass'])
+    child.wait()
+    return child.pid
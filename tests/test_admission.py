@@ -0,0 +1,44 @@
+"""Admission bookkeeping over a private shared_state segment."""
+
+import asyncio
+import pytest
+from backend import admission, shared_state
+
+
+@pytest.fixture
+def counters(shared_counters, monkeypatch):
+    monkeypatch.setattr(admission, '_worker', None)
+    monkeypatch.setattr(admission, '_critical_inflight', 0)
+    return shared_counters
+
+
+def test_bulk_slots_of_dead_worker_are_reaped(counters, dead_pid):
+    # A killed worker held the only bulk slot and a queue place
+    counters.compare_and_set('admission.worker.0', 0, dead_pid)
+    for name in ('admission.bulk.inflight', 'admission.bulk.queued'):
+        counters.add(name)
+        counters.add(f"{name}.held.0")
+    assert admission._try_start(counters, 'POST /api/generate-data', 1)
+    assert admission._worker_slot(counters) == 0
+    assert counters.get('admission.bulk.inflight') == 1
+    assert counters.get('admission.bulk.queued') == 0
+    admission._finish(counters, 'POST /api/generate-data', 1)
+    assert counters.get('admission.bulk.inflight') == 0
+
+
+def test_critical_requests_take_no_lock(counters, monkeypatch):
+    seen = []
+
+    async def app(scope, receive, send):
+        seen.append(admission.status()['critical_inflight'])
+
+    middleware = admission.AdmissionMiddleware(app)
+    scope = {'type': 'http', 'method': 'POST', 'path': '/api/usecase2/rent'}
+    asyncio.run(middleware(scope, None, None))
+
+    def locked(*args):
+        raise AssertionError("lockf on the critical path")
+    monkeypatch.setattr(shared_state.fcntl, 'lockf', locked)
+    asyncio.run(middleware(scope, None, None))
+    assert seen == [1, 1]
+    assert admission._critical_total(counters) == 0
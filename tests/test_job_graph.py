@@ -0,0 +1,52 @@
+"""Dependency scheduling of the migration job graph, with plain callables."""
+
+import threading
+import pytest
+from backend.databases.mongodb import mongo_migration as migration
+
+
+def test_jobs_start_after_their_dependencies():
+    finished = []
+    lock = threading.Lock()
+
+    def job(name, value):
+        def run(results):
+            with lock:
+                finished.append(name)
+            return value(results)
+        return run
+
+    jobs = {
+        'report': (job('report', lambda r: r['users'] + r['media']), ['users', 'media']),
+        'users': (job('users', lambda r: 2), []),
+        'media': (job('media', lambda r: 3), []),
+        'sessions': (job('sessions', lambda r: r['users'] * 10), ['users']),
+    }
+    results = migration.run_job_graph(jobs, workers=4)
+    assert results == {'users': 2, 'media': 3, 'sessions': 20, 'report': 5}
+    assert finished.index('users') < finished.index('sessions')
+    assert finished.index('report') > max(finished.index('users'), finished.index('media'))
+
+
+def test_failure_stops_dependents():
+    ran = []
+
+    def fail(results):
+        raise KeyError('users')
+
+    jobs = {
+        'users': (fail, []),
+        'sessions': (lambda r: ran.append('sessions'), ['users']),
+    }
+    with pytest.raises(KeyError):
+        migration.run_job_graph(jobs, workers=2)
+    assert ran == []
+
+
+@pytest.mark.parametrize('jobs', [
+    {'a': (lambda r: 1, ['b']), 'b': (lambda r: 2, ['a'])},
+    {'a': (lambda r: 1, []), 'b': (lambda r: 2, ['missing'])},
+], ids=['cycle', 'unknown dependency'])
+def test_unresolvable_dependencies(jobs):
+    with pytest.raises(RuntimeError, match="Unresolvable job dependencies"):
+        migration.run_job_graph(jobs, workers=2)
@@ -0,0 +1,44 @@
+"""Streaming merge-join used by the document builders."""
+
+import pytest
+from backend.databases.mongodb.mongo_migration import merge_join
+
+
+def _rows(*keys, **extra):
+    return [{'user_id': k, **extra} for k in keys]
+
+
+def _joined(parents, *children):
+    return [(p['user_id'], [[r['user_id'] for r in rows] for rows in matched])
+            for p, matched in merge_join(parents, 'user_id', *children)]
+
+
+def test_parents_without_children_get_empty_groups():
+    assert _joined(_rows(1, 2, 3), _rows(2, 2)) == [(1, [[]]), (2, [[2, 2]]), (3, [[]])]
+
+
+def test_children_without_parent_are_skipped():
+    assert _joined(_rows(2, 4), _rows(1, 2, 3, 4, 4, 5)) == [(2, [[2]]), (4, [[4, 4]])]
+
+
+def test_several_child_streams():
+    devices, friends = _rows(1, 1, 3, kind='device'), _rows(2, 3, 3, kind='friend')
+    assert _joined(_rows(1, 2, 3), devices, friends) == [
+        (1, [[1, 1], []]),
+        (2, [[], [2]]),
+        (3, [[3], [3, 3]]),
+    ]
+
+
+def test_no_parents_and_no_children():
+    assert _joined([], _rows(1)) == []
+    assert _joined(_rows(1), []) == [(1, [[]])]
+
+
+@pytest.mark.parametrize('parents, child', [
+    (_rows(1, 3, 2), _rows(1)),
+    (_rows(1, 2, 3), _rows(1, 3, 2)),
+], ids=['parents', 'children'])
+def test_unsorted_input_is_rejected(parents, child):
+    with pytest.raises(ValueError, match="not ordered by user_id"):
+        _joined(parents, child)
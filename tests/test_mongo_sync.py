@@ -0,0 +1,28 @@
+"""Incremental sync of one key chunk, checked against an in-process collection."""
+
+import pytest
+from pymongo import DeleteMany, ReplaceOne
+from backend.databases.mongodb import mongo_sync
+
+
+@pytest.fixture
+def users(fake_db, monkeypatch):
+    coll = fake_db('users')
+    coll.docs = [{'user_id': i} for i in (1, 2, 3)]
+    monkeypatch.setattr(mongo_sync, 'get_collection', fake_db)
+    monkeypatch.setattr(mongo_sync, 'is_time_series', lambda name: False)
+    monkeypatch.setattr(mongo_sync.migration, 'get_bulk_write_concern', lambda: None)
+    # Row 2 was deleted in SQL
+    monkeypatch.setitem(mongo_sync.SYNC_COLLECTIONS, 'users',
+                        ('user_id', lambda where, params: iter([{'user_id': i} for i in params if i != 2])))
+    return coll
+
+
+def test_sync_keys_deletes_missing_ids_without_nin(users):
+    written, deleted = mongo_sync._sync_keys('users', 'user_id', [1, 2, 3])
+    assert (written, deleted) == (2, 1)
+    deletes = [op for op in users.ops if isinstance(op, DeleteMany)]
+    assert [op._filter for op in deletes] == [{'user_id': {'$in': [2]}}]
+    assert sorted(op._filter['user_id'] for op in users.ops if isinstance(op, ReplaceOne)) == [1, 3]
+    assert '$nin' not in repr(users.ops)
+    assert sorted(d['user_id'] for d in users.docs) == [1, 3]
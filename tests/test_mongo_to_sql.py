@@ -0,0 +1,25 @@
+"""SQL -> MongoDB -> SQL round trip of the document builders and the reverse row builders."""
+
+from collections import defaultdict
+from datetime import date
+from backend.databases.mongodb import mongo_migration as migration
+from backend.databases.mongodb import mongo_to_sql
+
+
+class RecordingLoader:
+    def __init__(self):
+        self.rows = []
+
+    def add(self, row):
+        self.rows.append(row)
+
+
+def test_user_devices_round_trip():
+    user = {'user_id': 1, 'user_name': "Zhami", 'email': "zhami@example.com", 'birthday': date(2002, 11, 22),
+            'location': "Almaty", 'bio': None, 'family_id': None}
+    devices = [{'user_id': 1, 'device_id': 4, 'device_name': "iPhone 15", 'registration_date': date(2025, 1, 1)}]
+    doc = migration._user_document(user, devices, [])
+
+    loaders = defaultdict(RecordingLoader)
+    mongo_to_sql._user_rows(doc, loaders)
+    assert loaders['Device'].rows == [(4, "iPhone 15", date(2025, 1, 1), 1)]
@@ -0,0 +1,52 @@
+"""Document builders of the MongoDB insert helpers, checked against an in-process collection."""
+
+from datetime import datetime
+import pytest
+from backend.databases.mongodb import mongodb
+
+
+@pytest.fixture
+def collections(fake_db, monkeypatch):
+    sequences = {}
+
+    def next_sequence(name):
+        sequences[name] = sequences.get(name, 0) + 1
+        return sequences[name]
+
+    monkeypatch.setattr(mongodb, 'get_collection', fake_db)
+    monkeypatch.setattr(mongodb, 'get_next_sequence', next_sequence)
+    return fake_db
+
+
+def test_insert_user_keeps_family(collections):
+    user_id = mongodb.insert_user("Zhami", "zhami@example.com", datetime(2002, 11, 22), "Almaty", "bio", family_id=7)
+    user = mongodb.get_user_by_id(user_id)
+    assert user['user_id'] == 1
+    assert user['family_id'] == 7
+
+
+def test_insert_family_assigns_id(collections):
+    first = mongodb.insert_family("Movie Lovers", datetime(2025, 11, 7), [{'user_id': 1}])
+    second = mongodb.insert_family("Gamers", datetime(2025, 11, 8))
+    assert (first, second) == (1, 2)
+    assert [d['family_id'] for d in collections['families'].docs] == [1, 2]
+    assert collections['families'].docs[0]['users'] == [{'user_id': 1}]
+
+
+def test_insert_watch_history_is_one_round_trip(collections):
+    mongodb.get_collection('users').insert_one({'user_id': 1, 'user_name': "Zhami", 'family_id': None})
+    mongodb.get_collection('media').insert_one({'media_id': 1, 'media_name': "Film 1", 'type': 'film'})
+    watch_history = mongodb.get_collection('watch_history')
+    watch_history.find_one = None   # a lookup before the insert would fail here
+    assert [mongodb.insert_watch_history(1, 1, False) for _ in range(2)] == [1, 2]
+    assert [d['watch_history_id'] for d in watch_history.docs] == [1, 2]
+
+
+def test_counter_reset_drops_blocks_of_every_worker(fake_db, shared_counters, monkeypatch):
+    monkeypatch.setattr(mongodb, 'get_collection', fake_db)
+    worker, other = mongodb.IdAllocator(10), mongodb.IdAllocator(10)
+    assert [worker.next_id('watch_history_id') for _ in range(2)] == [1, 2]
+    # Another worker drops the collections: counters start over, this worker's block is stale
+    fake_db('counters').docs.clear()
+    other.discard()
+    assert worker.next_id('watch_history_id') == 1
@@ -0,0 +1,49 @@
+"""MongoDB connection set-up; readiness pings open their own connection."""
+
+import pytest
+from pymongo.errors import ServerSelectionTimeoutError
+from backend.databases.mongodb import mongodb_connection
+
+
+class FakeClient:
+    def __init__(self, up):
+        self.up = up
+        self.admin = self
+        self.client = self
+
+    def command(self, name):
+        if not self.up:
+            raise ServerSelectionTimeoutError("no server")
+        return {'ok': 1}
+
+    def __getitem__(self, name):
+        return self
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def no_client(monkeypatch):
+    monkeypatch.setattr(mongodb_connection, '_client', None)
+    monkeypatch.setattr(mongodb_connection, '_db', None)
+
+
+def test_ping_connects_without_warm_up(no_client, monkeypatch):
+    monkeypatch.setattr(mongodb_connection, 'create_mongodb_client', lambda: FakeClient(up=True))
+    assert mongodb_connection.ping_mongodb()
+    assert mongodb_connection._client is not None
+
+
+def test_ping_reports_unreachable_server(no_client, monkeypatch):
+    monkeypatch.setattr(mongodb_connection, 'create_mongodb_client', lambda: FakeClient(up=False))
+    assert not mongodb_connection.ping_mongodb()
+    assert mongodb_connection._client is None
+
+
+def test_connect_creates_one_client_when_first_ping_succeeds(no_client, monkeypatch):
+    created = []
+    monkeypatch.setattr(mongodb_connection, 'create_mongodb_client', lambda: created.append(FakeClient(up=True)) or created[-1])
+    mongodb_connection.get_mongodb_connection()
+    assert len(created) == 1
+    assert mongodb_connection._client is created[0]
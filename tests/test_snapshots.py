@@ -0,0 +1,22 @@
+"""Snapshot file encoding and name checks."""
+
+import pytest
+from backend.databases.mariadb import snapshots
+
+
+@pytest.mark.parametrize('value', [None, '', 'plain', r'\N', 'C:\\media\\', '\\\\N', 'N'])
+def test_values_round_trip(value):
+    assert snapshots._decode_value(snapshots._encode_value(value)) == value
+
+
+def test_only_null_is_written_as_marker():
+    assert snapshots._encode_value(None) == snapshots.NULL
+    assert snapshots._encode_value(r'\N') != snapshots.NULL
+
+
+def test_invalid_name_and_missing_snapshot_differ(monkeypatch, tmp_path):
+    monkeypatch.setattr(snapshots, 'SNAPSHOT_DIR', str(tmp_path))
+    with pytest.raises(ValueError):
+        snapshots.restore_snapshot('../etc')
+    with pytest.raises(FileNotFoundError):
+        snapshots.restore_snapshot('missing')
@@ -0,0 +1,42 @@
+"""MongoDB preparation by one worker out of several, over a private shared_state segment."""
+
+import os
+from types import SimpleNamespace
+import pytest
+from backend import startup
+
+
+@pytest.fixture
+def prepared(shared_counters, monkeypatch):
+    counters = shared_counters
+    calls = []
+    monkeypatch.setattr(startup, 'mongo', SimpleNamespace(create_collections=lambda: calls.append('collections')))
+    monkeypatch.setattr(startup, 'mongo_indexes', SimpleNamespace(apply_indexes_in_background=lambda: calls.append('indexes')))
+    return counters, calls
+
+
+def test_first_worker_prepares_once(prepared):
+    counters, calls = prepared
+    startup._prepare_mongodb()
+    startup._prepare_mongodb()
+    assert calls == ['collections', 'indexes']
+    assert counters.get('startup.mongodb.prepare') == os.getpid()
+    assert counters.get('startup.mongodb.prepared') == 1
+
+
+def test_waits_while_owner_is_alive(prepared):
+    counters, calls = prepared
+    counters.compare_and_set('startup.mongodb.prepare', 0, os.getppid())
+    with pytest.raises(RuntimeError):
+        startup._prepare_mongodb()
+    assert calls == []
+    assert counters.get('startup.mongodb.prepared') == 0
+
+
+def test_takes_over_from_dead_owner(prepared, dead_pid):
+    counters, calls = prepared
+    counters.compare_and_set('startup.mongodb.prepare', 0, dead_pid)
+    startup._prepare_mongodb()
+    assert calls == ['collections', 'indexes']
+    assert counters.get('startup.mongodb.prepare') == os.getpid()
+    assert counters.get('startup.mongodb.prepared') == 1